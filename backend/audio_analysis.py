@@ -0,0 +1,199 @@
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+
+# These functions run inside worker processes, so they only depend on NumPy
+# and the standard library and take/return plain picklable values.
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+BLOCK_FRAMES = 65536
+ENVELOPE_LEVELS = (256, 1024, 4096)  # Bins per level, coarse to fine
+SILENCE_DB = -120.0
+
+
+class WavFormatError(ValueError):
+    pass
+
+
+@dataclass
+class WavInfo:
+    sample_rate: int
+    channels: int
+    bits_per_sample: int
+    format_tag: int
+    data_offset: int
+    data_size: int
+
+    @property
+    def block_align(self) -> int:
+        return self.channels * self.bits_per_sample // 8
+
+    @property
+    def frames(self) -> int:
+        return self.data_size // self.block_align
+
+    @property
+    def duration(self) -> float:
+        return self.frames / self.sample_rate
+
+
+def read_wav_info(path: Path) -> WavInfo:
+    """Parse the RIFF header of a WAV file without reading the samples."""
+    with open(path, 'rb') as f:
+        header = f.read(12)
+        if len(header) < 12:
+            raise WavFormatError("Truncated RIFF header")
+        riff, _, wave = struct.unpack("<4sI4s", header)
+        if riff != b"RIFF" or wave != b"WAVE":
+            raise WavFormatError("Not a RIFF/WAVE file")
+        fmt = None
+        file_size = path.stat().st_size
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise WavFormatError("No data chunk")
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                body = f.read(chunk_size)
+                if len(body) < 16:
+                    raise WavFormatError("Truncated fmt chunk")
+                format_tag, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", body[:16])
+                if format_tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    format_tag = struct.unpack("<H", body[24:26])[0]
+                fmt = (format_tag, channels, sample_rate, bits)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise WavFormatError("data chunk before fmt chunk")
+                format_tag, channels, sample_rate, bits = fmt
+                if format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+                    raise WavFormatError(f"Unsupported WAV encoding {format_tag:#x}")
+                if channels < 1 or sample_rate < 1 or bits not in (8, 16, 24, 32, 64):
+                    raise WavFormatError("Invalid WAV format chunk")
+                data_offset = f.tell()
+                # Streaming writers leave the size at 0 or 0xFFFFFFFF
+                data_size = min(chunk_size, file_size - data_offset)
+                if chunk_size in (0, 0xFFFFFFFF):
+                    data_size = file_size - data_offset
+                return WavInfo(sample_rate, channels, bits, format_tag, data_offset, data_size)
+            else:
+                f.seek(chunk_size + (chunk_size & 1), 1)
+            if chunk_id == b"fmt " and chunk_size & 1:
+                f.seek(1, 1)
+
+
+def decode_frames(raw: bytes, info: WavInfo) -> np.ndarray:
+    """Decode interleaved sample bytes to float32 in [-1, 1], shape (frames, channels)."""
+    bits = info.bits_per_sample
+    usable = len(raw) - len(raw) % info.block_align
+    raw = raw[:usable]
+    if info.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        dtype = "<f4" if bits == 32 else "<f8"
+        samples = np.frombuffer(raw, dtype=dtype).astype(np.float32)
+    elif bits == 8:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif bits == 16:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif bits == 24:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+        samples = ints.astype(np.float32) / 8388608.0
+    elif bits == 32:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise WavFormatError(f"Unsupported PCM bit depth {bits}")
+    return samples.reshape(-1, info.channels)
+
+
+def iter_wav_blocks(path: Path, info: WavInfo, block_frames: int = BLOCK_FRAMES,
+                    start_frame: int = 0, end_frame: Optional[int] = None) -> Iterator[np.ndarray]:
+    """Yield float32 blocks of at most ``block_frames`` frames."""
+    end_frame = info.frames if end_frame is None else min(end_frame, info.frames)
+    with open(path, 'rb') as f:
+        f.seek(info.data_offset + start_frame * info.block_align)
+        remaining = max(end_frame - start_frame, 0) * info.block_align
+        while remaining > 0:
+            raw = f.read(min(block_frames * info.block_align, remaining))
+            if not raw:
+                break
+            remaining -= len(raw)
+            block = decode_frames(raw, info)
+            if len(block):
+                yield block
+
+
+def to_db(value: float) -> float:
+    return round(float(20 * np.log10(value)), 2) if value > 0 else SILENCE_DB
+
+
+def encode_envelope(mins: np.ndarray, maxs: np.ndarray) -> bytes:
+    """Pack min/max pairs as interleaved int8 (scaled by 127)."""
+    pairs = np.empty(len(mins) * 2, dtype=np.int8)
+    pairs[0::2] = np.round(np.clip(mins, -1, 1) * 127)
+    pairs[1::2] = np.round(np.clip(maxs, -1, 1) * 127)
+    return pairs.tobytes()
+
+
+def analyze_wav(path: str, on_block: Optional[Callable[[np.ndarray], None]] = None) -> dict:
+    """Stream a WAV file once and return its format, loudness and peak envelope.
+
+    Memory stays bounded by ``BLOCK_FRAMES`` regardless of the file length.
+    ``on_block`` sees every decoded block, so other per-file work can share
+    the same read pass.
+    """
+    info = read_wav_info(Path(path))
+    frames = info.frames
+    bins = ENVELOPE_LEVELS[-1]
+    env_min = np.zeros(bins, dtype=np.float32)
+    env_max = np.zeros(bins, dtype=np.float32)
+    channel_peak = np.zeros(info.channels, dtype=np.float64)
+    channel_sq = np.zeros(info.channels, dtype=np.float64)
+
+    position = 0
+    for block in iter_wav_blocks(Path(path), info):
+        n = len(block)
+        if on_block is not None:
+            on_block(block)
+        channel_peak = np.maximum(channel_peak, np.abs(block).max(axis=0))
+        channel_sq += np.square(block, dtype=np.float64).sum(axis=0)
+
+        # Fold the block into the finest envelope level. Each bin covers a
+        # contiguous run of frames, so reduceat over the bin boundaries that
+        # fall inside this block handles it without a per-frame loop.
+        lo, hi = block.min(axis=1), block.max(axis=1)
+        bin_ids = (np.arange(position, position + n, dtype=np.int64) * bins) // max(frames, 1)
+        starts = np.flatnonzero(np.r_[True, bin_ids[1:] != bin_ids[:-1]])
+        ids = bin_ids[starts]
+        env_min[ids] = np.minimum(env_min[ids], np.minimum.reduceat(lo, starts))
+        env_max[ids] = np.maximum(env_max[ids], np.maximum.reduceat(hi, starts))
+        position += n
+
+    peak = float(channel_peak.max()) if frames else 0.0
+    rms = float(np.sqrt(channel_sq.sum() / (frames * info.channels))) if frames else 0.0
+
+    envelope = {}
+    for level in ENVELOPE_LEVELS:
+        factor = bins // level
+        envelope[str(level)] = encode_envelope(
+            env_min.reshape(level, factor).min(axis=1),
+            env_max.reshape(level, factor).max(axis=1),
+        )
+
+    return {
+        "duration": round(info.duration, 3),
+        "sample_rate": info.sample_rate,
+        "channels": info.channels,
+        "bits_per_sample": info.bits_per_sample,
+        "frames": frames,
+        "peak_db": to_db(peak),
+        "rms_db": to_db(rms),
+        "channel_peak_db": [to_db(float(v)) for v in channel_peak],
+        "channel_rms_db": [to_db(float(np.sqrt(v / frames))) if frames else SILENCE_DB for v in channel_sq],
+        "envelope": envelope,
+    }
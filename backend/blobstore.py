@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sys
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+from fastapi import UploadFile
+from pymongo.errors import DuplicateKeyError
+
+from ingest import AUDIO_EXTENSIONS, MAX_UPLOAD_BYTES, stream_to_disk
+from media import file_sha256
+
+logger = logging.getLogger(__name__)
+
+# How long an unreferenced blob is kept before garbage collection removes it
+BLOB_GC_GRACE = timedelta(hours=1)
+ALIAS_CACHE_SIZE = 100_000
+
+
+@dataclass
+class StoredBlob:
+    filename: str  # Public name the file is served under
+    sha256: str
+    size: int
+    kind: str  # audio, sound_pack, signature
+    deduplicated: bool = False
+    crc32: Optional[int] = None  # Known when the upload was checksummed in flight
+
+
+class BlobStore:
+    """Content-addressed, deduplicating file store.
+
+    Blobs live under ``root/ab/cd/<sha256>`` so no directory grows past a
+    few thousand entries. ``db.blobs`` keeps one reference count per blob and
+    ``db.blob_aliases`` maps every public file name (the UUID names handed
+    out by the upload endpoints) to the blob holding its content.
+    """
+
+    def __init__(self, db, root: Path):
+        self.db = db
+        self.root = root
+        self.tmp_dir = root / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self._aliases: "OrderedDict[str, dict]" = OrderedDict()
+
+    def blob_path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256[2:4] / sha256
+
+    def temp_path(self) -> Path:
+        return self.tmp_dir / uuid.uuid4().hex
+
+    async def ingest_upload(
+        self,
+        upload: UploadFile,
+        kind: str,
+        extension: str,
+        max_bytes: int = MAX_UPLOAD_BYTES,
+    ) -> StoredBlob:
+        """Stream an upload into the store under a fresh UUID file name."""
+        stored = await stream_to_disk(upload, self.temp_path(), max_bytes)
+        blob = await self.commit(stored.path, stored.sha256, stored.size, kind, f"{uuid.uuid4()}{extension}")
+        blob.crc32 = stored.crc32
+        return blob
+
+    async def ingest_bytes(self, data: bytes, kind: str, extension: str) -> StoredBlob:
+        """Store a small in-memory body under a fresh UUID file name."""
+        tmp_path = self.temp_path()
+        await asyncio.to_thread(tmp_path.write_bytes, data)
+        return await self.commit(
+            tmp_path, hashlib.sha256(data).hexdigest(), len(data), kind, f"{uuid.uuid4()}{extension}"
+        )
+
+    async def ingest_file(self, path: Path, kind: str, filename: str) -> StoredBlob:
+        """Move an existing file into the store, hashing it in a worker thread."""
+        sha256 = await asyncio.to_thread(file_sha256, path)
+        return await self.commit(path, sha256, path.stat().st_size, kind, filename)
+
+    async def commit(self, tmp_path: Path, sha256: str, size: int, kind: str, filename: str) -> StoredBlob:
+        """Take a reference on ``sha256`` and publish ``tmp_path`` as its blob.
+
+        The reference is taken before the file is placed, and the file is
+        always renamed into place (identical content, so replacing an
+        existing blob is harmless). Together with the tombstone rename in
+        ``collect_garbage`` this keeps a concurrent collection from deleting
+        a blob that has just gained a reference.
+        """
+        try:
+            result = await self._add_reference(sha256, size)
+        except DuplicateKeyError:
+            # Lost an upsert race with another ingest of the same content
+            result = await self._add_reference(sha256, size)
+        deduplicated = result.upserted_id is None
+
+        blob_path = self.blob_path(sha256)
+        try:
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, blob_path)
+            await self.db.blob_aliases.insert_one({
+                "filename": filename,
+                "sha256": sha256,
+                "size": size,
+                "kind": kind,
+                "created_at": datetime.now(timezone.utc),
+            })
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            await self._drop_reference(sha256)
+            raise
+
+        return StoredBlob(filename=filename, sha256=sha256, size=size, kind=kind, deduplicated=deduplicated)
+
+    async def _add_reference(self, sha256: str, size: int):
+        return await self.db.blobs.update_one(
+            {"sha256": sha256},
+            {
+                "$inc": {"refcount": 1},
+                "$setOnInsert": {"size": size, "created_at": datetime.now(timezone.utc)},
+                "$unset": {"released_at": ""},
+            },
+            upsert=True
+        )
+
+    async def _drop_reference(self, sha256: str):
+        await self.db.blobs.update_one({"sha256": sha256}, {"$inc": {"refcount": -1}})
+        await self.db.blobs.update_one(
+            {"sha256": sha256, "refcount": {"$lte": 0}},
+            {"$set": {"released_at": datetime.now(timezone.utc)}}
+        )
+
+    async def release(self, filename: str):
+        """Remove an alias and drop its reference on the underlying blob."""
+        alias = await self.db.blob_aliases.find_one_and_delete({"filename": filename})
+        self._aliases.pop(filename, None)
+        if alias:
+            await self._drop_reference(alias["sha256"])
+
+    async def resolve(self, filename: str, kind: Optional[str] = None) -> Optional[dict]:
+        """Look up the alias for a public file name.
+
+        Aliases are cached in-process. An alias maps to the same blob until
+        it is released, and another worker's release only removes it from
+        that worker's cache; a cached alias whose blob is gone is therefore
+        dropped and looked up again. One whose blob is still referenced
+        elsewhere, or not yet collected, keeps resolving until evicted.
+        """
+        alias = self._aliases.get(filename)
+        if alias is not None and not self.blob_path(alias["sha256"]).exists():
+            del self._aliases[filename]
+            alias = None
+        if alias is None:
+            alias = await self.db.blob_aliases.find_one({"filename": filename}, {"_id": 0})
+            if alias is None:
+                return None
+            self._aliases[filename] = alias
+            if len(self._aliases) > ALIAS_CACHE_SIZE:
+                self._aliases.popitem(last=False)
+        else:
+            self._aliases.move_to_end(filename)
+        if kind is not None and alias["kind"] != kind:
+            return None
+        return alias
+
+    async def collect_garbage(self, grace: timedelta = BLOB_GC_GRACE) -> int:
+        """Delete blobs that have had no references for longer than ``grace``."""
+        cutoff = datetime.now(timezone.utc) - grace
+        removed = 0
+        async for blob in self.db.blobs.find({"refcount": {"$lte": 0}, "released_at": {"$lt": cutoff}}):
+            sha256 = blob["sha256"]
+            blob_path = self.blob_path(sha256)
+            tombstone = blob_path.with_name(f".{sha256}.{uuid.uuid4().hex}.gc")
+            try:
+                os.replace(blob_path, tombstone)
+            except FileNotFoundError:
+                tombstone = None
+            deleted = await self.db.blobs.find_one_and_delete({"sha256": sha256, "refcount": {"$lte": 0}})
+            if tombstone is None:
+                continue
+            if deleted:
+                tombstone.unlink(missing_ok=True)
+                # Derived files (peak mipmaps etc.) are named <sha256>.<suffix>
+                for sidecar in blob_path.parent.glob(f"{sha256}.*"):
+                    sidecar.unlink(missing_ok=True)
+                removed += 1
+            elif blob_path.exists():
+                # Re-referenced meanwhile and the new ingest already placed a copy
+                tombstone.unlink(missing_ok=True)
+            else:
+                os.replace(tombstone, blob_path)
+        return removed
+
+    async def migrate_directory(self, directory: Path, kind: str) -> int:
+        """Move legacy flat-directory files into the store, keeping their names."""
+        migrated = 0
+        for path in sorted(directory.iterdir()):
+            if not path.is_file() or path.name.startswith(".") or path.suffix.lower() not in AUDIO_EXTENSIONS:
+                continue
+            if await self.db.blob_aliases.find_one({"filename": path.name}, {"_id": 1}):
+                continue
+            await self.ingest_file(path, kind, path.name)
+            migrated += 1
+        return migrated
+
+
+async def main() -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    store = BlobStore(db, Path(os.environ.get('BLOB_STORE_DIR', 'blob_store')))
+    try:
+        for directory, kind in ((Path("audio_files"), "audio"), (Path("sound_packs"), "sound_pack")):
+            if directory.is_dir():
+                count = await store.migrate_directory(directory, kind)
+                print(f"Migrated {count} files from {directory}")
+        print(f"Collected {await store.collect_garbage()} unreferenced blobs")
+        return 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(main()))
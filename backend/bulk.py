@@ -0,0 +1,188 @@
+import asyncio
+import os
+import tempfile
+from collections import Counter
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Sequence, Tuple, Type
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+from pymongo.errors import BulkWriteError
+
+from serialization import dumps
+
+BULK_BATCH_SIZE = int(os.environ.get('BULK_BATCH_SIZE', 1000))
+MAX_LINE_BYTES = 1024 * 1024
+RESULT_SPOOL_BYTES = 8 * 1024 * 1024  # Results beyond this go to a temp file
+DUPLICATE_KEY = 11000
+
+IMPORT_HEADERS = {
+    "created": "X-Import-Created",
+    "duplicate": "X-Import-Duplicates",
+    "invalid": "X-Import-Invalid",
+    "failed": "X-Import-Failed",
+}
+
+
+@dataclass
+class BulkItem:
+    line: int
+    document: Optional[dict] = None
+    status: str = "pending"  # pending, created, duplicate, invalid, failed
+    error: Optional[str] = None
+
+    def result(self) -> dict:
+        result = {"line": self.line, "status": self.status}
+        if self.status == "created":
+            result["id"] = self.document["id"]
+        if self.error:
+            result["error"] = self.error
+        return result
+
+
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(map(str, error['loc'])) or 'line'}: {error['msg']}" for error in exc.errors()
+    )
+
+
+async def read_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, bytes]]:
+    """Yield the non-blank lines of an NDJSON body with their line numbers."""
+    buffer = bytearray()
+    line_number = 0
+    async for chunk in stream:
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            line_number += 1
+            line = bytes(buffer[start:end]).strip()
+            if line:
+                yield line_number, line
+            start = end + 1
+        del buffer[:start]
+        if len(buffer) > MAX_LINE_BYTES:
+            raise HTTPException(status_code=413, detail=f"Line {line_number + 1} exceeds {MAX_LINE_BYTES} bytes")
+    if buffer.strip():
+        yield line_number + 1, bytes(buffer).strip()
+
+
+async def read_batches(
+    stream: AsyncIterator[bytes],
+    source: Type[BaseModel],
+    model: Type[BaseModel],
+    batch_size: int,
+) -> AsyncIterator[List[BulkItem]]:
+    """Parse and validate NDJSON lines against ``source`` in batches, turning
+    each valid record into a ``model`` document."""
+    batch: List[BulkItem] = []
+    async for line_number, line in read_lines(stream):
+        item = BulkItem(line=line_number)
+        try:
+            record = source.model_validate_json(line)
+            item.document = model(**record.model_dump(exclude_unset=True)).model_dump()
+        except ValidationError as exc:
+            item.status = "invalid"
+            item.error = _validation_message(exc)
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def insert_batch(collection, items: List[BulkItem], unique_fields: Sequence[str]) -> List[dict]:
+    """Insert the valid items of a batch, skipping duplicates. Returns the
+    inserted documents.
+
+    Duplicates within the batch and against the collection are found with
+    one ``$in`` query per unique field; the unique indexes catch any that are
+    inserted concurrently, which the unordered ``insert_many`` reports per
+    document without stopping the rest of the batch.
+    """
+    pending = [item for item in items if item.status == "pending"]
+    for field in unique_fields:
+        seen = set()
+        for item in pending:
+            value = item.document[field]
+            if value in seen:
+                item.status, item.error = "duplicate", f"{field} repeated earlier in the import"
+            seen.add(value)
+        existing = await collection.distinct(field, {field: {"$in": list(seen)}}) if seen else []
+        existing = set(existing)
+        for item in pending:
+            if item.status == "pending" and item.document[field] in existing:
+                item.status, item.error = "duplicate", f"{field} already exists"
+        pending = [item for item in pending if item.status == "pending"]
+
+    if pending:
+        try:
+            await collection.insert_many([item.document for item in pending], ordered=False)
+        except BulkWriteError as exc:
+            for error in exc.details.get("writeErrors", []):
+                item = pending[error["index"]]
+                if error.get("code") == DUPLICATE_KEY:
+                    item.status, item.error = "duplicate", "already exists"
+                else:
+                    item.status, item.error = "failed", error.get("errmsg", "write failed")
+    inserted = []
+    for item in pending:
+        item.document.pop("_id", None)
+        if item.status == "pending":
+            item.status = "created"
+            inserted.append(item.document)
+    return inserted
+
+
+async def bulk_import(
+    stream: AsyncIterator[bytes],
+    collection,
+    source: Type[BaseModel],
+    model: Type[BaseModel],
+    unique_fields: Sequence[str] = ("id",),
+    on_inserted: Optional[Callable[[List[dict]], Awaitable[None]]] = None,
+    batch_size: int = BULK_BATCH_SIZE,
+) -> StreamingResponse:
+    """Import an NDJSON body and respond with one NDJSON result per line.
+
+    Each batch is written while the next one is parsed. Results are spooled
+    to a temporary file, so memory stays bounded for any import size, and
+    the response carries the status counts in ``X-Import-*`` headers.
+    """
+    results = tempfile.SpooledTemporaryFile(max_size=RESULT_SPOOL_BYTES)
+    counts = Counter()
+
+    async def write(items: List[BulkItem]):
+        inserted = await insert_batch(collection, items, unique_fields)
+        if inserted and on_inserted is not None:
+            await on_inserted(inserted)
+        for item in items:
+            counts[item.status] += 1
+        results.write(b"".join(dumps(item.result()) + b"\n" for item in items))
+
+    writing = None
+    try:
+        async for batch in read_batches(stream, source, model, batch_size):
+            if writing is not None:
+                await writing
+            writing = asyncio.create_task(write(batch))
+        if writing is not None:
+            await writing
+    except BaseException:
+        if writing is not None:
+            writing.cancel()
+        results.close()
+        raise
+    results.seek(0)
+
+    def body():
+        with results:
+            while chunk := results.read(64 * 1024):
+                yield chunk
+
+    headers = {header: str(counts[status]) for status, header in IMPORT_HEADERS.items()}
+    return StreamingResponse(body(), media_type="application/x-ndjson", headers=headers)
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import os
+import pickle
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 50_000))
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+
+# Seconds a cached entry may be served; CACHE_TTL_<NAMESPACE> overrides.
+# Without a shared backend, writes made through another worker only become
+# visible here once the entry expires, which is what bounds these.
+DEFAULT_TTLS = {
+    "users": 300,
+    "projects": 60,
+    "sound_packs": 30,
+}
+
+
+def cache_ttl(namespace: str) -> int:
+    return int(os.environ.get(f'CACHE_TTL_{namespace.upper()}', DEFAULT_TTLS.get(namespace, 60)))
+
+
+class MemoryBackend:
+    """Per-process LRU with per-entry expiry. Values are stored as they are,
+    so callers must not mutate what they get back. Counters (namespace
+    generations) are kept apart and never evicted: one restarting at 0
+    would bring back pages cached under its old value."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._counters: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key: str, value: Any, ttl: int):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    async def get_counter(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+    async def incr(self, key: str) -> int:
+        value = self._counters.get(key, 0) + 1
+        self._counters[key] = value
+        return value
+
+    async def close(self):
+        self._entries.clear()
+        self._counters.clear()
+
+
+class RedisBackend:
+    """Shared backend for any Redis-compatible server, so that invalidations
+    reach every worker. Values are pickled; only this app writes them.
+    Counters are Redis integers, written by INCR and read back unpickled."""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis  # Optional dependency, needed only here
+
+        self._client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self._client.get(key)
+        return pickle.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl: int):
+        await self._client.set(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ex=ttl)
+
+    async def delete(self, key: str):
+        await self._client.delete(key)
+
+    async def get_counter(self, key: str) -> int:
+        return int(await self._client.get(key) or 0)
+
+    async def incr(self, key: str) -> int:
+        return await self._client.incr(key)
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class ReadThroughCache:
+    """Read-through cache for documents and list pages.
+
+    ``get_or_load`` serves a key from the backend or calls ``loader`` and
+    stores its result; concurrent misses for one key share a single load.
+    Individual keys are invalidated with ``invalidate``. Keys built with
+    ``versioned=True`` (list pages, whose membership any insert can change)
+    embed a per-namespace generation that ``invalidate_namespace`` bumps,
+    retiring all of them at once.
+    """
+
+    def __init__(self, backend=None, prefix: str = "cache"):
+        self.backend = backend or MemoryBackend()
+        self.prefix = prefix
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+        self.errors = 0
+        self._pending: Dict[str, asyncio.Task] = {}
+
+    async def _key(self, namespace: str, key: str, versioned: bool) -> str:
+        if not versioned:
+            return f"{self.prefix}:{namespace}:{key}"
+        generation = await self.backend.get_counter(f"{self.prefix}:{namespace}:generation")
+        return f"{self.prefix}:{namespace}:g{generation}:{key}"
+
+    async def get_or_load(self, namespace: str, key: str, loader: Callable[[], Awaitable[Any]],
+                          versioned: bool = False) -> Any:
+        """Return the cached value, loading it on a miss. ``None`` results
+        are returned but not cached."""
+        try:
+            full_key = await self._key(namespace, key, versioned)
+            value = await self.backend.get(full_key)
+        except Exception:
+            # A cache outage degrades to direct reads
+            logger.exception("Cache read failed for %s", key)
+            self.errors += 1
+            return await loader()
+        if value is not None:
+            self.hits[namespace] += 1
+            return value
+        self.misses[namespace] += 1
+
+        # The load runs as its own task so one caller disconnecting does not
+        # cancel it for the others waiting on the same key.
+        task = self._pending.get(full_key)
+        if task is None:
+            task = asyncio.create_task(self._load(namespace, full_key, loader))
+            self._pending[full_key] = task
+            task.add_done_callback(lambda done: self._finished(full_key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, full_key: str, task: asyncio.Task):
+        if self._pending.get(full_key) is task:
+            del self._pending[full_key]
+
+    async def _load(self, namespace: str, full_key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = await loader()
+        # Skip the store if the key was invalidated while loading
+        if value is not None and self._pending.get(full_key) is asyncio.current_task():
+            try:
+                await self.backend.set(full_key, value, cache_ttl(namespace))
+            except Exception:
+                logger.exception("Cache write failed for %s", full_key)
+                self.errors += 1
+        return value
+
+    async def invalidate(self, namespace: str, key: str):
+        full_key = f"{self.prefix}:{namespace}:{key}"
+        # A load in flight may have read the old document; detaching it
+        # keeps it from storing that, and later callers start a fresh load.
+        self._pending.pop(full_key, None)
+        try:
+            await self.backend.delete(full_key)
+        except Exception:
+            logger.exception("Cache invalidation failed for %s", full_key)
+            self.errors += 1
+
+    async def invalidate_namespace(self, namespace: str):
+        try:
+            await self.backend.incr(f"{self.prefix}:{namespace}:generation")
+        except Exception:
+            logger.exception("Cache invalidation failed for %s", namespace)
+            self.errors += 1
+
+    def stats(self) -> dict:
+        namespaces = sorted(set(self.hits) | set(self.misses))
+        return {
+            "backend": type(self.backend).__name__,
+            "errors": self.errors,
+            "namespaces": {
+                namespace: {
+                    "hits": self.hits[namespace],
+                    "misses": self.misses[namespace],
+                    "hit_ratio": round(self.hits[namespace] / ((self.hits[namespace] + self.misses[namespace]) or 1), 4),
+                    "ttl": cache_ttl(namespace),
+                }
+                for namespace in namespaces
+            },
+        }
+
+    async def close(self):
+        await self.backend.close()
+
+
+def create_cache() -> ReadThroughCache:
+    if CACHE_REDIS_URL:
+        return ReadThroughCache(RedisBackend(CACHE_REDIS_URL))
+    return ReadThroughCache()
@@ -0,0 +1,241 @@
+import asyncio
+import hashlib
+import logging
+import os
+import string
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import DESCENDING
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Seconds the latest version of each contract type is trusted before it is
+# looked up again; publishing through this worker refreshes it at once
+LATEST_TEMPLATE_TTL = int(os.environ.get('CONTRACT_TEMPLATE_TTL_SECONDS', 60))
+RENDER_CACHE_SIZE = 10_000
+
+ARTIST_AGREEMENT_TERMS = """
+T.H.U.G N HOMEBASE ENT. ARTIST AGREEMENT
+
+1. EXCLUSIVE RECORDING AGREEMENT
+The Artist agrees to record exclusively for T.H.U.G N HOMEBASE ENT. during the term of this agreement.
+
+2. REVENUE SHARING
+- Streaming Revenue: 70% Artist / 30% Label
+- Performance Revenue: 80% Artist / 20% Label
+- Merchandise: 60% Artist / 40% Label
+
+3. PROMOTIONAL SUPPORT
+T.H.U.G N HOMEBASE ENT. will provide marketing, distribution, and promotional support for all releases.
+
+4. CREATIVE CONTROL
+Artist maintains creative control over their music with label consultation on commercial releases.
+
+5. TERM
+This agreement is valid for 2 years from the date of signing, with option to renew.
+
+By signing below, both parties agree to the terms and conditions outlined above.
+"""
+
+# Seeded as version 1 of their contract type when missing. Further types
+# and versions are published through the API. Contracts of a type without
+# a template of its own (collaboration, licensing) get the default type's
+# terms, as every contract did before templates existed.
+DEFAULT_CONTRACT_TYPE = "artist_agreement"
+DEFAULT_TEMPLATES = {
+    "artist_agreement": ("T.H.U.G N HOMEBASE ENT. Artist Agreement", ARTIST_AGREEMENT_TERMS),
+}
+
+TEMPLATE_SUMMARY = {"_id": 0, "body": 0}
+
+
+def body_sha256(body: str) -> str:
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def render_terms(body: str, contract: dict) -> str:
+    """Fill ``$artist_name`` style placeholders from the contract. Unknown
+    placeholders are left as they are."""
+    return string.Template(body).safe_substitute(
+        artist_name=contract.get("artist_name", ""),
+        contract_type=contract.get("contract_type", ""),
+    )
+
+
+class ContractTemplates:
+    """Versioned contract terms, stored once in ``db.contract_templates``.
+
+    A contract references the template version it was created from by
+    ``template_id``; versions are never edited, only superseded, so they
+    and their rendered terms are cached without expiry. Only the lookup of
+    the latest version per contract type expires.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._templates: Dict[str, dict] = {}  # By id; a few per type
+        self._latest: Dict[str, Tuple[float, dict]] = {}
+        self._rendered: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+
+    async def ensure_defaults(self):
+        for contract_type, (title, body) in DEFAULT_TEMPLATES.items():
+            if not await self.db.contract_templates.find_one({"contract_type": contract_type}, {"_id": 1}):
+                try:
+                    await self._insert(contract_type, 1, title, body)
+                except DuplicateKeyError:
+                    pass  # Seeded concurrently by another worker
+
+    async def _insert(self, contract_type: str, version: int, title: str, body: str,
+                      imported: bool = False) -> dict:
+        template = {
+            "id": str(uuid.uuid4()),
+            "contract_type": contract_type,
+            "version": version,
+            "title": title,
+            "body": body,
+            "sha256": body_sha256(body),
+            "imported": imported,
+            "created_at": datetime.now(timezone.utc),
+        }
+        await self.db.contract_templates.insert_one(template)
+        template.pop("_id", None)
+        self._templates[template["id"]] = template
+        return template
+
+    async def get(self, template_id: str) -> Optional[dict]:
+        template = self._templates.get(template_id)
+        if template is None:
+            template = await self.db.contract_templates.find_one({"id": template_id}, {"_id": 0})
+            if template is not None:
+                self._templates[template_id] = template
+        return template
+
+    async def latest(self, contract_type: str) -> Optional[dict]:
+        cached = self._latest.get(contract_type)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        template = await self.db.contract_templates.find_one(
+            {"contract_type": contract_type, "imported": {"$ne": True}}, {"_id": 0},
+            sort=[("version", DESCENDING)]
+        )
+        if template is not None:
+            self._templates[template["id"]] = template
+            self._latest[contract_type] = (time.monotonic() + LATEST_TEMPLATE_TTL, template)
+        return template
+
+    async def publish(self, contract_type: str, title: str, body: str, imported: bool = False) -> dict:
+        """Store ``body`` as the next version of ``contract_type``, or return
+        the latest version unchanged if it already has this body and title.
+
+        Imported versions hold the terms of contracts created before
+        templates existed; they are numbered like any other version but are
+        never picked for new contracts.
+        """
+        while True:
+            self._latest.pop(contract_type, None)
+            current = await self.latest(contract_type)
+            if (not imported and current is not None
+                    and current["sha256"] == body_sha256(body) and current["title"] == title):
+                return current
+            newest = await self.db.contract_templates.find_one(
+                {"contract_type": contract_type}, {"version": 1}, sort=[("version", DESCENDING)]
+            )
+            try:
+                template = await self._insert(
+                    contract_type, newest["version"] + 1 if newest else 1, title, body, imported
+                )
+            except DuplicateKeyError:
+                continue  # Another version was published concurrently
+            if not imported:
+                self._latest[contract_type] = (time.monotonic() + LATEST_TEMPLATE_TTL, template)
+            return template
+
+    async def list_latest(self) -> List[dict]:
+        """Latest version of every contract type, without bodies."""
+        cursor = self.db.contract_templates.aggregate([
+            {"$match": {"imported": {"$ne": True}}},
+            {"$sort": {"contract_type": 1, "version": -1}},
+            {"$group": {"_id": "$contract_type", "template": {"$first": "$$ROOT"}}},
+            {"$replaceRoot": {"newRoot": "$template"}},
+            {"$project": TEMPLATE_SUMMARY},
+            {"$sort": {"contract_type": 1}},
+        ])
+        return [template async for template in cursor]
+
+    async def versions(self, contract_type: str) -> List[dict]:
+        cursor = self.db.contract_templates.find(
+            {"contract_type": contract_type}, TEMPLATE_SUMMARY
+        ).sort("version", DESCENDING)
+        return [template async for template in cursor]
+
+    def render(self, template: dict, contract: dict) -> str:
+        if template.get("imported"):
+            return template["body"]  # Already rendered when it was stored inline
+        key = (template["id"], contract.get("artist_name", ""))
+        terms = self._rendered.get(key)
+        if terms is None:
+            terms = render_terms(template["body"], contract)
+            self._rendered[key] = terms
+            while len(self._rendered) > RENDER_CACHE_SIZE:
+                self._rendered.popitem(last=False)
+        else:
+            self._rendered.move_to_end(key)
+        return terms
+
+
+async def migrate_contract_terms(db, templates: ContractTemplates) -> int:
+    """Replace the inline ``terms`` of older contracts with a template
+    reference. Identical terms share one template version: any existing
+    version of the contract's type with the same text, otherwise a new
+    imported version. Returns the number of contracts migrated."""
+    await templates.ensure_defaults()
+    migrated = 0
+    distinct = db.contracts.aggregate([
+        {"$match": {"terms": {"$type": "string"}}},
+        {"$group": {"_id": {"contract_type": "$contract_type", "terms": "$terms"}}},
+    ])
+    async for group in distinct:
+        contract_type = group["_id"].get("contract_type") or DEFAULT_CONTRACT_TYPE
+        terms = group["_id"]["terms"]
+        template = await db.contract_templates.find_one(
+            {"contract_type": contract_type, "sha256": body_sha256(terms)}, {"_id": 0}
+        )
+        if template is None:
+            title = DEFAULT_TEMPLATES.get(contract_type, (contract_type.replace("_", " ").title(),))[0]
+            template = await templates.publish(contract_type, title, terms, imported=True)
+        result = await db.contracts.update_many(
+            {"contract_type": group["_id"].get("contract_type"), "terms": terms},
+            {
+                "$set": {"template_id": template["id"], "template_version": template["version"]},
+                "$unset": {"terms": ""},
+            },
+        )
+        migrated += result.modified_count
+    return migrated
+
+
+async def main() -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        migrated = await migrate_contract_terms(db, ContractTemplates(db))
+        print(f"Moved the terms of {migrated} contracts to templates")
+        return 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,64 @@
+import asyncio
+import logging
+import os
+from collections import Counter
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+COUNTER_FLUSH_INTERVAL = float(os.environ.get('COUNTER_FLUSH_INTERVAL_SECONDS', 10))
+
+
+class BatchedCounter:
+    """Increment a numeric field in memory and write it back in batches.
+
+    Hot counters such as ``download_count`` would otherwise cost one write
+    per request. Pending increments are flushed as one unordered bulk write
+    every ``interval`` seconds and on shutdown; increments from a failed
+    flush are kept for the next one.
+    """
+
+    def __init__(self, collection, field: str, key_field: str = "id",
+                 interval: float = COUNTER_FLUSH_INTERVAL):
+        self.collection = collection
+        self.field = field
+        self.key_field = key_field
+        self.interval = interval
+        self._pending: Counter = Counter()
+        self._task = None
+
+    def increment(self, key: str, amount: int = 1):
+        self._pending[key] += amount
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, Counter()
+        try:
+            await self.collection.bulk_write(
+                [UpdateOne({self.key_field: key}, {"$inc": {self.field: amount}}) for key, amount in batch.items()],
+                ordered=False
+            )
+        except Exception:
+            self._pending.update(batch)
+            raise
+        return len(batch)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Flushing %s.%s counters failed", self.collection.name, self.field)
@@ -0,0 +1,170 @@
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from audio_analysis import iter_wav_blocks, read_wav_info
+from peaks import analyze_with_peaks
+from tempo_key import TempoKeyAccumulator
+
+# Like audio_analysis, these functions run inside worker processes.
+
+EMBEDDING_VERSION = 1  # Bump when the features change; older vectors are recomputed
+N_BANDS = 24
+N_CHROMA = 12
+N_SCALARS = 4  # Spectral centroid, flatness, zero-crossing rate, flux
+EMBEDDING_DIM = 2 * N_BANDS + N_CHROMA + N_SCALARS  # 64
+
+FRAME_SECONDS = 0.046  # About 2048 samples at 44.1 kHz
+MIN_BAND_HZ = 40.0
+MAX_BAND_HZ = 16000.0
+CHROMA_RANGE_HZ = (55.0, 5000.0)
+MAX_FEATURE_SECONDS = 60  # Longer files are described by their first minute
+SILENT_FRAME_POWER = 1e-10
+
+# Relative weight of each feature group in the final vector
+GROUP_WEIGHTS = (1.0, 0.5, 0.7, 0.5)
+
+
+class FeatureAccumulator:
+    """Streaming spectral features over a mono mix of the decoded blocks.
+
+    Frames are taken with a hop of half the frame length and reduced to
+    per-frame band energies, chroma and a few scalar descriptors, of which
+    only running sums are kept, so memory does not grow with the file.
+    """
+
+    def __init__(self, sample_rate: int):
+        self.sample_rate = sample_rate
+        self.frame_length = 1 << max(int(round(np.log2(sample_rate * FRAME_SECONDS))), 8)
+        self.hop = self.frame_length // 2
+        self.max_samples = sample_rate * MAX_FEATURE_SECONDS
+        self._window = np.hanning(self.frame_length).astype(np.float32)
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._consumed = 0
+
+        freqs = np.fft.rfftfreq(self.frame_length, 1 / sample_rate)
+        self._freqs = freqs.astype(np.float32)
+        # Log-spaced rectangular bands; every band gets at least one bin
+        top = min(MAX_BAND_HZ, sample_rate / 2)
+        edges = np.geomspace(MIN_BAND_HZ, top, N_BANDS + 1)
+        band_of = np.clip(np.searchsorted(edges, freqs, side="right") - 1, -1, N_BANDS)
+        self._bands = np.zeros((N_BANDS, len(freqs)), dtype=np.float32)
+        for band in range(N_BANDS):
+            members = band_of == band
+            if not members.any():
+                members = np.zeros(len(freqs), dtype=bool)
+                members[np.argmin(np.abs(freqs - np.sqrt(edges[band] * edges[band + 1])))] = True
+            self._bands[band, members] = 1.0
+        # Pitch class of every bin in the chroma range
+        self._chroma = np.zeros((N_CHROMA, len(freqs)), dtype=np.float32)
+        in_range = (freqs >= CHROMA_RANGE_HZ[0]) & (freqs <= CHROMA_RANGE_HZ[1])
+        pitch = np.round(12 * np.log2(freqs[in_range] / 440.0) + 69).astype(np.int64) % 12
+        self._chroma[pitch, np.flatnonzero(in_range)] = 1.0
+
+        self.frames = 0
+        self._band_sum = np.zeros(N_BANDS)
+        self._band_sq = np.zeros(N_BANDS)
+        self._chroma_sum = np.zeros(N_CHROMA)
+        self._scalar_sum = np.zeros(N_SCALARS - 1)
+        self._flux_sum = 0.0
+        self._flux_count = 0
+        self._previous_bands: Optional[np.ndarray] = None
+
+    @property
+    def full(self) -> bool:
+        return self._consumed >= self.max_samples
+
+    def feed(self, block: np.ndarray):
+        if self.full:
+            return
+        mono = block.mean(axis=1) if block.ndim == 2 else block
+        mono = mono[:self.max_samples - self._consumed]
+        self._consumed += len(mono)
+        self._buffer = np.concatenate([self._buffer, mono.astype(np.float32, copy=False)])
+        if len(self._buffer) < self.frame_length:
+            return
+        frames = np.lib.stride_tricks.sliding_window_view(self._buffer, self.frame_length)[::self.hop]
+        self._process(frames)
+        self._buffer = self._buffer[len(frames) * self.hop:].copy()
+
+    def _process(self, frames: np.ndarray):
+        spectrum = np.fft.rfft(frames * self._window, axis=1)
+        power = (spectrum.real ** 2 + spectrum.imag ** 2).astype(np.float32)
+        total = power.sum(axis=1)
+        audible = total > SILENT_FRAME_POWER
+        zero_crossings = np.count_nonzero(np.diff(np.signbit(frames), axis=1), axis=1) / self.frame_length
+        power, total, frames_zcr = power[audible], total[audible], zero_crossings[audible]
+        if not len(power):
+            return
+
+        bands = 10 * np.log10(power @ self._bands.T + SILENT_FRAME_POWER)
+        chroma = power @ self._chroma.T
+        chroma /= np.maximum(chroma.sum(axis=1, keepdims=True), SILENT_FRAME_POWER)
+        centroid = (power @ self._freqs) / total / (self.sample_rate / 2)
+        flatness = np.exp(np.log(power + SILENT_FRAME_POWER).mean(axis=1)) / (total / power.shape[1])
+        # Positive change in band level from the previous audible frame
+        history = bands if self._previous_bands is None else np.vstack([self._previous_bands, bands])
+        flux = np.maximum(np.diff(history, axis=0), 0).mean(axis=1) / 10
+        self._previous_bands = bands[-1:]
+
+        self.frames += len(power)
+        self._band_sum += bands.sum(axis=0)
+        self._band_sq += np.square(bands, dtype=np.float64).sum(axis=0)
+        self._chroma_sum += chroma.sum(axis=0)
+        self._scalar_sum += [centroid.sum(), flatness.sum(), frames_zcr.sum()]
+        self._flux_sum += flux.sum()
+        self._flux_count += len(flux)
+
+    def embedding(self) -> np.ndarray:
+        """Unit-length float32 vector of ``EMBEDDING_DIM`` values. Silence
+        (no audible frame) gives the zero vector."""
+        if not self.frames and len(self._buffer):
+            # Shorter than one frame: describe it by a zero-padded frame
+            padded = np.zeros(self.frame_length, dtype=np.float32)
+            padded[:len(self._buffer)] = self._buffer
+            self._process(padded[None, :])
+            self._buffer = self._buffer[:0]
+        if not self.frames:
+            return np.zeros(EMBEDDING_DIM, dtype=np.float32)
+        mean = self._band_sum / self.frames
+        std = np.sqrt(np.maximum(self._band_sq / self.frames - mean ** 2, 0))
+        groups = [
+            mean - mean.mean(),  # Spectral shape, independent of level
+            std,
+            self._chroma_sum / self.frames,
+            np.r_[self._scalar_sum / self.frames, self._flux_sum / max(self._flux_count, 1)],
+        ]
+        parts = []
+        for group, weight in zip(groups, GROUP_WEIGHTS):
+            norm = np.linalg.norm(group)
+            parts.append(group / norm * weight if norm > 0 else group)
+        vector = np.concatenate(parts)
+        return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+
+def analyze_sound_pack_file(audio_path: str, mipmap_path: str) -> dict:
+    """``analyze_with_peaks`` plus the similarity embedding (as float32
+    bytes under ``"embedding"``) and the tempo and key estimates, all from
+    the same read pass."""
+    sample_rate = read_wav_info(Path(audio_path)).sample_rate
+    features = FeatureAccumulator(sample_rate)
+    tempo_key = TempoKeyAccumulator(sample_rate)
+
+    def feed(block: np.ndarray):
+        features.feed(block)
+        tempo_key.feed(block)
+
+    analysis = analyze_with_peaks(audio_path, mipmap_path, on_block=feed)
+    analysis["embedding"] = features.embedding().tobytes()
+    analysis.update(tempo_key.estimates())
+    return analysis
+
+
+def embed_wav(audio_path: str) -> bytes:
+    """Embedding of a WAV file as float32 bytes, reading only what it uses."""
+    info = read_wav_info(Path(audio_path))
+    features = FeatureAccumulator(info.sample_rate)
+    for block in iter_wav_blocks(Path(audio_path), info, end_frame=features.max_samples):
+        features.feed(block)
+    return features.embedding().tobytes()
@@ -0,0 +1,324 @@
+import asyncio
+import logging
+import os
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo.errors import OperationFailure
+
+from metrics import EVENT_OVERFLOWS, EVENT_SUBSCRIBERS, EVENTS_PUBLISHED
+from serialization import DocumentEncoder, dumps
+
+logger = logging.getLogger(__name__)
+
+EVENT_QUEUE_SIZE = int(os.environ.get('EVENT_QUEUE_SIZE', 256))  # Events buffered per client
+EVENT_REPLAY_SIZE = int(os.environ.get('EVENT_REPLAY_SIZE', 1024))  # Recent events kept for reconnects
+MAX_EVENT_SUBSCRIBERS = int(os.environ.get('MAX_EVENT_SUBSCRIBERS', 10000))
+EVENT_HEARTBEAT_SECONDS = int(os.environ.get('EVENT_HEARTBEAT_SECONDS', 15))
+EVENT_SOURCE = os.environ.get('EVENT_SOURCE', 'auto')  # auto, changestream or poll
+EVENT_POLL_INTERVAL = float(os.environ.get('EVENT_POLL_INTERVAL_SECONDS', 2))
+EVENT_RETRY_MS = 3000  # Reconnect delay suggested to EventSource clients
+CHANGE_STREAM_HISTORY_LOST = 286
+
+# Set by every update that clients should hear about; the polling fallback
+# finds updates by it and inserts by created_at
+CHANGE_MARKER = "changed_at"
+
+# The poll re-reads this window and skips what it has already emitted, so a
+# write that becomes visible after a later one is not missed
+POLL_OVERLAP = timedelta(seconds=10)
+
+# Sent to clients whose queue overflowed or whose Last-Event-ID is too old:
+# events were lost, so they should reload what they show
+RESYNC_FRAME = b"event: resync\ndata: {}\n\n"
+HEARTBEAT_FRAME = b": keepalive\n\n"
+
+
+@dataclass(frozen=True)
+class Event:
+    sequence: int
+    topics: Tuple[str, ...]
+    frame: bytes  # Encoded once, written to every subscriber
+
+
+@dataclass(frozen=True)
+class WatchedCollection:
+    name: str
+    event_prefix: str  # project, sound_pack, contract
+    encoder: DocumentEncoder
+    topics: Callable[[dict], List[str]]
+    ignored_fields: frozenset = frozenset()  # Updates touching only these are not pushed
+    view: Optional[Callable[[dict], dict]] = None  # Trims the encoded document sent to clients
+
+
+class Subscription:
+    """One client's bounded event queue.
+
+    Publishing never waits on a client. When a client reads slower than
+    events arrive and its queue fills, the queue is dropped and replaced by
+    a single resync marker, so a slow client costs at most ``maxsize``
+    frames of memory and gets told to reload instead of stalling others.
+    """
+
+    def __init__(self, topics: Set[str], maxsize: int = EVENT_QUEUE_SIZE):
+        self.topics = topics
+        self.maxsize = maxsize
+        self.overflows = 0
+        self._frames: Deque[bytes] = deque()
+        self._ready = asyncio.Event()
+
+    def push(self, frame: bytes):
+        if len(self._frames) >= self.maxsize:
+            self._frames.clear()
+            self._frames.append(RESYNC_FRAME)
+            self.overflows += 1
+            EVENT_OVERFLOWS.inc()
+        else:
+            self._frames.append(frame)
+        self._ready.set()
+
+    async def frames(self, heartbeat: float = EVENT_HEARTBEAT_SECONDS) -> AsyncIterator[bytes]:
+        """Everything queued as one chunk per wakeup, or a keepalive comment
+        after ``heartbeat`` idle seconds."""
+        while True:
+            if not self._frames:
+                self._ready.clear()
+                try:
+                    await asyncio.wait_for(self._ready.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT_FRAME
+                    continue
+            chunk = b"".join(self._frames)
+            self._frames.clear()
+            yield chunk
+
+
+class EventHub:
+    """In-process fan-out of change events to subscribers by topic.
+
+    Topics are ``project:<id>``, ``user:<id>`` and ``sound_packs``. Each
+    event is encoded once and appended to the queue of every subscriber of
+    any of its topics, so the cost of a publish is proportional to the
+    clients that receive it. Event ids carry a per-process prefix: a client
+    reconnecting with a Last-Event-ID from this process gets the events it
+    missed from a short replay buffer, any other gets a resync.
+    """
+
+    def __init__(self, replay_size: int = EVENT_REPLAY_SIZE, max_subscribers: int = MAX_EVENT_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self.published = 0
+        self._prefix = uuid.uuid4().hex[:8]
+        self._sequence = 0
+        self._topics: Dict[str, Set[Subscription]] = {}
+        self._subscribers: Set[Subscription] = set()
+        self._recent: Deque[Event] = deque(maxlen=replay_size)
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def full(self) -> bool:
+        return len(self._subscribers) >= self.max_subscribers
+
+    def subscribe(self, topics: Iterable[str], last_event_id: Optional[str] = None) -> Subscription:
+        subscription = Subscription(set(topics))
+        for topic in subscription.topics:
+            self._topics.setdefault(topic, set()).add(subscription)
+        self._subscribers.add(subscription)
+        EVENT_SUBSCRIBERS.inc()
+        if last_event_id:
+            self._replay(subscription, last_event_id)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription not in self._subscribers:
+            return
+        self._subscribers.discard(subscription)
+        for topic in subscription.topics:
+            members = self._topics.get(topic)
+            if members is not None:
+                members.discard(subscription)
+                if not members:
+                    del self._topics[topic]
+        EVENT_SUBSCRIBERS.dec()
+
+    def _replay(self, subscription: Subscription, last_event_id: str):
+        prefix, _, sequence = last_event_id.partition("-")
+        oldest = self._recent[0].sequence if self._recent else self._sequence + 1
+        if prefix != self._prefix or not sequence.isdigit() or int(sequence) + 1 < oldest:
+            subscription.push(RESYNC_FRAME)
+            return
+        for event in self._recent:
+            if event.sequence > int(sequence) and subscription.topics.intersection(event.topics):
+                subscription.push(event.frame)
+
+    def publish(self, event_type: str, topics: List[str], data: dict):
+        self._sequence += 1
+        payload = dumps({"type": event_type, "data": data})
+        frame = f"id: {self._prefix}-{self._sequence}\nevent: {event_type}\ndata: ".encode() + payload + b"\n\n"
+        event = Event(self._sequence, tuple(topics), frame)
+        self._recent.append(event)
+        self.published += 1
+        EVENTS_PUBLISHED.inc()
+
+        if len(topics) == 1:
+            recipients = self._topics.get(topics[0], ())
+        else:
+            # A client subscribed to several of the topics gets the event once
+            recipients = set()
+            for topic in topics:
+                recipients.update(self._topics.get(topic, ()))
+        for subscription in recipients:
+            subscription.push(frame)
+
+    def resync_all(self):
+        for subscription in self._subscribers:
+            subscription.push(RESYNC_FRAME)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "topics": len(self._topics),
+            "published": self.published,
+            "overflowed_subscribers": sum(1 for s in self._subscribers if s.overflows),
+        }
+
+
+class ChangeFeed:
+    """Feeds an ``EventHub`` from MongoDB writes to the watched collections.
+
+    Uses a change stream when the deployment supports one (replica sets and
+    sharded clusters), resuming after errors from the last token. Standalone
+    servers and local stand-ins have no change streams; there the feed polls
+    each collection for documents created or marked changed since the last
+    poll, which delays events by up to ``EVENT_POLL_INTERVAL``.
+    """
+
+    def __init__(self, db, hub: EventHub, collections: List[WatchedCollection],
+                 source: str = EVENT_SOURCE, poll_interval: float = EVENT_POLL_INTERVAL):
+        self.db = db
+        self.hub = hub
+        self.collections = {watched.name: watched for watched in collections}
+        self.source = source
+        self.poll_interval = poll_interval
+        self.mode: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._resume_token = None
+        self._since: Optional[datetime] = None
+        self._seen: Dict[Tuple[str, str], datetime] = {}
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def emit(self, watched: WatchedCollection, operation: str, doc: dict):
+        data = watched.encoder.document(doc)
+        if watched.view is not None:
+            data = watched.view(data)
+        self.hub.publish(f"{watched.event_prefix}.{operation}", watched.topics(doc), data)
+
+    async def _run(self):
+        if self.source != "poll":
+            try:
+                await self._watch()
+            except Exception as exc:
+                if self.source == "changestream":
+                    logger.exception("Change stream could not be opened; no events will be pushed")
+                    return
+                logger.info("Change streams unavailable (%s); polling for events instead", exc)
+        await self._poll()
+
+    # Change streams
+
+    async def _watch(self):
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": list(self.collections)},
+            "operationType": {"$in": ["insert", "update", "replace"]},
+        }}]
+        opened = False
+        while True:
+            try:
+                async with self.db.watch(pipeline, full_document="updateLookup",
+                                         resume_after=self._resume_token) as stream:
+                    self.mode = "changestream"
+                    opened = True
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        self._handle_change(change)
+            except Exception as exc:
+                # Failing to open at all means no change streams here
+                if not opened:
+                    raise
+                if isinstance(exc, OperationFailure) and exc.code == CHANGE_STREAM_HISTORY_LOST:
+                    # Too far behind to resume: start over and have clients reload
+                    self._resume_token = None
+                    self.hub.resync_all()
+                logger.exception("Change stream failed; resuming")
+                await asyncio.sleep(1)
+
+    def _handle_change(self, change: dict):
+        watched = self.collections[change["ns"]["coll"]]
+        if change["operationType"] == "update" and watched.ignored_fields:
+            description = change.get("updateDescription", {})
+            touched = set(description.get("updatedFields", {})) | set(description.get("removedFields", []))
+            if touched and touched <= watched.ignored_fields:
+                return
+        doc = change.get("fullDocument")
+        if doc is not None:  # Deleted before the lookup
+            self.emit(watched, "created" if change["operationType"] == "insert" else "updated", doc)
+
+    # Polling fallback
+
+    async def _poll(self):
+        self.mode = "poll"
+        # Naive UTC, as Motor returns stored datetimes
+        self._since = datetime.now(timezone.utc).replace(tzinfo=None)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll_once()
+            except Exception:
+                logger.exception("Event poll failed")
+
+    async def poll_once(self):
+        window_start = self._since - POLL_OVERLAP
+        latest = self._since
+        for watched in self.collections.values():
+            query = {"$or": [
+                {"created_at": {"$gte": window_start}},
+                {CHANGE_MARKER: {"$gte": window_start}},
+            ]}
+            async for doc in self.db[watched.name].find(query, {"_id": 0}):
+                created_at = doc["created_at"]
+                stamp = max(created_at, doc.get(CHANGE_MARKER) or created_at)
+                key = (watched.name, doc["id"])
+                if self._seen.get(key) == stamp:
+                    continue
+                first_seen = key not in self._seen
+                self._seen[key] = stamp
+                latest = max(latest, stamp)
+                self.emit(watched, "created" if first_seen and stamp == created_at else "updated", doc)
+        self._since = latest
+        # Forget what has left the overlap window
+        cutoff = self._since - POLL_OVERLAP
+        self._seen = {key: stamp for key, stamp in self._seen.items() if stamp >= cutoff}
+
+
+async def event_stream(hub: EventHub, subscription: Subscription) -> AsyncIterator[bytes]:
+    """The ``text/event-stream`` body for one subscription. The response
+    pulls from it only as fast as the client reads, which is what lets the
+    subscription's queue fill up for a slow client."""
+    try:
+        yield f"retry: {EVENT_RETRY_MS}\n\n".encode() + b"event: ready\ndata: {}\n\n"
+        async for chunk in subscription.frames():
+            yield chunk
+    finally:
+        hub.unsubscribe(subscription)
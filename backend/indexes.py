@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from events import CHANGE_MARKER
+from pagination import PAGE_SORT
+from samples import SAMPLE_SORT
+from vector_index import SYNC_SORT
+
+logger = logging.getLogger(__name__)
+
+# Indexes every collection needs, declared in one place. create_indexes is a
+# no-op for indexes that already exist with the same spec, so this runs on
+# every startup.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel(PAGE_SORT),
+    ],
+    "projects": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING)] + PAGE_SORT),
+        IndexModel(PAGE_SORT),
+        IndexModel([(CHANGE_MARKER, ASCENDING)], sparse=True),
+    ],
+    "sound_packs": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("genre", ASCENDING)] + PAGE_SORT),
+        IndexModel(PAGE_SORT),
+        IndexModel([("files", ASCENDING)]),
+        IndexModel([(CHANGE_MARKER, ASCENDING)], sparse=True),
+    ],
+    "contracts": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING)] + PAGE_SORT),
+        IndexModel(PAGE_SORT),
+        IndexModel([(CHANGE_MARKER, ASCENDING)], sparse=True),
+    ],
+    "contract_templates": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("contract_type", ASCENDING), ("version", DESCENDING)], unique=True),
+    ],
+    "upload_sessions": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        # Expired sessions are removed by MongoDB's TTL monitor
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "file_digests": [
+        IndexModel([("filename", ASCENDING)], unique=True),
+        IndexModel([("sha256", ASCENDING)]),
+    ],
+    "file_checksums": [
+        IndexModel([("sha256", ASCENDING)], unique=True),
+    ],
+    "blobs": [
+        IndexModel([("sha256", ASCENDING)], unique=True),
+        IndexModel([("released_at", ASCENDING)], sparse=True),
+    ],
+    "jobs": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("type", ASCENDING), ("key", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)]),
+    ],
+    "audio_analysis": [
+        IndexModel([("sha256", ASCENDING)], unique=True),
+    ],
+    "sound_pack_samples": [
+        IndexModel([("filename", ASCENDING)], unique=True),
+        IndexModel([("key", ASCENDING)] + SAMPLE_SORT),
+        IndexModel(SAMPLE_SORT),
+        IndexModel([("sha256", ASCENDING)]),
+    ],
+    "audio_embeddings": [
+        IndexModel([("sha256", ASCENDING)], unique=True),
+        IndexModel([("version", ASCENDING), ("created_at", ASCENDING), ("sha256", ASCENDING)]),
+    ],
+    "blob_aliases": [
+        IndexModel([("filename", ASCENDING)], unique=True),
+        IndexModel([("sha256", ASCENDING)]),
+    ],
+}
+
+# The filter (and sort) each endpoint issues, for plan verification.
+# Values are placeholders; only the shape matters to the planner.
+QUERY_PLANS: List[Tuple[str, str, dict, list]] = [
+    ("register_user", "users", {"email": "plan@example.com"}, []),
+    ("get_users", "users", {}, PAGE_SORT),
+    ("bulk_register_users", "users", {"email": {"$in": ["plan"]}}, []),
+    ("get_user", "users", {"id": "plan"}, []),
+    ("get_projects", "projects", {}, PAGE_SORT),
+    ("get_projects?user_id", "projects", {"user_id": "plan"}, PAGE_SORT),
+    ("get_project", "projects", {"id": "plan"}, []),
+    ("bulk_create_projects", "projects", {"id": {"$in": ["plan"]}}, []),
+    ("get_sound_packs", "sound_packs", {}, PAGE_SORT),
+    ("get_sound_packs?genre", "sound_packs", {"genre": "plan"}, PAGE_SORT),
+    ("upload_to_sound_pack", "sound_packs", {"id": "plan"}, []),
+    ("search_sync", "sound_packs", {"_id": {"$gte": "plan"}}, []),
+    ("get_contracts", "contracts", {}, PAGE_SORT),
+    ("get_contracts?user_id", "contracts", {"user_id": "plan"}, PAGE_SORT),
+    ("sign_contract", "contracts", {"id": "plan"}, []),
+    ("create_contract", "contract_templates", {"contract_type": "plan", "imported": {"$ne": True}}, [("version", DESCENDING)]),
+    ("get_contract_template", "contract_templates", {"id": "plan"}, []),
+    ("get_upload_session", "upload_sessions", {"id": "plan"}, []),
+    ("get_file_digest", "file_digests", {"filename": "plan"}, []),
+    ("download_sound_pack", "file_checksums", {"sha256": {"$in": ["plan"]}}, []),
+    ("resolve_stored_file", "blob_aliases", {"filename": "plan"}, []),
+    ("blob_commit", "blobs", {"sha256": "plan"}, []),
+    ("get_job", "jobs", {"id": "plan"}, []),
+    ("job_submit", "jobs", {"type": "plan", "key": "plan", "status": {"$in": ["queued"]}}, []),
+    ("job_requeue_expired", "jobs", {"status": "running", "leased_until": {"$lt": "plan"}}, []),
+    ("get_audio_analysis", "audio_analysis", {"sha256": "plan"}, []),
+    ("get_similar_sounds", "audio_embeddings", {"sha256": "plan", "version": 1}, []),
+    ("similarity_sync", "audio_embeddings", {"version": 1, "created_at": {"$gte": "plan"}}, SYNC_SORT),
+    ("find_similar", "blob_aliases", {"sha256": {"$in": ["plan"]}, "kind": "sound_pack"}, []),
+    ("find_similar", "file_digests", {"sha256": {"$in": ["plan"]}}, []),
+    ("find_similar", "sound_packs", {"files": {"$in": ["plan"]}}, []),
+    ("find_sound_pack_samples", "sound_pack_samples", {"key": {"$in": ["Am", "C"]}, "bpm": {"$gte": 88, "$lte": 92}}, SAMPLE_SORT),
+    ("find_sound_pack_samples?bpm", "sound_pack_samples", {"bpm": {"$gte": 88, "$lte": 92}}, SAMPLE_SORT),
+    ("run_audio_analysis", "sound_pack_samples", {"sha256": "plan"}, []),
+    ("stale_sound_pack_files", "sound_pack_samples", {"filename": {"$in": ["plan"]}}, []),
+    ("stale_sound_pack_files", "blob_aliases", {"filename": {"$in": ["plan"]}, "kind": "sound_pack"}, []),
+    # Change feed polling, used where change streams are unavailable
+    ("poll_once", "projects", {"$or": [{"created_at": {"$gte": "plan"}}, {CHANGE_MARKER: {"$gte": "plan"}}]}, []),
+    ("poll_once", "sound_packs", {"$or": [{"created_at": {"$gte": "plan"}}, {CHANGE_MARKER: {"$gte": "plan"}}]}, []),
+    ("poll_once", "contracts", {"$or": [{"created_at": {"$gte": "plan"}}, {CHANGE_MARKER: {"$gte": "plan"}}]}, []),
+]
+
+
+async def ensure_indexes(db):
+    for collection, indexes in INDEXES.items():
+        names = await db[collection].create_indexes(indexes)
+        logger.info("Indexes ready on %s: %s", collection, ", ".join(names))
+
+
+def _plan_stages(plan: dict):
+    """Yield every stage name in an explain() plan tree."""
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan", "innerStage", "outerStage"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+async def verify_query_plans(db) -> List[str]:
+    """Explain each endpoint query and return the ones that scan a collection."""
+    failures = []
+    for endpoint, collection, filter_query, sort in QUERY_PLANS:
+        cursor = db[collection].find(filter_query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        stages = list(_plan_stages(explanation["queryPlanner"]["winningPlan"]))
+        if "COLLSCAN" in stages:
+            failures.append(f"{endpoint}: {collection}.find({filter_query}) uses COLLSCAN")
+    return failures
+
+
+async def main(check: bool) -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        await ensure_indexes(db)
+        if check:
+            failures = await verify_query_plans(db)
+            for failure in failures:
+                print(f"❌ {failure}")
+            if failures:
+                return 1
+            print(f"✅ All {len(QUERY_PLANS)} endpoint queries use an index")
+        return 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(main(check="--check" in sys.argv)))
@@ -0,0 +1,129 @@
+import hashlib
+import os
+import shutil
+import time
+import uuid
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, List, Optional
+
+import aiofiles
+from fastapi import HTTPException, UploadFile
+
+from metrics import observe_upload
+
+# Upload limits (bytes)
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 512 * 1024 * 1024))
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.m4a', '.aac')
+
+
+@dataclass
+class IngestResult:
+    path: Path
+    size: int
+    sha256: str
+    crc32: int
+
+
+def check_audio_filename(filename: Optional[str]) -> str:
+    """Validate the upload name and return its lower-cased extension."""
+    if not filename or not filename.lower().endswith(AUDIO_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Invalid audio format")
+    return Path(filename).suffix.lower()
+
+
+async def write_chunks(
+    chunks: AsyncIterator[bytes],
+    dest: Path,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+) -> IngestResult:
+    """Write an async stream of byte chunks to ``dest``, checksumming as it goes.
+
+    The data is written to a temporary sibling first and only renamed into
+    place once the whole body has arrived, so readers never see a partial
+    file. Exceeding ``max_bytes`` aborts the copy with a 413.
+    """
+    tmp_path = dest.with_name(f".{dest.name}.{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    crc = 0
+    size = 0
+    started = time.perf_counter()
+    try:
+        async with aiofiles.open(tmp_path, 'wb') as f:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File exceeds maximum upload size of {max_bytes} bytes"
+                    )
+                digest.update(chunk)
+                crc = zlib.crc32(chunk, crc)
+                await f.write(chunk)
+        os.replace(tmp_path, dest)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    observe_upload(size, time.perf_counter() - started)
+    return IngestResult(path=dest, size=size, sha256=digest.hexdigest(), crc32=crc)
+
+
+async def stream_to_disk(
+    upload: UploadFile,
+    dest: Path,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> IngestResult:
+    """Copy a multipart form upload to ``dest`` in bounded chunks."""
+    async def chunks():
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    try:
+        return await write_chunks(chunks(), dest, max_bytes)
+    finally:
+        await upload.close()
+
+
+def concat_files(sources: List[Path], dest: Path) -> int:
+    """Concatenate ``sources`` into ``dest`` using kernel-side copies.
+
+    ``os.sendfile`` moves the bytes between file descriptors without passing
+    them through Python buffers. Blocking; run it in a worker thread.
+    """
+    tmp_path = dest.with_name(f".{dest.name}.{uuid.uuid4().hex}.part")
+    total = 0
+    try:
+        with open(tmp_path, 'wb', buffering=0) as out:
+            for source in sources:
+                with open(source, 'rb') as src:
+                    remaining = os.fstat(src.fileno()).st_size
+                    offset = 0
+                    try:
+                        while remaining > 0:
+                            sent = os.sendfile(out.fileno(), src.fileno(), offset, remaining)
+                            if sent == 0:
+                                break
+                            offset += sent
+                            remaining -= sent
+                    except OSError:
+                        # sendfile between regular files is not supported everywhere
+                        src.seek(offset)
+                        shutil.copyfileobj(src, out, UPLOAD_CHUNK_SIZE)
+                        offset += remaining
+                        remaining = 0
+                    total += offset
+        os.replace(tmp_path, dest)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return total
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_PROCESSES = int(os.environ.get('JOB_PROCESSES', max((os.cpu_count() or 2) - 1, 1)))
+# A running job's lease is renewed while its process is alive; a job whose
+# lease ran out was left behind by a process that died and is run again
+JOB_LEASE = timedelta(seconds=int(os.environ.get('JOB_LEASE_SECONDS', 60)))
+
+JobHandler = Callable[[dict], Awaitable[Optional[dict]]]
+
+
+class JobQueue:
+    """Persistent background job queue.
+
+    Jobs are stored in ``db.jobs`` so their status can be polled and so jobs
+    left queued by a restart are picked up again. Handlers are coroutines
+    running on the event loop; CPU-heavy work goes through
+    ``run_in_process`` so it never blocks request handling.
+
+    Several server processes share the collection. A process claims a job
+    with its ``owner`` id and a ``leased_until`` time that it keeps pushing
+    forward while the job runs; only jobs whose lease has expired, whose
+    process is gone, are put back in the queue.
+    """
+
+    def __init__(self, db, workers: int = JOB_WORKERS, processes: int = JOB_PROCESSES,
+                 lease: timedelta = JOB_LEASE):
+        self.db = db
+        self.workers = workers
+        self.processes = processes
+        self.lease = lease
+        self.owner = uuid.uuid4().hex
+        self.handlers: Dict[str, JobHandler] = {}
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._running: Set[str] = set()
+        self._tasks = []
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def register(self, job_type: str, handler: JobHandler):
+        self.handlers[job_type] = handler
+
+    async def submit(self, job_type: str, params: dict, key: Optional[str] = None,
+                     reuse_done: bool = True) -> dict:
+        """Queue a job. With ``key``, an existing queued or running (and, with
+        ``reuse_done``, finished) job of the same type and key is returned
+        instead of a new one."""
+        if job_type not in self.handlers:
+            raise ValueError(f"No handler registered for {job_type}")
+        if key is not None:
+            statuses = ["queued", "running", "done"] if reuse_done else ["queued", "running"]
+            existing = await self.db.jobs.find_one(
+                {"type": job_type, "key": key, "status": {"$in": statuses}},
+                {"_id": 0}
+            )
+            if existing:
+                return existing
+
+        job = {
+            "id": str(uuid.uuid4()),
+            "type": job_type,
+            "key": key,
+            "params": params,
+            "status": "queued",
+            "result": None,
+            "error": None,
+            "created_at": datetime.now(timezone.utc),
+            "started_at": None,
+            "finished_at": None,
+        }
+        await self.db.jobs.insert_one(job)
+        job.pop("_id", None)
+        self._queue.put_nowait(job["id"])
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.db.jobs.find_one({"id": job_id}, {"_id": 0})
+
+    async def run_in_process(self, fn, *args):
+        """Run a picklable function in the shared process pool."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.processes)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    async def start(self):
+        await self.requeue_expired()
+        async for job in self.db.jobs.find({"status": "queued"}, {"id": 1}).sort("created_at", 1):
+            self._queue.put_nowait(job["id"])
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._renew_leases()))
+
+    async def requeue_expired(self) -> int:
+        """Queue again the running jobs whose lease has expired (or that were
+        claimed before leases existed). Returns how many this process took."""
+        requeued = 0
+        expired = {"status": "running", "$or": [
+            {"leased_until": {"$lt": datetime.now(timezone.utc)}}, {"leased_until": None},
+        ]}
+        async for job in self.db.jobs.find(expired, {"id": 1}):
+            # Conditional, so that one process requeues each job
+            result = await self.db.jobs.update_one(
+                {"id": job["id"], **expired},
+                {"$set": {"status": "queued", "owner": None, "leased_until": None}}
+            )
+            if result.modified_count:
+                self._queue.put_nowait(job["id"])
+                requeued += 1
+        return requeued
+
+    async def _renew_leases(self):
+        # Also picks up the jobs of processes that died while this one runs
+        while True:
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+            try:
+                if self._running:
+                    await self.db.jobs.update_many(
+                        {"id": {"$in": list(self._running)}, "owner": self.owner},
+                        {"$set": {"leased_until": datetime.now(timezone.utc) + self.lease}}
+                    )
+                requeued = await self.requeue_expired()
+                if requeued:
+                    logger.info("Requeued %d jobs with expired leases", requeued)
+            except Exception:
+                logger.exception("Job lease renewal failed")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:
+                logger.exception("Job %s crashed", job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        # Claiming the job atomically keeps a duplicate queue entry from
+        # running it twice.
+        now = datetime.now(timezone.utc)
+        job = await self.db.jobs.find_one_and_update(
+            {"id": job_id, "status": "queued"},
+            {"$set": {"status": "running", "started_at": now, "owner": self.owner, "leased_until": now + self.lease}}
+        )
+        if not job:
+            return
+        update = {}
+        self._running.add(job_id)
+        try:
+            result = await self.handlers[job["type"]](job["params"])
+            update.update(status="done", result=result)
+        except Exception as exc:
+            logger.exception("Job %s (%s) failed", job_id, job["type"])
+            update.update(status="failed", error=str(exc) or exc.__class__.__name__)
+        finally:
+            self._running.discard(job_id)
+        update.update(finished_at=datetime.now(timezone.utc), leased_until=None)
+        # A job this process lost its lease on belongs to whoever requeued it
+        await self.db.jobs.update_one({"id": job_id, "owner": self.owner}, {"$set": update})
@@ -0,0 +1,216 @@
+import hashlib
+import mimetypes
+import uuid
+from email.utils import formatdate
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import aiofiles
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+from metrics import observe_file_serve
+
+SERVE_CHUNK_SIZE = 64 * 1024
+MAX_RANGES = 32
+
+# Stored audio files are named by UUID and never rewritten, so clients may
+# cache them forever and revalidate with the ETag.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+ByteRange = Tuple[int, int]  # Inclusive start/end offsets
+
+
+def file_sha256(path: Path) -> str:
+    """Hash a file from disk. Blocking; run it in a worker thread."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_range_header(header: str, size: int) -> Optional[List[ByteRange]]:
+    """Parse a ``Range: bytes=...`` header into sorted, merged ranges.
+
+    Returns ``None`` when the header is malformed or asks for too many
+    ranges, in which case the caller should ignore it and send the whole
+    file. Raises a 416 when every range lies outside the file.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+
+    specs = spec.split(",")
+    if len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for part in specs:
+        part = part.strip()
+        if not part:
+            continue
+        start_s, sep, end_s = part.partition("-")
+        if not sep:
+            return None
+        try:
+            if start_s == "":
+                # Suffix range: the last N bytes
+                length = int(end_s)
+                if length <= 0:
+                    continue
+                start, end = max(size - length, 0), size - 1
+            else:
+                start = int(start_s)
+                end = int(end_s) if end_s else size - 1
+                if start >= size:
+                    continue
+                if end < start:
+                    return None
+                end = min(end, size - 1)
+        except ValueError:
+            return None
+        ranges.append((start, end))
+
+    if not ranges:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+
+    # Merge overlapping and adjacent ranges
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+async def read_file_range(path: Path, start: int, end: int) -> AsyncIterator[bytes]:
+    """Yield bytes ``start``..``end`` (inclusive) of ``path`` in bounded chunks."""
+    remaining = end - start + 1
+    try:
+        async with aiofiles.open(path, 'rb') as f:
+            await f.seek(start)
+            while remaining > 0:
+                chunk = await f.read(min(SERVE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+    finally:
+        observe_file_serve(end - start + 1 - remaining)
+
+
+def serve_file(
+    request: Request,
+    path: Path,
+    sha256: str,
+    media_type: Optional[str] = None,
+    cache_control: str = IMMUTABLE_CACHE_CONTROL,
+) -> Response:
+    """Serve ``path`` with strong ETag validation and byte-range support."""
+    stat = path.stat()
+    return serve_ranges(
+        request,
+        size=stat.st_size,
+        etag=f'"{sha256}"',
+        read_range=lambda start, end: read_file_range(path, start, end),
+        media_type=media_type or mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+        last_modified=formatdate(stat.st_mtime, usegmt=True),
+        cache_control=cache_control,
+    )
+
+
+def serve_ranges(
+    request: Request,
+    size: int,
+    etag: str,
+    read_range: Callable[[int, int], AsyncIterator[bytes]],
+    media_type: str,
+    last_modified: Optional[str] = None,
+    cache_control: str = IMMUTABLE_CACHE_CONTROL,
+    extra_headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """Serve a ``size``-byte body produced by ``read_range(start, end)``.
+
+    Handles conditional requests (If-None-Match, If-Range) and single or
+    multipart byte ranges, so any body that can be regenerated byte-exactly
+    for a given ``etag`` can be resumed.
+    """
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+        **(extra_headers or {}),
+    }
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    ranges = None
+    range_header = request.headers.get("range")
+    if range_header and size > 0:
+        # A stale If-Range means the client's partial copy is outdated, so
+        # it gets the full body instead of a range.
+        if_range = request.headers.get("if-range")
+        if if_range is None or if_range.strip() in (etag, last_modified):
+            try:
+                ranges = parse_range_header(range_header, size)
+            except HTTPException as exc:
+                exc.headers = {**headers, **exc.headers}
+                raise
+
+    if not ranges:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(read_range(0, size - 1), media_type=media_type, headers=headers)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            read_range(start, end), status_code=206, media_type=media_type, headers=headers
+        )
+
+    boundary = uuid.uuid4().hex
+    part_headers = [
+        (
+            f"--{boundary}\r\nContent-Type: {media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode()
+        for start, end in ranges
+    ]
+    closing = f"--{boundary}--\r\n".encode()
+
+    async def multipart_body():
+        for (start, end), part_header in zip(ranges, part_headers):
+            yield part_header
+            async for chunk in read_range(start, end):
+                yield chunk
+            yield b"\r\n"
+        yield closing
+
+    headers["Content-Length"] = str(
+        sum(len(h) + (end - start + 1) + 2 for h, (start, end) in zip(part_headers, ranges)) + len(closing)
+    )
+    return StreamingResponse(
+        multipart_body(),
+        status_code=206,
+        media_type=f"multipart/byteranges; boundary={boundary}",
+        headers=headers
+    )
@@ -0,0 +1,148 @@
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from pymongo import monitoring
+from starlette.responses import Response
+
+# Buckets in seconds, spanning cached reads through large uploads
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+THROUGHPUT_BUCKETS = tuple(2 ** n * 1024 * 1024 for n in range(-4, 10))  # 64 KiB/s to 512 MiB/s
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route template and status",
+    ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte",
+    ["method", "route"], buckets=LATENCY_BUCKETS
+)
+HTTP_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requests currently being handled",
+    ["method"], multiprocess_mode="livesum"
+)
+HTTP_RESPONSE_BYTES = Counter(
+    "http_response_bytes_total", "Response body bytes sent", ["method", "route"]
+)
+UPLOAD_BYTES = Counter("upload_bytes_total", "Upload body bytes written to disk")
+UPLOAD_THROUGHPUT = Histogram(
+    "upload_throughput_bytes_per_second", "Per-upload receive rate", buckets=THROUGHPUT_BUCKETS
+)
+FILE_SERVE_BYTES = Counter("file_serve_bytes_total", "Bytes read from disk for file responses")
+MONGO_LATENCY = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round-trip time",
+    ["collection", "command"], buckets=MONGO_BUCKETS
+)
+MONGO_FAILURES = Counter(
+    "mongodb_command_failures_total", "Failed MongoDB commands", ["collection", "command"]
+)
+EVENT_SUBSCRIBERS = Gauge(
+    "event_stream_subscribers", "Connected server-sent event clients", multiprocess_mode="livesum"
+)
+EVENTS_PUBLISHED = Counter("events_published_total", "Change events fanned out to subscribers")
+EVENT_OVERFLOWS = Counter(
+    "event_queue_overflows_total", "Client event queues dropped for a resync because the client fell behind"
+)
+
+
+def route_label(scope) -> str:
+    """Route template the request matched, keeping label cardinality bounded."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, status, in-flight count
+    and response bytes. Latency includes streaming the whole body."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        start = time.perf_counter()
+        status = 500
+        sent = 0
+        # The route is only known once routing has run, so the in-flight
+        # gauge is labelled by method alone
+        in_progress = HTTP_IN_PROGRESS.labels(method)
+        in_progress.inc()
+
+        async def send_wrapper(message):
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.dec()
+            route = route_label(scope)
+            HTTP_REQUESTS.labels(method, route, str(status)).inc()
+            HTTP_LATENCY.labels(method, route).observe(time.perf_counter() - start)
+            HTTP_RESPONSE_BYTES.labels(method, route).inc(sent)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """PyMongo command listener timing every command per collection.
+
+    Listeners run on the driver's threads; started events are matched to
+    their outcome by request and connection id.
+    """
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        # The collection is the command's value (getMore names it separately)
+        field = "collection" if event.command_name == "getMore" else event.command_name
+        collection = event.command.get(field)
+        if not isinstance(collection, str):
+            collection = "-"
+        self._collections[(event.request_id, event.connection_id)] = collection
+
+    def _collection(self, event) -> str:
+        return self._collections.pop((event.request_id, event.connection_id), "-")
+
+    def succeeded(self, event):
+        MONGO_LATENCY.labels(self._collection(event), event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._collection(event)
+        MONGO_LATENCY.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+        MONGO_FAILURES.labels(collection, event.command_name).inc()
+
+
+def observe_upload(size: int, seconds: float):
+    UPLOAD_BYTES.inc(size)
+    if seconds > 0 and size:
+        UPLOAD_THROUGHPUT.observe(size / seconds)
+
+
+def observe_file_serve(size: int):
+    FILE_SERVE_BYTES.inc(size)
+
+
+def metrics_response() -> Response:
+    """Exposition for ``/metrics``. With PROMETHEUS_MULTIPROC_DIR set (several
+    server workers), samples from every worker are aggregated."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,151 @@
+import os
+import uuid
+import wave
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from audio_analysis import BLOCK_FRAMES, WavFormatError, WavInfo, decode_frames, read_wav_info
+
+# Runs inside the job process pool: plain arguments in, plain dict out.
+
+LIMITER_CEILING = 10 ** (-0.3 / 20)  # -0.3 dBFS
+LIMITER_WINDOW = 64  # Frames per gain step
+LIMITER_RELEASE_SECONDS = 0.1
+OUTPUT_SAMPLE_WIDTH = 2  # 16-bit PCM
+
+
+class TrackReader:
+    """Read a WAV track as stereo blocks at the mix sample rate.
+
+    Output frame ``i`` maps to source position ``i * src_rate / dst_rate``;
+    each block reads just the source frames it needs and resamples them by
+    linear interpolation, so memory stays bounded by the block size.
+    """
+
+    def __init__(self, path: Path, info: WavInfo, sample_rate: int, gain: float, pan: float):
+        self.file = open(path, 'rb')
+        self.info = info
+        self.ratio = info.sample_rate / sample_rate
+        self.frames = int(info.frames / self.ratio)
+        # Constant-power pan, normalised so the centre position is unity gain
+        theta = (pan + 1) * np.pi / 4
+        self.gains = np.array([np.cos(theta), np.sin(theta)], dtype=np.float32) * np.sqrt(2) * gain
+
+    def close(self):
+        self.file.close()
+
+    def _source(self, start: int, end: int) -> np.ndarray:
+        end = min(end, self.info.frames)
+        if end <= start:
+            return np.zeros((0, 2), dtype=np.float32)
+        self.file.seek(self.info.data_offset + start * self.info.block_align)
+        block = decode_frames(self.file.read((end - start) * self.info.block_align), self.info)
+        if block.shape[1] == 1:
+            return np.repeat(block, 2, axis=1)
+        return block[:, :2]
+
+    def read(self, out_start: int, count: int) -> np.ndarray:
+        out = np.zeros((count, 2), dtype=np.float32)
+        count = min(count, self.frames - out_start)
+        if count <= 0:
+            return out
+        if self.ratio == 1.0:
+            src = self._source(out_start, out_start + count)
+            out[:len(src)] = src
+        else:
+            positions = (out_start + np.arange(count)) * self.ratio
+            first = int(positions[0])
+            src = self._source(first, int(positions[-1]) + 2)
+            local = positions - first
+            index = np.arange(len(src))
+            for channel in range(2):
+                out[:count, channel] = np.interp(local, index, src[:, channel])
+        return out * self.gains
+
+
+class PeakLimiter:
+    """Block-based peak limiter with instant attack and exponential release."""
+
+    def __init__(self, sample_rate: int, ceiling: float = LIMITER_CEILING):
+        self.ceiling = ceiling
+        # Per-window decay of the gain reduction towards unity
+        self.release = float(np.exp(-LIMITER_WINDOW / (LIMITER_RELEASE_SECONDS * sample_rate)))
+        self.gain = 1.0
+        self.reduced_frames = 0
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        frames = len(block)
+        pad = -frames % LIMITER_WINDOW
+        padded = np.pad(np.abs(block).max(axis=1), (0, pad))
+        window_peaks = padded.reshape(-1, LIMITER_WINDOW).max(axis=1)
+        required = np.minimum(1.0, self.ceiling / np.maximum(window_peaks, 1e-12))
+
+        gains = np.empty(len(required), dtype=np.float32)
+        gain = self.gain
+        for i, req in enumerate(required):
+            gain = min(req, 1.0 - (1.0 - gain) * self.release)
+            gains[i] = gain
+        self.gain = gain
+        self.reduced_frames += int((required < 1.0).sum()) * LIMITER_WINDOW
+
+        per_frame = np.repeat(gains, LIMITER_WINDOW)[:frames]
+        return np.clip(block * per_frame[:, None], -self.ceiling, self.ceiling)
+
+
+def render_mixdown(tracks: List[Tuple[str, float, float]], out_path: str,
+                   sample_rate: Optional[int] = None, block_frames: int = BLOCK_FRAMES) -> dict:
+    """Mix ``(path, gain_db, pan)`` tracks into a 16-bit stereo WAV at ``out_path``.
+
+    Tracks are streamed block by block, so memory use is independent of
+    their length. ``sample_rate`` defaults to the highest track rate.
+    """
+    infos = []
+    skipped = []
+    for path, gain_db, pan in tracks:
+        try:
+            infos.append((Path(path), read_wav_info(Path(path)), 10 ** (gain_db / 20), pan))
+        except (WavFormatError, OSError) as exc:
+            skipped.append({"path": Path(path).name, "reason": str(exc)})
+    if not infos:
+        raise WavFormatError("No decodable WAV tracks to mix")
+    sample_rate = sample_rate or max(info.sample_rate for _, info, _, _ in infos)
+
+    readers = [TrackReader(path, info, sample_rate, gain, pan) for path, info, gain, pan in infos]
+    total_frames = max(reader.frames for reader in readers)
+    limiter = PeakLimiter(sample_rate)
+    peak = 0.0
+
+    out_path = Path(out_path)
+    tmp_path = out_path.with_name(f".{out_path.name}.{uuid.uuid4().hex}.part")
+    try:
+        with wave.open(str(tmp_path), 'wb') as out:
+            out.setnchannels(2)
+            out.setsampwidth(OUTPUT_SAMPLE_WIDTH)
+            out.setframerate(sample_rate)
+            for start in range(0, total_frames, block_frames):
+                count = min(block_frames, total_frames - start)
+                mix = np.zeros((count, 2), dtype=np.float32)
+                for reader in readers:
+                    mix += reader.read(start, count)
+                mix = limiter.process(mix)
+                peak = max(peak, float(np.abs(mix).max()))
+                out.writeframes(np.round(mix * 32767).astype("<i2").tobytes())
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    finally:
+        for reader in readers:
+            reader.close()
+
+    return {
+        "sample_rate": sample_rate,
+        "frames": total_frames,
+        "duration": round(total_frames / sample_rate, 3),
+        "peak_db": round(float(20 * np.log10(peak)), 2) if peak > 0 else -120.0,
+        "limited_seconds": round(limiter.reduced_frames / sample_rate, 3),
+        "tracks_mixed": len(readers),
+        "skipped": skipped,
+    }
@@ -0,0 +1,123 @@
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple, Type
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from pymongo import ASCENDING
+
+from serialization import dumps, encoder_for
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+
+# Keyset order shared by every list endpoint. created_at alone is not unique,
+# so id breaks ties and keeps pages stable under concurrent inserts.
+PAGE_SORT = [("created_at", ASCENDING), ("id", ASCENDING)]
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Always projected so that the keyset cursor can be built from any row
+CURSOR_FIELDS = ("id", "created_at")
+
+
+def encode_cursor(doc: dict) -> str:
+    payload = json.dumps([doc["created_at"].isoformat(), doc["id"]])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, doc_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), str(doc_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def build_projection(
+    model: Type[BaseModel],
+    fields: Optional[str],
+    view: str,
+    summary: dict,
+) -> Optional[dict]:
+    """Translate ``fields=``/``view=`` query params into a MongoDB projection.
+
+    Returns ``None`` for the full view, meaning the complete model is sent.
+    """
+    if fields:
+        requested = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = sorted(set(requested) - set(model.model_fields))
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        projection = {name: 1 for name in (*CURSOR_FIELDS, *requested)}
+    elif view == "summary":
+        projection = {name: 1 for name in CURSOR_FIELDS}
+        projection.update(summary)
+    else:
+        return None
+    projection["_id"] = 0
+    return projection
+
+
+def keyset_filter(filter_query: dict, after: Optional[str]) -> dict:
+    """Restrict ``filter_query`` to documents sorting after the cursor."""
+    if not after:
+        return filter_query
+    created_at, doc_id = decode_cursor(after)
+    return {
+        **filter_query,
+        "$or": [
+            {"created_at": {"$gt": created_at}},
+            {"created_at": created_at, "id": {"$gt": doc_id}},
+        ],
+    }
+
+
+async def fetch_page(
+    collection,
+    filter_query: dict,
+    limit: int,
+    after: Optional[str] = None,
+    projection: Optional[dict] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """Return one page of documents plus the cursor for the next page."""
+    cursor = collection.find(keyset_filter(filter_query, after), projection).sort(PAGE_SORT)
+    # One extra document tells us whether another page exists
+    docs = await cursor.limit(limit + 1).to_list(limit + 1)
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return docs[:limit], next_cursor
+
+
+def ndjson_response(
+    collection,
+    filter_query: dict,
+    model: Optional[Type[BaseModel]],
+    limit: Optional[int] = None,
+    after: Optional[str] = None,
+    projection: Optional[dict] = None,
+) -> StreamingResponse:
+    """Stream matching documents as newline-delimited JSON.
+
+    Documents are written as the Motor cursor yields each batch, so memory
+    and time to first byte do not grow with the size of the result. Pass no
+    ``model`` for projected documents, which are encoded as they are.
+    """
+    cursor = collection.find(keyset_filter(filter_query, after), projection).sort(PAGE_SORT)
+    cursor = cursor.batch_size(STREAM_BATCH_SIZE)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    encoder = encoder_for(model) if model is not None else None
+
+    async def lines():
+        async for doc in cursor:
+            if encoder is None:
+                yield dumps(doc) + b"\n"
+            else:
+                yield encoder.encode_line(doc)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -0,0 +1,183 @@
+import os
+import struct
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from audio_analysis import BLOCK_FRAMES, analyze_wav, iter_wav_blocks, read_wav_info
+
+# Peak mipmap file layout (all little-endian):
+#   header   "<4sHHIIQI": magic, version, channels, sample_rate,
+#            frames per level-0 peak, total frames, level count
+#   table    one "<Q" peak count per level
+#   levels   int16 (min, max) pairs, level 0 first; each level halves the
+#            previous one, down to MIN_LEVEL_PEAKS peaks
+# A request only ever touches O(width) peaks of one level.
+
+MAGIC = b"PKMM"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIQI")
+BASE_FRAMES = 128  # Must divide BLOCK_FRAMES
+MIN_LEVEL_PEAKS = 256
+MAX_WIDTH = 8192
+OPEN_MIPMAPS = 256
+
+assert BLOCK_FRAMES % BASE_FRAMES == 0
+
+
+def peaks_path(audio_path: Path) -> Path:
+    return audio_path.with_name(audio_path.name + ".peaks")
+
+
+class MipmapBuilder:
+    """Collect level-0 min/max peaks from decoded blocks."""
+
+    def __init__(self):
+        self._mins: List[np.ndarray] = []
+        self._maxs: List[np.ndarray] = []
+
+    def feed(self, block: np.ndarray):
+        lo, hi = block.min(axis=1), block.max(axis=1)
+        pad = -len(lo) % BASE_FRAMES
+        if pad:
+            # Only the final block is short; pad with its own edge values
+            lo = np.pad(lo, (0, pad), mode="edge")
+            hi = np.pad(hi, (0, pad), mode="edge")
+        self._mins.append(lo.reshape(-1, BASE_FRAMES).min(axis=1))
+        self._maxs.append(hi.reshape(-1, BASE_FRAMES).max(axis=1))
+
+    def write(self, path: Path, sample_rate: int, channels: int, frames: int):
+        level = np.empty((sum(len(m) for m in self._mins), 2), dtype="<i2")
+        if len(level):
+            level[:, 0] = np.round(np.clip(np.concatenate(self._mins), -1, 1) * 32767)
+            level[:, 1] = np.round(np.clip(np.concatenate(self._maxs), -1, 1) * 32767)
+        levels = [level]
+        while len(levels[-1]) > MIN_LEVEL_PEAKS:
+            prev = levels[-1]
+            if len(prev) % 2:
+                prev = np.concatenate([prev, prev[-1:]])
+            pairs = prev.reshape(-1, 2, 2)
+            nxt = np.empty((len(pairs), 2), dtype="<i2")
+            nxt[:, 0] = pairs[:, :, 0].min(axis=1)
+            nxt[:, 1] = pairs[:, :, 1].max(axis=1)
+            levels.append(nxt)
+
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, channels, sample_rate, BASE_FRAMES, frames, len(levels)))
+            f.write(struct.pack(f"<{len(levels)}Q", *(len(lv) for lv in levels)))
+            for lv in levels:
+                f.write(lv.tobytes())
+        os.replace(tmp_path, path)
+
+
+def analyze_with_peaks(audio_path: str, mipmap_path: str,
+                       on_block: Optional[Callable[[np.ndarray], None]] = None) -> dict:
+    """Run ``analyze_wav`` and write the peak mipmap from the same read pass."""
+    builder = MipmapBuilder()
+
+    def feed(block: np.ndarray):
+        builder.feed(block)
+        if on_block is not None:
+            on_block(block)
+
+    analysis = analyze_wav(audio_path, on_block=feed)
+    builder.write(Path(mipmap_path), analysis["sample_rate"], analysis["channels"], analysis["frames"])
+    return analysis
+
+
+@dataclass
+class PeakMipmap:
+    sample_rate: int
+    channels: int
+    base_frames: int
+    frames: int
+    levels: List[np.ndarray]
+
+
+_open_mipmaps: "OrderedDict[str, Tuple[int, PeakMipmap]]" = OrderedDict()
+
+
+def open_mipmap(path: Path) -> PeakMipmap:
+    """Memory-map a peak file. Mappings are kept open in a small LRU."""
+    key = str(path)
+    mtime = path.stat().st_mtime_ns
+    cached = _open_mipmaps.get(key)
+    if cached and cached[0] == mtime:
+        _open_mipmaps.move_to_end(key)
+        return cached[1]
+
+    with open(path, 'rb') as f:
+        magic, version, channels, sample_rate, base_frames, frames, count = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a peak mipmap")
+        sizes = struct.unpack(f"<{count}Q", f.read(8 * count))
+    levels = []
+    offset = HEADER.size + 8 * count
+    for size in sizes:
+        levels.append(np.memmap(path, dtype="<i2", mode="r", offset=offset, shape=(size, 2)) if size else
+                      np.empty((0, 2), dtype="<i2"))
+        offset += size * 4
+    mipmap = PeakMipmap(sample_rate, channels, base_frames, frames, levels)
+
+    _open_mipmaps[key] = (mtime, mipmap)
+    if len(_open_mipmaps) > OPEN_MIPMAPS:
+        _open_mipmaps.popitem(last=False)
+    return mipmap
+
+
+def _bucket(mins: np.ndarray, maxs: np.ndarray, width: int) -> np.ndarray:
+    """Reduce ``len(mins)`` >= ``width`` peaks to exactly ``width`` buckets."""
+    edges = np.linspace(0, len(mins), width + 1).astype(np.int64)[:-1]
+    out = np.empty((width, 2), dtype="<i2")
+    out[:, 0] = np.minimum.reduceat(mins, edges)
+    out[:, 1] = np.maximum.reduceat(maxs, edges)
+    return out
+
+
+def query_peaks(mipmap_path: Path, audio_path: Path, start: float, end: Optional[float],
+                width: int) -> Tuple[np.ndarray, int, int, float]:
+    """Return ``(peaks, start_frame, end_frame, frames_per_peak)`` for a view.
+
+    Picks the coarsest level that still has at least ``width`` peaks in the
+    range, so the work is O(width). Views zoomed in past level 0 decode the
+    (at most ``width * BASE_FRAMES``) frames straight from the WAV file.
+    """
+    mipmap = open_mipmap(mipmap_path)
+    start_frame = min(max(int(start * mipmap.sample_rate), 0), mipmap.frames)
+    end_frame = mipmap.frames if end is None else min(int(end * mipmap.sample_rate), mipmap.frames)
+    span = end_frame - start_frame
+    if span <= 0:
+        return np.empty((0, 2), dtype="<i2"), start_frame, end_frame, 0.0
+    width = min(width, span)
+
+    frames_per_peak = span / width
+    if frames_per_peak < mipmap.base_frames:
+        return _raw_peaks(audio_path, start_frame, end_frame, width), start_frame, end_frame, frames_per_peak
+
+    level_index = min(int(np.log2(frames_per_peak / mipmap.base_frames)), len(mipmap.levels) - 1)
+    level = mipmap.levels[level_index]
+    level_frames = mipmap.base_frames << level_index
+    first = start_frame // level_frames
+    last = min(-(-end_frame // level_frames), len(level))
+    window = np.asarray(level[first:last])
+    if len(window) < width:
+        width = len(window)
+    return _bucket(window[:, 0], window[:, 1], width), start_frame, end_frame, frames_per_peak
+
+
+def _raw_peaks(audio_path: Path, start_frame: int, end_frame: int, width: int) -> np.ndarray:
+    info = read_wav_info(audio_path)
+    blocks = list(iter_wav_blocks(audio_path, info, BLOCK_FRAMES, start_frame, end_frame))
+    samples = np.concatenate(blocks) if blocks else np.zeros((0, info.channels), dtype=np.float32)
+    if len(samples) < width:
+        width = len(samples)
+    if not width:
+        return np.empty((0, 2), dtype="<i2")
+    lo = np.round(np.clip(samples.min(axis=1), -1, 1) * 32767).astype("<i2")
+    hi = np.round(np.clip(samples.max(axis=1), -1, 1) * 32767).astype("<i2")
+    return _bucket(lo, hi, width)
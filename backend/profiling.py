@@ -0,0 +1,276 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pymongo import monitoring
+
+from metrics import route_label
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: nothing is sampled while PROFILE_SAMPLE_RATE is 0. The admin
+# endpoints can change these settings at runtime.
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 500))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+PROFILE_BUFFER_SIZE = int(os.environ.get('PROFILE_BUFFER_SIZE', 100))
+MAX_STACK_DEPTH = 128
+MAX_QUERIES = 200
+MAX_QUERY_CHARS = 500
+
+
+@dataclass
+class RequestProfile:
+    id: str
+    method: str
+    path: str
+    started_at: datetime
+    route: str = ""
+    status: int = 0
+    duration_ms: float = 0.0
+    samples: Counter = field(default_factory=Counter)  # Collapsed stack -> sample count
+    queries: List[dict] = field(default_factory=list)
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 2),
+            "sample_count": sum(self.samples.values()),
+            "top_frames": self.top_frames(),
+            "queries": self.queries,
+        }
+
+    def top_frames(self, limit: int = 10) -> List[dict]:
+        """Leaf frames with the most samples, i.e. where the time went."""
+        leaves = Counter()
+        for stack, count in self.samples.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return [{"frame": frame, "samples": count} for frame, count in leaves.most_common(limit)]
+
+
+_current_profile: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar(
+    "current_profile", default=None
+)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{code.co_name}"
+
+
+def collapse_stack(frame) -> str:
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _shape(value, depth: int = 0):
+    """Query structure with every literal replaced by its type name, so
+    captured commands never carry user data."""
+    if depth > 4:
+        return "..."
+    if isinstance(value, dict):
+        return {key: _shape(item, depth + 1) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_shape(value[0], depth + 1)] if value else []
+    return type(value).__name__
+
+
+class Profiler:
+    """Sampling profiler for request handling on the event loop.
+
+    A fraction of requests is selected for profiling. While any selected
+    request is in flight, a daemon thread samples the event loop thread's
+    stack every ``interval_ms`` and credits the sample to the request whose
+    task is running. The Mongo commands a selected request issues are
+    recorded through a PyMongo listener; Motor runs commands with the
+    caller's context, so the request is found through a context variable.
+    Requests slower than ``slow_ms`` are kept in a ring buffer.
+    """
+
+    def __init__(self, sample_rate: float = PROFILE_SAMPLE_RATE, slow_ms: float = PROFILE_SLOW_MS,
+                 interval_ms: float = PROFILE_INTERVAL_MS, buffer_size: int = PROFILE_BUFFER_SIZE):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.interval_ms = interval_ms
+        self.captured: "deque[RequestProfile]" = deque(maxlen=buffer_size)
+        self._active: Dict[asyncio.Task, RequestProfile] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._sampler: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        # Guards _active so no sample lands on a profile after it has ended
+        self._lock = threading.Lock()
+
+    def settings(self) -> dict:
+        return {
+            "sample_rate": self.sample_rate,
+            "slow_ms": self.slow_ms,
+            "interval_ms": self.interval_ms,
+            "buffer_size": self.captured.maxlen,
+            "captured": len(self.captured),
+            "in_flight": len(self._active),
+        }
+
+    def configure(self, sample_rate: Optional[float] = None, slow_ms: Optional[float] = None,
+                  interval_ms: Optional[float] = None):
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if slow_ms is not None:
+            self.slow_ms = slow_ms
+        if interval_ms is not None:
+            self.interval_ms = interval_ms
+        if self.sample_rate > 0 and self._loop is not None:
+            self._start_sampler()
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """Bind to the serving event loop; call from the loop's thread."""
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+        if self.sample_rate > 0:
+            self._start_sampler()
+
+    def stop(self):
+        self._stopping.set()
+        if self._sampler is not None:
+            self._sampler.join(timeout=1)
+            self._sampler = None
+
+    def _start_sampler(self):
+        if self._sampler is not None and self._sampler.is_alive():
+            return
+        self._stopping.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+        self._sampler.start()
+
+    def _sample_loop(self):
+        while not self._stopping.wait(self.interval_ms / 1000):
+            if not self._active:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = collapse_stack(frame) if frame is not None else None
+            with self._lock:
+                profile = self._active.get(asyncio.current_task(self._loop))
+                if profile is not None and stack is not None:
+                    profile.samples[stack] += 1
+
+    def begin(self, scope) -> Optional[RequestProfile]:
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        profile = RequestProfile(
+            id=uuid.uuid4().hex,
+            method=scope["method"],
+            path=scope["path"],
+            started_at=datetime.now(timezone.utc),
+        )
+        with self._lock:
+            self._active[asyncio.current_task()] = profile
+        _current_profile.set(profile)
+        return profile
+
+    def end(self, profile: RequestProfile, scope, status: int, duration: float):
+        with self._lock:
+            self._active.pop(asyncio.current_task(), None)
+        _current_profile.set(None)
+        profile.route = route_label(scope)
+        profile.status = status
+        profile.duration_ms = duration * 1000
+        if profile.duration_ms >= self.slow_ms:
+            self.captured.append(profile)
+            logger.info("Captured slow request %s %s (%.1f ms)", profile.method, profile.path, profile.duration_ms)
+
+    def find(self, profile_id: str) -> Optional[RequestProfile]:
+        return next((p for p in self.captured if p.id == profile_id), None)
+
+    def collapsed(self, profile_id: Optional[str] = None) -> str:
+        """Captured samples as collapsed stacks (``frame;frame count`` per
+        line), the input format of flamegraph.pl and speedscope."""
+        if profile_id is not None:
+            profile = self.find(profile_id)
+            profiles = [profile] if profile else []
+        else:
+            profiles = list(self.captured)
+        totals = Counter()
+        for profile in profiles:
+            totals.update(profile.samples)
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(totals.items()))
+
+
+class ProfilingMiddleware:
+    """ASGI middleware feeding sampled requests to a ``Profiler``."""
+
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.profiler.sample_rate <= 0:
+            return await self.app(scope, receive, send)
+        profile = self.profiler.begin(scope)
+        if profile is None:
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.profiler.end(profile, scope, status, time.perf_counter() - start)
+
+
+class ProfilingCommandListener(monitoring.CommandListener):
+    """Record the Mongo commands issued by the request being profiled."""
+
+    def __init__(self):
+        self._pending: Dict[tuple, dict] = {}
+
+    def started(self, event):
+        profile = _current_profile.get()
+        if profile is None or len(profile.queries) >= MAX_QUERIES:
+            return
+        command = {key: value for key, value in event.command.items() if not key.startswith("$") and key != "lsid"}
+        query = {
+            "command": event.command_name,
+            "database": event.database_name,
+            "shape": json.dumps(_shape(command), default=str)[:MAX_QUERY_CHARS],
+            "duration_ms": None,
+        }
+        profile.queries.append(query)
+        self._pending[(event.request_id, event.connection_id)] = query
+
+    def succeeded(self, event):
+        query = self._pending.pop((event.request_id, event.connection_id), None)
+        if query is not None:
+            query["duration_ms"] = round(event.duration_micros / 1000, 3)
+
+    def failed(self, event):
+        query = self._pending.pop((event.request_id, event.connection_id), None)
+        if query is not None:
+            query["duration_ms"] = round(event.duration_micros / 1000, 3)
+            query["failure"] = str(event.failure.get("errmsg", "")) if isinstance(event.failure, dict) else "failed"
@@ -0,0 +1,87 @@
+import base64
+import json
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from pymongo import ASCENDING
+
+# Sound pack files by tempo and key. Pages are ordered by BPM so a range
+# query walks the (key, bpm, filename) index in order; filename is unique
+# and breaks ties.
+SAMPLE_SORT = [("bpm", ASCENDING), ("filename", ASCENDING)]
+SAMPLE_PROJECTION = {
+    "_id": 0, "filename": 1, "pack_id": 1, "sha256": 1, "bpm": 1, "bpm_confidence": 1,
+    "key": 1, "key_confidence": 1, "duration": 1, "created_at": 1,
+}
+DEFAULT_BPM_TOLERANCE = 2.0
+
+# Copied from a file's analysis onto its sample rows
+SAMPLE_ANALYSIS_FIELDS = ("bpm", "bpm_confidence", "key", "key_confidence", "duration", "tempo_key_version")
+
+
+def encode_sample_cursor(doc: dict) -> str:
+    payload = json.dumps([doc.get("bpm"), doc["filename"]])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_sample_cursor(cursor: str) -> Tuple[Optional[float], str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        bpm, filename = json.loads(base64.urlsafe_b64decode(padded))
+        if bpm is not None:
+            bpm = float(bpm)
+        return bpm, str(filename)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def bpm_ranges(bpm_min: Optional[float], bpm_max: Optional[float], half_time: bool) -> List[dict]:
+    """BPM conditions to match, with the half- and double-time ranges when
+    asked for: tempo estimates are often an octave off, and a 70 BPM loop
+    works in a 140 BPM project."""
+    if bpm_min is None and bpm_max is None:
+        return []
+    ranges = [(bpm_min, bpm_max)]
+    if half_time:
+        ranges = [(None if lo is None else lo * factor, None if hi is None else hi * factor)
+                  for factor in (0.5, 1, 2) for lo, hi in ranges]
+    conditions = []
+    for lo, hi in ranges:
+        condition = {"$type": "number"}
+        if lo is not None:
+            condition["$gte"] = lo
+        if hi is not None:
+            condition["$lte"] = hi
+        conditions.append({"bpm": condition})
+    return conditions
+
+
+def sample_filter(keys: Optional[List[str]], ranges: List[dict], after: Optional[str]) -> dict:
+    clauses = []
+    if keys is not None:
+        clauses.append({"key": {"$in": keys}})
+    if len(ranges) == 1:
+        clauses.append(ranges[0])
+    elif ranges:
+        clauses.append({"$or": ranges})
+    if after:
+        bpm, filename = decode_sample_cursor(after)
+        if bpm is None:
+            # Files without a tempo sort first
+            clauses.append({"$or": [{"bpm": None, "filename": {"$gt": filename}}, {"bpm": {"$type": "number"}}]})
+        else:
+            # The $gte bound keeps the scan on the index; the $or drops the
+            # files at the cursor's BPM already returned
+            clauses.append({"bpm": {"$gte": bpm}})
+            clauses.append({"$or": [{"bpm": {"$gt": bpm}}, {"filename": {"$gt": filename}}]})
+    if not clauses:
+        return {}
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+async def fetch_samples(collection, filter_query: dict, limit: int) -> Tuple[List[dict], Optional[str]]:
+    cursor = collection.find(filter_query, SAMPLE_PROJECTION).sort(SAMPLE_SORT)
+    # One extra document tells us whether another page exists
+    docs = await cursor.limit(limit + 1).to_list(limit + 1)
+    next_cursor = encode_sample_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return docs[:limit], next_cursor
@@ -0,0 +1,280 @@
+import bisect
+import heapq
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+from bson import ObjectId
+
+SEARCH_SYNC_INTERVAL = int(os.environ.get('SEARCH_SYNC_INTERVAL_SECONDS', 15))
+# ObjectIds made by different workers are ordered only to the second, and
+# by each worker's clock, so every sync re-reads this much of the last one
+SEARCH_SYNC_OVERLAP = timedelta(seconds=10)
+FACET_LIMIT = 20
+
+# A term found in a more descriptive field ranks the pack higher
+FIELD_WEIGHTS = {"name": 4.0, "tags": 3.0, "author": 2.0, "genre": 2.0, "description": 1.0}
+INDEX_PROJECTION = {
+    "_id": 1, "id": 1, "name": 1, "description": 1, "genre": 1, "author": 1,
+    "tags": 1, "is_premium": 1, "created_at": 1, "files": 1,
+}
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lower-case, accent-folded word tokens."""
+    if not text:
+        return []
+    text = text.casefold()
+    if not text.isascii():
+        folded = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in folded if not unicodedata.combining(c))
+    return TOKEN_PATTERN.findall(text)
+
+
+class _Column:
+    """Append-only numpy column with amortised growth."""
+
+    def __init__(self, dtype):
+        self._data = np.zeros(1024, dtype=dtype)
+        self._size = 0
+
+    def append(self, value):
+        if self._size == len(self._data):
+            self._data = np.concatenate([self._data, np.zeros_like(self._data)])
+        self._data[self._size] = value
+        self._size += 1
+
+    def __setitem__(self, index, value):
+        self._data[index] = value
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._data[:self._size]
+
+
+class SoundPackSearchIndex:
+    """In-memory inverted index over sound pack metadata.
+
+    Every indexed pack gets a document number. Postings map each term to
+    the documents containing it with a field-weighted score, while genre,
+    premium flag, tags and creation time live in numpy columns so that
+    filters and facet counts are vectorised over the whole catalogue.
+    Re-adding a pack retires its old document number, and retired
+    documents are masked out.
+
+    The index is updated in-process by the write endpoints, and ``sync``
+    pulls packs created through other workers using the list keyset order.
+    """
+
+    def __init__(self):
+        self._docs: List[dict] = []
+        self._doc_numbers: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+        self._genres: Dict[str, int] = {}
+        self._genre_names: List[str] = []
+        self._tags: Dict[str, int] = {}
+        self._tag_names: List[str] = []
+        self._alive = _Column(bool)
+        self._premium = _Column(bool)
+        self._genre = _Column(np.int32)
+        self._created = _Column(np.float64)
+        self._tag_doc = _Column(np.int32)
+        self._tag_code = _Column(np.int32)
+        self.last_inserted: Optional[datetime] = None  # Newest ObjectId time synced
+
+    def __len__(self) -> int:
+        return len(self._doc_numbers)
+
+    @staticmethod
+    def _code(value: str, codes: Dict[str, int], names: List[str]) -> int:
+        key = value.casefold()
+        if key not in codes:
+            codes[key] = len(names)
+            names.append(value)
+        return codes[key]
+
+    @staticmethod
+    def _terms(doc: dict) -> Dict[str, float]:
+        terms: Dict[str, float] = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            value = doc.get(field)
+            text = " ".join(value) if isinstance(value, list) else value
+            for token in set(tokenize(text)):
+                terms[token] += weight
+        return terms
+
+    def add(self, pack: dict):
+        """Index a pack document, replacing any earlier version of it."""
+        created_at = pack["created_at"]
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        doc = {
+            "id": pack["id"],
+            "name": pack["name"],
+            "description": pack.get("description"),
+            "genre": pack["genre"],
+            "author": pack["author"],
+            "tags": list(pack.get("tags", [])),
+            "is_premium": bool(pack.get("is_premium", False)),
+            "file_count": len(pack.get("files", [])),
+            "created_at": created_at,
+        }
+        self.remove(doc["id"])
+
+        number = len(self._docs)
+        self._docs.append(doc)
+        self._doc_numbers[doc["id"]] = number
+        self._alive.append(True)
+        self._premium.append(doc["is_premium"])
+        self._genre.append(self._code(doc["genre"], self._genres, self._genre_names))
+        self._created.append(created_at.timestamp())
+        for tag in {tag.casefold(): tag for tag in doc["tags"]}.values():
+            self._tag_doc.append(number)
+            self._tag_code.append(self._code(tag, self._tags, self._tag_names))
+        for token, weight in self._terms(doc).items():
+            if token not in self._postings:
+                self._vocabulary_dirty = True
+            self._postings[token][number] = weight
+
+    def remove(self, pack_id: str):
+        number = self._doc_numbers.pop(pack_id, None)
+        if number is None:
+            return
+        self._alive[number] = False
+        for token in self._terms(self._docs[number]):
+            postings = self._postings.get(token, {})
+            postings.pop(number, None)
+            if not postings and token in self._postings:
+                del self._postings[token]
+                self._vocabulary_dirty = True
+
+    def add_files(self, pack_id: str, count: int = 1):
+        number = self._doc_numbers.get(pack_id)
+        if number is not None:
+            self._docs[number]["file_count"] += count
+
+    async def sync(self, collection) -> int:
+        """Index packs inserted since the last sync; returns how many were new.
+
+        Walks ``_id``, which follows insertion time, rather than created_at:
+        bulk imports insert packs with their original, older creation times.
+        """
+        query = {}
+        if self.last_inserted is not None:
+            query = {"_id": {"$gte": ObjectId.from_datetime(self.last_inserted - SEARCH_SYNC_OVERLAP)}}
+        synced = 0
+        async for pack in collection.find(query, INDEX_PROJECTION):
+            number = self._doc_numbers.get(pack["id"])
+            if number is None:
+                self.add(pack)
+                synced += 1
+            else:
+                # Created by this worker or re-read in the overlap; metadata
+                # is current, file counts may not be
+                self._docs[number]["file_count"] = len(pack.get("files", []))
+            inserted = pack["_id"].generation_time
+            if self.last_inserted is None or inserted > self.last_inserted:
+                self.last_inserted = inserted
+        return synced
+
+    def _match(self, tokens: List[str]):
+        """Documents containing every token, with their summed scores."""
+        postings = sorted((self._postings.get(token, {}) for token in set(tokens)), key=len)
+        numbers = [n for n in postings[0] if all(n in other for other in postings[1:])]
+        scores = [sum(p[n] for p in postings) for n in numbers]
+        return np.array(numbers, dtype=np.int64), np.array(scores, dtype=np.float64)
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        genre: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        premium: Optional[bool] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> dict:
+        """Return ranked hits plus genre, tag and premium facet counts.
+
+        Terms are ANDed and ranked by field weight, newest first on ties
+        (and for browsing without a query). Facets count the full filtered
+        result, not just the returned page.
+        """
+        mask = self._alive.values.copy()
+        score = None
+        tokens = tokenize(query)
+        if tokens:
+            numbers, scores = self._match(tokens)
+            matched = np.zeros(len(mask), dtype=bool)
+            matched[numbers] = True
+            mask &= matched
+            score = np.zeros(len(mask))
+            score[numbers] = scores
+        if genre is not None:
+            code = self._genres.get(genre.casefold(), -1)
+            mask &= self._genre.values == code
+        if premium is not None:
+            mask &= self._premium.values == premium
+        tag_doc, tag_code = self._tag_doc.values, self._tag_code.values
+        for tag in tags or []:
+            code = self._tags.get(tag.casefold(), -1)
+            tagged = np.zeros(len(mask), dtype=bool)
+            tagged[tag_doc[tag_code == code]] = True
+            mask &= tagged
+
+        selected = np.flatnonzero(mask)
+        # Rank by score, then recency; only the requested page is fully sorted
+        key = self._created.values[selected]
+        if score is not None:
+            key = key + score[selected] * 1e12
+        wanted = min(offset + limit, len(selected))
+        if wanted < len(selected):
+            top = np.argpartition(-key, wanted - 1)[:wanted] if wanted else np.empty(0, dtype=np.int64)
+        else:
+            top = np.arange(len(selected))
+        top = top[np.argsort(-key[top], kind="stable")][offset:]
+
+        genre_counts = np.bincount(self._genre.values[selected], minlength=len(self._genre_names))
+        tag_counts = np.bincount(tag_code[mask[tag_doc]], minlength=len(self._tag_names))
+        premium_count = int(np.count_nonzero(self._premium.values[selected]))
+        return {
+            "total": int(len(selected)),
+            "results": [
+                {**self._docs[n], "score": float(score[n]) if score is not None else None}
+                for n in selected[top]
+            ],
+            "facets": {
+                "genre": self._top_facets(genre_counts, self._genre_names),
+                "tags": self._top_facets(tag_counts, self._tag_names),
+                "is_premium": {"true": premium_count, "false": int(len(selected)) - premium_count},
+            },
+        }
+
+    @staticmethod
+    def _top_facets(counts: np.ndarray, names: List[str]) -> List[dict]:
+        nonzero = np.flatnonzero(counts)
+        order = nonzero[np.argsort(-counts[nonzero], kind="stable")][:FACET_LIMIT]
+        return [{"value": names[i], "count": int(counts[i])} for i in order]
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[dict]:
+        """Indexed terms starting with ``prefix``, most common first."""
+        tokens = tokenize(prefix)
+        if not tokens:
+            return []
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        stem = tokens[-1]
+        start = bisect.bisect_left(self._vocabulary, stem)
+        end = bisect.bisect_left(self._vocabulary, stem + "\U0010ffff")
+        terms = heapq.nlargest(
+            limit, self._vocabulary[start:end], key=lambda term: len(self._postings[term])
+        )
+        return [{"term": term, "count": len(self._postings[term])} for term in terms]
@@ -1,25 +1,64 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Form
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Form, Request, Response, Query, Header, Depends
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional, Tuple
 import uuid
-from datetime import datetime, timezone
+import asyncio
+import hashlib
+import hmac
+import json
+import re
+from array import array
+import mimetypes
+from datetime import datetime, timedelta, timezone
 import shutil
-import aiofiles
+import time
+from collections import OrderedDict
+import numpy as np
 from fastapi.staticfiles import StaticFiles
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from ingest import check_audio_filename, stream_to_disk, write_chunks, concat_files, MAX_UPLOAD_BYTES
+from media import IMMUTABLE_CACHE_CONTROL, etag_matches, file_sha256, serve_file, serve_ranges
+from indexes import ensure_indexes, verify_query_plans
+from blobstore import BlobStore
+from jobs import JobQueue
+from peaks import MAX_WIDTH, analyze_with_peaks, peaks_path, query_peaks
+from audio_analysis import WavFormatError
+from embeddings import EMBEDDING_DIM, EMBEDDING_VERSION, analyze_sound_pack_file, embed_wav
+from tempo_key import TEMPO_KEY_VERSION, compatible_keys, key_name, parse_key
+from vector_index import VECTOR_SYNC_INTERVAL, VectorIndex
+from mixdown import render_mixdown
+from zipstream import ZipEntry, ZipLayout, file_crc32
+from counters import BatchedCounter
+from search import SEARCH_SYNC_INTERVAL, SoundPackSearchIndex
+from cache import create_cache
+from contract_templates import DEFAULT_CONTRACT_TYPE, ContractTemplates
+from signatures import (
+    SIGNATURE_CACHE_CONTROL, SIGNATURE_EXTENSION, SIGNATURE_MEDIA_TYPE,
+    InvalidSignature, SignatureTooLarge, decode_signature
+)
+from metrics import MetricsMiddleware, MongoCommandMetrics, metrics_response
+from profiling import Profiler, ProfilingCommandListener, ProfilingMiddleware
+from transcode import BITRATES, DEFAULT_BITRATE, FORMATS, TranscodeCache, TranscodeError
+from bulk import IMPORT_HEADERS, bulk_import
+from serialization import FastJSONResponse, dumps, encoder_for
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, build_projection, fetch_page, ndjson_response
+from samples import DEFAULT_BPM_TOLERANCE, SAMPLE_ANALYSIS_FIELDS, bpm_ranges, fetch_samples, sample_filter
+from events import CHANGE_MARKER, ChangeFeed, EventHub, WatchedCollection, event_stream
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics(), ProfilingCommandListener()])
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
@@ -33,6 +72,52 @@ audio_dir = Path("audio_files")
 audio_dir.mkdir(exist_ok=True)
 sound_packs_dir = Path("sound_packs")
 sound_packs_dir.mkdir(exist_ok=True)
+upload_parts_dir = Path("upload_parts")
+upload_parts_dir.mkdir(exist_ok=True)
+
+# Content-addressed store for uploaded audio; the directories above keep
+# serving files stored before it existed.
+blob_store = BlobStore(db, Path(os.environ.get('BLOB_STORE_DIR', 'blob_store')))
+BLOB_GC_INTERVAL = int(os.environ.get('BLOB_GC_INTERVAL_SECONDS', 3600))
+
+# Encoded delivery variants (?format=&bitrate=), bounded LRU on disk
+transcode_cache = TranscodeCache(Path(os.environ.get('TRANSCODE_CACHE_DIR', 'transcode_cache')))
+
+# Background jobs (audio analysis etc.), run off the request path
+job_queue = JobQueue(db)
+
+# Sound pack download counts are buffered and written in periodic batches
+download_counter = BatchedCounter(db.sound_packs, "download_count")
+
+# In-process search index over sound pack metadata
+search_index = SoundPackSearchIndex()
+
+# Audio similarity over sound pack files, keyed by content hash
+similarity_index = VectorIndex(Path(os.environ.get('VECTOR_INDEX_DIR', 'vector_index')), EMBEDDING_DIM, EMBEDDING_VERSION)
+MAX_SIMILARITY_CLIP_BYTES = int(os.environ.get('MAX_SIMILARITY_CLIP_BYTES', 32 * 1024 * 1024))
+
+# Read-through cache for hot documents and list pages; every write path
+# below invalidates what it changes
+document_cache = create_cache()
+
+# Versioned contract terms, stored once and referenced from each contract
+contract_templates = ContractTemplates(db)
+
+# Project, sound pack and contract changes pushed to clients over
+# server-sent events, fed by a change feed set up with the models below
+event_hub = EventHub()
+
+# Opt-in request profiler (PROFILE_SAMPLE_RATE or the admin endpoints)
+profiler = Profiler()
+
+# Admin endpoints are disabled unless a token is configured
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# Multipart upload session settings
+UPLOAD_PART_SIZE = int(os.environ.get('UPLOAD_PART_SIZE', 8 * 1024 * 1024))
+MAX_UPLOAD_PART_BYTES = int(os.environ.get('MAX_UPLOAD_PART_BYTES', 64 * 1024 * 1024))
+MAX_UPLOAD_PARTS = 10000
+UPLOAD_SESSION_TTL = timedelta(hours=int(os.environ.get('UPLOAD_SESSION_TTL_HOURS', 24)))
 
 # Define Models
 class User(BaseModel):
@@ -71,6 +156,18 @@ class ProjectCreate(BaseModel):
     bpm: Optional[int] = 120
     key_signature: Optional[str] = "C"
 
+# Bulk import records; id and created_at may be carried over from the source
+class UserImport(UserCreate):
+    id: Optional[str] = None
+    membership_tier: str = "free"
+    created_at: Optional[datetime] = None
+
+class ProjectImport(ProjectCreate):
+    id: Optional[str] = None
+    user_id: str
+    is_public: bool = False
+    created_at: Optional[datetime] = None
+
 class SoundPack(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
@@ -83,6 +180,18 @@ class SoundPack(BaseModel):
     download_count: int = 0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+# One row per sound pack file, with the tempo and key found by analysis
+class SoundPackSample(BaseModel):
+    filename: str
+    pack_id: str
+    sha256: str
+    bpm: Optional[float] = None
+    bpm_confidence: Optional[float] = None
+    key: Optional[str] = None
+    key_confidence: Optional[float] = None
+    duration: Optional[float] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
 class SoundPackCreate(BaseModel):
     name: str
     description: Optional[str] = None
@@ -90,14 +199,21 @@ class SoundPackCreate(BaseModel):
     tags: List[str] = []
     is_premium: bool = False
 
+class SoundPackImport(SoundPackCreate):
+    id: Optional[str] = None
+    author: str
+    created_at: Optional[datetime] = None
+
 class Contract(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
     artist_name: str
-    contract_type: str = "artist_agreement"  # artist_agreement, collaboration, licensing
-    terms: str
+    contract_type: str = "artist_agreement"  # artist_agreement, collaboration, licensing; selects the template
+    template_id: Optional[str] = None  # Template version the terms come from
+    template_version: Optional[int] = None
     signed_at: Optional[datetime] = None
-    signature_data: Optional[str] = None  # Base64 signature image
+    signature_file: Optional[str] = None  # Blob store name of the PNG signature
+    signature_sha256: Optional[str] = None
     status: str = "pending"  # pending, signed, cancelled
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -106,7 +222,129 @@ class ContractCreate(BaseModel):
     contract_type: str = "artist_agreement"
 
 class ContractSign(BaseModel):
-    signature_data: str  # Base64 signature image
+    signature_data: str  # Base64 PNG, bare or as a data: URL
+
+class ContractTemplateCreate(BaseModel):
+    contract_type: str = Field(..., min_length=1, max_length=64, pattern=r"^[a-z0-9_]+$")
+    title: str = Field(..., min_length=1, max_length=200)
+    body: str = Field(..., min_length=1, max_length=100_000)  # $artist_name is filled in per contract
+
+class ProfilingSettings(BaseModel):
+    sample_rate: Optional[float] = Field(None, ge=0, le=1)  # Fraction of requests profiled
+    slow_ms: Optional[float] = Field(None, ge=0)  # Capture threshold
+    interval_ms: Optional[float] = Field(None, ge=1, le=1000)  # Stack sampling period
+
+class TrackMix(BaseModel):
+    gain_db: float = Field(0.0, ge=-60, le=12)
+    pan: float = Field(0.0, ge=-1, le=1)  # -1 left, 1 right
+    muted: bool = False
+
+class MixdownRequest(BaseModel):
+    tracks: Dict[str, TrackMix] = {}  # Keyed by track file name; others use defaults
+    sample_rate: Optional[int] = Field(None, ge=8000, le=192000)
+
+class UploadPart(BaseModel):
+    size: int
+    sha256: str
+
+class UploadSession(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    project_id: str
+    filename: str  # Original client file name
+    extension: str
+    part_size: int = UPLOAD_PART_SIZE
+    total_size: Optional[int] = None
+    parts: Dict[str, UploadPart] = {}  # Keyed by part number
+    status: str = "open"  # open, completing, completed
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    expires_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc) + UPLOAD_SESSION_TTL)
+
+# Lightweight list views: heavy arrays and text are replaced by counts or left out
+PROJECT_SUMMARY = {
+    "title": 1, "description": 1, "user_id": 1, "bpm": 1, "key_signature": 1,
+    "updated_at": 1, "is_public": 1,
+    "track_count": {"$size": {"$ifNull": ["$tracks", []]}},
+}
+SOUND_PACK_SUMMARY = {
+    "name": 1, "description": 1, "genre": 1, "author": 1, "tags": 1,
+    "is_premium": 1, "download_count": 1,
+    "file_count": {"$size": {"$ifNull": ["$files", []]}},
+}
+CONTRACT_SUMMARY = {
+    "user_id": 1, "artist_name": 1, "contract_type": 1, "template_version": 1, "signed_at": 1, "status": 1,
+}
+USER_SUMMARY = {
+    "username": 1, "full_name": 1, "is_artist": 1, "membership_tier": 1,
+}
+
+# Change events. Project events go to the project's page and to the owner's
+# and collaborators' dashboards, contract events to their user; sound pack
+# events carry the summary view. Download count bumps and the record of a
+# project's latest mixdown are not pushed.
+def project_topics(project: dict) -> List[str]:
+    user_ids = {project["user_id"], *project.get("collaborators", [])}
+    return [f"project:{project['id']}", *(f"user:{user_id}" for user_id in user_ids)]
+
+def sound_pack_event_view(pack: dict) -> dict:
+    files = pack.pop("files")
+    pack["file_count"] = len(files)
+    return pack
+
+change_feed = ChangeFeed(db, event_hub, [
+    WatchedCollection(
+        "projects", "project", encoder_for(Project), project_topics,
+        ignored_fields=frozenset({"mixdown_file"})
+    ),
+    WatchedCollection(
+        "sound_packs", "sound_pack", encoder_for(SoundPack), lambda pack: ["sound_packs"],
+        ignored_fields=frozenset({"download_count"}), view=sound_pack_event_view
+    ),
+    WatchedCollection("contracts", "contract", encoder_for(Contract), lambda contract: [f"user:{contract['user_id']}"]),
+])
+
+# Shared list endpoint behaviour: keyset pages, or an NDJSON stream
+async def list_documents(
+    collection,
+    filter_query: dict,
+    model,
+    limit: Optional[int],
+    after: Optional[str],
+    format: str,
+    projection: Optional[dict] = None,
+    cache_namespace: Optional[str] = None
+):
+    # Projected documents are partial, so they skip the response model
+    if format == "ndjson":
+        return ndjson_response(collection, filter_query, None if projection else model, limit, after, projection)
+    
+    async def load_page():
+        return await fetch_page(collection, filter_query, limit or DEFAULT_PAGE_SIZE, after, projection)
+    
+    if cache_namespace:
+        page_key = hashlib.sha1(
+            json.dumps([filter_query, limit, after, projection], sort_keys=True).encode()
+        ).hexdigest()
+        docs, next_cursor = await document_cache.get_or_load(cache_namespace, page_key, load_page, versioned=True)
+    else:
+        docs, next_cursor = await load_page()
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    # Encoded straight to JSON bytes: returning a Response skips FastAPI's
+    # response_model validation, which the route keeps for the OpenAPI schema
+    if projection:
+        return FastJSONResponse(dumps(docs), headers=headers)
+    return FastJSONResponse(encoder_for(model).encode(docs), headers=headers)
+
+PageLimit = Query(None, ge=1, le=MAX_PAGE_SIZE)
+ListFormat = Literal["json", "ndjson"]
+ListView = Literal["full", "summary"]
+FieldsParam = Query(None, description="Comma-separated fields to return; id and created_at are always included")
+
+# Admin-only endpoints are disabled unless ADMIN_TOKEN is set
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
 
 # Authentication endpoints
 @api_router.post("/auth/register", response_model=User)
@@ -118,16 +356,30 @@ async def register_user(user_data: UserCreate):
     
     user = User(**user_data.dict())
     await db.users.insert_one(user.dict())
+    await document_cache.invalidate("users", user.id)
     return user
 
+@api_router.post("/auth/register/bulk", dependencies=[Depends(require_admin)])
+async def bulk_register_users(request: Request):
+    # NDJSON of UserImport records; duplicate emails are skipped like in register_user
+    return await bulk_import(request.stream(), db.users, UserImport, User, unique_fields=("id", "email"))
+
 @api_router.get("/auth/users", response_model=List[User])
-async def get_users():
-    users = await db.users.find().to_list(1000)
-    return [User(**user) for user in users]
+async def get_users(
+    limit: Optional[int] = PageLimit,
+    after: Optional[str] = None,
+    format: ListFormat = "json",
+    fields: Optional[str] = FieldsParam,
+    view: ListView = "full"
+):
+    projection = build_projection(User, fields, view, USER_SUMMARY)
+    return await list_documents(db.users, {}, User, limit, after, format, projection)
 
 @api_router.get("/auth/user/{user_id}", response_model=User)
 async def get_user(user_id: str):
-    user = await db.users.find_one({"id": user_id})
+    user = await document_cache.get_or_load(
+        "users", user_id, lambda: db.users.find_one({"id": user_id}, {"_id": 0})
+    )
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return User(**user)
@@ -149,56 +401,470 @@ async def create_project(
         key_signature=key_signature
     )
     await db.projects.insert_one(project.dict())
+    await document_cache.invalidate("projects", project.id)
     return project
 
+@api_router.post("/projects/bulk", dependencies=[Depends(require_admin)])
+async def bulk_create_projects(request: Request):
+    return await bulk_import(request.stream(), db.projects, ProjectImport, Project)
+
 @api_router.get("/projects", response_model=List[Project])
-async def get_projects(user_id: Optional[str] = None):
+async def get_projects(
+    user_id: Optional[str] = None,
+    limit: Optional[int] = PageLimit,
+    after: Optional[str] = None,
+    format: ListFormat = "json",
+    fields: Optional[str] = FieldsParam,
+    view: ListView = "full"
+):
+    projection = build_projection(Project, fields, view, PROJECT_SUMMARY)
     filter_query = {"user_id": user_id} if user_id else {}
-    projects = await db.projects.find(filter_query).to_list(1000)
-    return [Project(**project) for project in projects]
+    return await list_documents(db.projects, filter_query, Project, limit, after, format, projection)
 
 @api_router.get("/projects/{project_id}", response_model=Project)
 async def get_project(project_id: str):
-    project = await db.projects.find_one({"id": project_id})
+    project = await document_cache.get_or_load(
+        "projects", project_id, lambda: db.projects.find_one({"id": project_id}, {"_id": 0})
+    )
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     return Project(**project)
 
 # Audio upload endpoints
+async def attach_track(project_id: str, filename: str):
+    # Single atomic append: concurrent uploads to one project cannot
+    # overwrite each other's tracks.
+    now = datetime.now(timezone.utc)
+    result = await db.projects.update_one(
+        {"id": project_id},
+        {
+            "$push": {"tracks": filename},
+            "$set": {"updated_at": now, CHANGE_MARKER: now}
+        }
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Project not found")
+    await document_cache.invalidate("projects", project_id)
+
 @api_router.post("/audio/upload")
 async def upload_audio(file: UploadFile = File(...), project_id: str = Form(...)):
-    if not file.filename.lower().endswith(('.wav', '.mp3', '.m4a', '.aac')):
-        raise HTTPException(status_code=400, detail="Invalid audio format")
+    file_extension = check_audio_filename(file.filename)
+    
+    # Check if project exists before storing the upload; the body has
+    # already been received and spooled by the time this runs
+    project = await db.projects.find_one({"id": project_id}, {"_id": 1})
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
     
-    # Generate unique filename
-    file_extension = Path(file.filename).suffix
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = audio_dir / unique_filename
+    # Stream file into the blob store under a unique filename
+    stored = await blob_store.ingest_upload(file, "audio", file_extension)
     
-    # Save file
-    async with aiofiles.open(file_path, 'wb') as f:
-        content = await file.read()
-        await f.write(content)
+    # Update project with new track, releasing the file if that fails
+    try:
+        await attach_track(project_id, stored.filename)
+    except BaseException:
+        await blob_store.release(stored.filename)
+        raise
+    analysis_job = await queue_audio_analysis(stored.filename, "audio", stored.sha256)
     
-    # Update project with new track
-    project = await db.projects.find_one({"id": project_id})
+    return {
+        "filename": stored.filename,
+        "size": stored.size,
+        "sha256": stored.sha256,
+        "deduplicated": stored.deduplicated,
+        "analysis_job_id": analysis_job["id"],
+        "message": "Audio uploaded successfully"
+    }
+
+# Project mixdown: rendered by a background job, cached by a hash of its inputs
+MIXDOWN_VERSION = 1
+
+@api_router.post("/projects/{project_id}/mixdown")
+async def mixdown_project(project_id: str, mix: Optional[MixdownRequest] = None):
+    mix = mix or MixdownRequest()
+    project = await db.projects.find_one({"id": project_id}, {"tracks": 1})
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    updated_tracks = project.get("tracks", []) + [unique_filename]
-    await db.projects.update_one(
-        {"id": project_id},
-        {"$set": {"tracks": updated_tracks, "updated_at": datetime.now(timezone.utc)}}
+    tracks = []
+    for filename in project.get("tracks", []):
+        settings = mix.tracks.get(filename, TrackMix())
+        if settings.muted:
+            continue
+        stored = await resolve_stored_file("audio", audio_dir, filename)
+        if stored:
+            tracks.append([filename, stored[1], settings.gain_db, settings.pan])
+    if not tracks:
+        raise HTTPException(status_code=400, detail="Project has no tracks to mix")
+    
+    # The key covers track content and mix settings, so any change to the
+    # track list or the mix renders a new file and stale ones are never served.
+    # It is per project, so that replacing a project's render never removes
+    # one another project still uses.
+    mix_key = hashlib.sha256(json.dumps({
+        "version": MIXDOWN_VERSION, "project_id": project_id,
+        "sample_rate": mix.sample_rate, "tracks": [t[1:] for t in tracks]
+    }).encode()).hexdigest()
+    filename = f"mixdown-{mix_key}.wav"
+    if (audio_dir / filename).exists():
+        return {"status": "ready", "filename": filename}
+    
+    job = await job_queue.submit(
+        "mixdown",
+        {
+            "project_id": project_id,
+            "filename": filename,
+            "tracks": [[name, gain_db, pan] for name, _, gain_db, pan in tracks],
+            "sample_rate": mix.sample_rate
+        },
+        key=mix_key,
+        reuse_done=False
+    )
+    return {"status": job["status"], "job_id": job["id"], "filename": filename}
+
+async def run_mixdown(params: dict) -> dict:
+    tracks = []
+    for name, gain_db, pan in params["tracks"]:
+        stored = await resolve_stored_file("audio", audio_dir, name)
+        if stored:
+            tracks.append((str(stored[0]), gain_db, pan))
+    result = await job_queue.run_in_process(
+        render_mixdown, tracks, str(audio_dir / params["filename"]), params["sample_rate"]
+    )
+    
+    # Only the project's latest render is kept
+    if params.get("project_id"):
+        previous = await db.projects.find_one_and_update(
+            {"id": params["project_id"]},
+            {"$set": {"mixdown_file": params["filename"]}},
+            {"mixdown_file": 1}
+        )
+        if previous and previous.get("mixdown_file") not in (None, params["filename"]):
+            (audio_dir / previous["mixdown_file"]).unlink(missing_ok=True)
+            await forget_file_digest(previous["mixdown_file"])
+    return {"filename": params["filename"], **result}
+
+job_queue.register("mixdown", run_mixdown)
+
+# Resumable multipart upload sessions
+async def get_open_upload_session(upload_id: str) -> dict:
+    session = await db.upload_sessions.find_one({"id": upload_id})
+    if not session or session["expires_at"].replace(tzinfo=timezone.utc) < datetime.now(timezone.utc):
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    if session["status"] != "open":
+        raise HTTPException(status_code=409, detail=f"Upload session is {session['status']}")
+    return session
+
+def upload_part_path(upload_id: str, part_number: int) -> Path:
+    return upload_parts_dir / upload_id / f"{part_number:05d}.part"
+
+@api_router.post("/audio/uploads", response_model=UploadSession)
+async def init_upload_session(
+    project_id: str = Form(...),
+    filename: str = Form(...),
+    total_size: Optional[int] = Form(None),
+    part_size: Optional[int] = Form(None)
+):
+    extension = check_audio_filename(filename)
+    if total_size is not None and total_size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File exceeds maximum upload size of {MAX_UPLOAD_BYTES} bytes")
+    
+    project = await db.projects.find_one({"id": project_id}, {"_id": 1})
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    session = UploadSession(
+        project_id=project_id,
+        filename=filename,
+        extension=extension,
+        total_size=total_size,
+        part_size=min(part_size or UPLOAD_PART_SIZE, MAX_UPLOAD_PART_BYTES)
+    )
+    (upload_parts_dir / session.id).mkdir(parents=True, exist_ok=True)
+    await db.upload_sessions.insert_one(session.dict())
+    return session
+
+@api_router.put("/audio/uploads/{upload_id}/parts/{part_number}", response_model=UploadPart)
+async def upload_session_part(upload_id: str, part_number: int, request: Request):
+    if not 1 <= part_number <= MAX_UPLOAD_PARTS:
+        raise HTTPException(status_code=400, detail=f"Part number must be between 1 and {MAX_UPLOAD_PARTS}")
+    await get_open_upload_session(upload_id)
+    
+    # Parts are independent files, so clients may send them concurrently
+    # and re-send any part that failed without touching the others.
+    stored = await write_chunks(request.stream(), upload_part_path(upload_id, part_number), MAX_UPLOAD_PART_BYTES)
+    part = UploadPart(size=stored.size, sha256=stored.sha256)
+    result = await db.upload_sessions.update_one(
+        {"id": upload_id, "status": "open"},
+        {"$set": {f"parts.{part_number}": part.dict()}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=409, detail="Upload session is no longer open")
+    return part
+
+@api_router.get("/audio/uploads/{upload_id}", response_model=UploadSession)
+async def get_upload_session(upload_id: str):
+    session = await db.upload_sessions.find_one({"id": upload_id})
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return UploadSession(**session)
+
+@api_router.post("/audio/uploads/{upload_id}/complete")
+async def complete_upload_session(upload_id: str):
+    session = await get_open_upload_session(upload_id)
+    
+    part_numbers = sorted(int(n) for n in session.get("parts", {}))
+    if not part_numbers or part_numbers != list(range(1, len(part_numbers) + 1)):
+        raise HTTPException(status_code=400, detail="Upload is missing parts")
+    parts = [session["parts"][str(n)] for n in part_numbers]
+    received = sum(part["size"] for part in parts)
+    if session.get("total_size") is not None and received != session["total_size"]:
+        raise HTTPException(status_code=400, detail=f"Expected {session['total_size']} bytes, received {received}")
+    if received > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File exceeds maximum upload size of {MAX_UPLOAD_BYTES} bytes")
+    
+    # Claim the session so a retried complete cannot assemble it twice
+    claimed = await db.upload_sessions.update_one(
+        {"id": upload_id, "status": "open"},
+        {"$set": {"status": "completing"}}
+    )
+    if claimed.modified_count == 0:
+        raise HTTPException(status_code=409, detail="Upload session is already completing")
+    
+    unique_filename = f"{uuid.uuid4()}{session['extension']}"
+    assembled_path = blob_store.temp_path()
+    stored = None
+    try:
+        await asyncio.to_thread(
+            concat_files,
+            [upload_part_path(upload_id, n) for n in part_numbers],
+            assembled_path
+        )
+        # The store is keyed by content, so the assembled file is hashed once
+        # in a worker thread before it is committed.
+        stored = await blob_store.ingest_file(assembled_path, "audio", unique_filename)
+        await attach_track(session["project_id"], unique_filename)
+    except BaseException:
+        assembled_path.unlink(missing_ok=True)
+        if stored:
+            await blob_store.release(stored.filename)
+        await db.upload_sessions.update_one({"id": upload_id}, {"$set": {"status": "open"}})
+        raise
+    
+    await db.upload_sessions.update_one(
+        {"id": upload_id},
+        {"$set": {"status": "completed", "filename": unique_filename}}
+    )
+    shutil.rmtree(upload_parts_dir / upload_id, ignore_errors=True)
+    analysis_job = await queue_audio_analysis(unique_filename, "audio", stored.sha256)
+    
+    # Composite hash over the part digests, comparable with the client's own
+    composite = hashlib.sha256(b"".join(bytes.fromhex(part["sha256"]) for part in parts)).hexdigest()
+    return {
+        "filename": unique_filename,
+        "size": received,
+        "sha256": stored.sha256,
+        "parts_sha256": f"{composite}-{len(parts)}",
+        "deduplicated": stored.deduplicated,
+        "analysis_job_id": analysis_job["id"],
+        "message": "Audio uploaded successfully"
+    }
+
+@api_router.delete("/audio/uploads/{upload_id}")
+async def abort_upload_session(upload_id: str):
+    result = await db.upload_sessions.delete_one({"id": upload_id, "status": {"$ne": "completing"}})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    shutil.rmtree(upload_parts_dir / upload_id, ignore_errors=True)
+    return {"message": "Upload session aborted"}
+
+# File digests back the strong ETags used when serving legacy flat files.
+# The in-process cache is LRU-bounded; db.file_digests is the full record.
+FILE_DIGEST_CACHE_SIZE = int(os.environ.get('FILE_DIGEST_CACHE_SIZE', 100000))
+file_digest_cache: "OrderedDict[str, str]" = OrderedDict()
+
+def cache_file_digest(filename: str, sha256: str):
+    file_digest_cache[filename] = sha256
+    file_digest_cache.move_to_end(filename)
+    if len(file_digest_cache) > FILE_DIGEST_CACHE_SIZE:
+        file_digest_cache.popitem(last=False)
+
+async def record_file_digest(filename: str, sha256: str, size: int):
+    cache_file_digest(filename, sha256)
+    await db.file_digests.update_one(
+        {"filename": filename},
+        {"$set": {"sha256": sha256, "size": size}},
+        upsert=True
     )
+
+async def forget_file_digest(filename: str):
+    """Drop the digest of a legacy flat file that has been deleted."""
+    file_digest_cache.pop(filename, None)
+    await db.file_digests.delete_one({"filename": filename})
+
+async def get_file_digest(file_path: Path) -> str:
+    filename = file_path.name
+    sha256 = file_digest_cache.get(filename)
+    if sha256 is not None:
+        file_digest_cache.move_to_end(filename)
+        return sha256
+    
+    record = await db.file_digests.find_one({"filename": filename})
+    if record:
+        cache_file_digest(filename, record["sha256"])
+        return record["sha256"]
     
-    return {"filename": unique_filename, "message": "Audio uploaded successfully"}
+    # Files stored before digests were recorded are hashed once on first serve
+    sha256 = await asyncio.to_thread(file_sha256, file_path)
+    await record_file_digest(filename, sha256, file_path.stat().st_size)
+    return sha256
+
+async def resolve_stored_file(kind: str, directory: Path, filename: str):
+    """Return the on-disk path and SHA-256 of a public file name, or None."""
+    alias = await blob_store.resolve(filename, kind)
+    if alias:
+        return blob_store.blob_path(alias["sha256"]), alias["sha256"]
+    
+    legacy_path = directory / filename
+    if filename.startswith(".") or not legacy_path.is_file():
+        return None
+    return legacy_path, await get_file_digest(legacy_path)
+
+AudioFormat = Optional[Literal[tuple(FORMATS)]]
+BitrateParam = Query(DEFAULT_BITRATE, description=f"kbps, one of {', '.join(map(str, BITRATES))}")
+
+async def serve_stored_audio(request: Request, stored, filename: str, format: Optional[str], bitrate: int):
+    file_path, sha256 = stored
+    if format is None:
+        return serve_file(request, file_path, sha256, mimetypes.guess_type(filename)[0])
+    
+    if bitrate not in BITRATES:
+        raise HTTPException(status_code=400, detail=f"bitrate must be one of {', '.join(map(str, BITRATES))}")
+    if not transcode_cache.available:
+        raise HTTPException(status_code=503, detail="Transcoding is not available")
+    try:
+        variant_path = await transcode_cache.get(file_path, sha256, format, bitrate)
+    except TranscodeError as exc:
+        raise HTTPException(status_code=422, detail=f"Could not transcode audio: {exc}")
+    return serve_file(request, variant_path, f"{sha256}-{format}-{bitrate}", FORMATS[format][1])
 
 @api_router.get("/audio/{filename}")
-async def get_audio(filename: str):
-    file_path = audio_dir / filename
-    if not file_path.exists():
+async def get_audio(filename: str, request: Request, format: AudioFormat = None, bitrate: int = BitrateParam):
+    stored = await resolve_stored_file("audio", audio_dir, filename)
+    if not stored:
+        raise HTTPException(status_code=404, detail="Audio file not found")
+    return await serve_stored_audio(request, stored, filename, format, bitrate)
+
+# Audio analysis: decoded in the job process pool, stored per content hash
+async def queue_audio_analysis(filename: str, kind: str, sha256: str, reuse_done: bool = True) -> dict:
+    # Sound pack files also get a similarity embedding, so they are keyed apart
+    key = sha256 if kind == "audio" else f"{kind}:{sha256}"
+    return await job_queue.submit("audio_analysis", {"filename": filename, "kind": kind}, key=key, reuse_done=reuse_done)
+
+async def run_audio_analysis(params: dict) -> dict:
+    kind = params["kind"]
+    stored = await resolve_stored_file(kind, audio_dir if kind == "audio" else sound_packs_dir, params["filename"])
+    if not stored:
+        raise FileNotFoundError(params["filename"])
+    file_path, sha256 = stored
+    if not params["filename"].lower().endswith(".wav"):
+        return {"sha256": sha256, "skipped": "Only WAV files can be analyzed"}
+    
+    # One decode pass yields the analysis, the waveform peak mipmap and,
+    # for sound pack files, the similarity embedding and tempo and key
+    analyze = analyze_sound_pack_file if kind == "sound_pack" else analyze_with_peaks
+    analysis = await job_queue.run_in_process(analyze, str(file_path), str(peaks_path(file_path)))
+    embedding = analysis.pop("embedding", None)
+    analysis["analyzed_at"] = datetime.now(timezone.utc)
+    await db.audio_analysis.update_one({"sha256": sha256}, {"$set": analysis}, upsert=True)
+    if embedding is not None:
+        await store_embedding(sha256, embedding)
+        await db.sound_pack_samples.update_many(
+            {"sha256": sha256},
+            {"$set": {field: analysis[field] for field in SAMPLE_ANALYSIS_FIELDS}}
+        )
+    analysis.pop("envelope")
+    return {"sha256": sha256, **analysis}
+
+job_queue.register("audio_analysis", run_audio_analysis)
+
+@api_router.get("/audio/{filename}/analysis")
+async def get_audio_analysis(filename: str):
+    # Sound pack files are analyzed too; flat files from before the blob
+    # store resolve through their recorded digest
+    stored = (
+        await resolve_stored_file("audio", audio_dir, filename)
+        or await resolve_stored_file("sound_pack", sound_packs_dir, filename)
+    )
+    if not stored:
+        raise HTTPException(status_code=404, detail="Audio file not found")
+    _, sha256 = stored
+    analysis = await db.audio_analysis.find_one({"sha256": sha256}, {"_id": 0})
+    if not analysis:
+        raise HTTPException(status_code=404, detail="Analysis not available yet")
+    
+    # Envelope levels are int8 min/max pairs scaled to +/-127
+    analysis["envelope"] = {
+        level: array("b", data).tolist() for level, data in analysis["envelope"].items()
+    }
+    return analysis
+
+@api_router.get("/audio/{filename}/peaks")
+async def get_audio_peaks(
+    filename: str,
+    start: float = Query(0, ge=0),
+    end: Optional[float] = Query(None, gt=0),
+    width: int = Query(1000, ge=1, le=MAX_WIDTH),
+    format: Literal["binary", "json"] = "binary"
+):
+    if not filename.lower().endswith(".wav"):
+        raise HTTPException(status_code=400, detail="Peaks are only available for WAV files")
+    if end is not None and end <= start:
+        raise HTTPException(status_code=400, detail="end must be greater than start")
+    stored = await resolve_stored_file("audio", audio_dir, filename)
+    if not stored:
         raise HTTPException(status_code=404, detail="Audio file not found")
-    return FileResponse(file_path)
+    file_path, sha256 = stored
+    
+    mipmap_path = peaks_path(file_path)
+    if not mipmap_path.exists():
+        job = await queue_audio_analysis(filename, "audio", sha256)
+        return JSONResponse(status_code=202, content={"job_id": job["id"], "message": "Peaks are being computed"})
+    
+    peaks, start_frame, end_frame, frames_per_peak = await asyncio.to_thread(
+        query_peaks, mipmap_path, file_path, start, end, width
+    )
+    if format == "json":
+        return {
+            "start_frame": start_frame,
+            "end_frame": end_frame,
+            "frames_per_peak": frames_per_peak,
+            "peaks": peaks.tolist()
+        }
+    
+    # int16 little-endian (min, max) pairs, scaled to +/-32767
+    return Response(
+        content=peaks.tobytes(),
+        media_type="application/octet-stream",
+        headers={
+            "X-Peaks-Count": str(len(peaks)),
+            "X-Peaks-Start-Frame": str(start_frame),
+            "X-Peaks-End-Frame": str(end_frame),
+            "X-Peaks-Frames-Per-Peak": f"{frames_per_peak:.3f}",
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL
+        }
+    )
+
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    return document_cache.stats()
+
+@api_router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 # Sound pack endpoints
 @api_router.post("/soundpacks", response_model=SoundPack)
@@ -222,49 +888,366 @@ async def create_sound_pack(
         is_premium=is_premium
     )
     await db.sound_packs.insert_one(sound_pack.dict())
+    search_index.add(sound_pack.dict())
+    await document_cache.invalidate_namespace("sound_packs")
     return sound_pack
 
+@api_router.post("/soundpacks/bulk", dependencies=[Depends(require_admin)])
+async def bulk_create_sound_packs(request: Request):
+    async def index_packs(packs: List[dict]):
+        for pack in packs:
+            search_index.add(pack)
+        await document_cache.invalidate_namespace("sound_packs")
+    
+    return await bulk_import(request.stream(), db.sound_packs, SoundPackImport, SoundPack, on_inserted=index_packs)
+
 @api_router.post("/soundpacks/{pack_id}/upload")
 async def upload_to_sound_pack(pack_id: str, file: UploadFile = File(...)):
-    if not file.filename.lower().endswith(('.wav', '.mp3', '.m4a', '.aac')):
-        raise HTTPException(status_code=400, detail="Invalid audio format")
+    file_extension = check_audio_filename(file.filename)
     
     # Check if sound pack exists
-    pack = await db.sound_packs.find_one({"id": pack_id})
+    pack = await db.sound_packs.find_one({"id": pack_id}, {"_id": 1})
     if not pack:
         raise HTTPException(status_code=404, detail="Sound pack not found")
     
-    # Generate unique filename
-    file_extension = Path(file.filename).suffix
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = sound_packs_dir / unique_filename
-    
-    # Save file
-    async with aiofiles.open(file_path, 'wb') as f:
-        content = await file.read()
-        await f.write(content)
-    
-    # Update sound pack
-    updated_files = pack.get("files", []) + [unique_filename]
-    await db.sound_packs.update_one(
-        {"id": pack_id},
-        {"$set": {"files": updated_files}}
-    )
+    # Stream file into the blob store under a unique filename
+    stored = await blob_store.ingest_upload(file, "sound_pack", file_extension)
+    
+    # Update sound pack atomically, releasing the file if that fails
+    try:
+        result = await db.sound_packs.update_one(
+            {"id": pack_id},
+            {"$push": {"files": stored.filename}, "$set": {CHANGE_MARKER: datetime.now(timezone.utc)}}
+        )
+        if result.matched_count == 0:
+            raise HTTPException(status_code=404, detail="Sound pack not found")
+    except BaseException:
+        await blob_store.release(stored.filename)
+        raise
+    search_index.add_files(pack_id)
+    await document_cache.invalidate_namespace("sound_packs")
+    await record_file_crc32(stored.sha256, stored.crc32)
+    await record_sound_pack_sample(pack_id, stored.filename, stored.sha256)
+    analysis_job = await queue_audio_analysis(stored.filename, "sound_pack", stored.sha256)
     
-    return {"filename": unique_filename, "message": "Audio added to sound pack"}
+    return {
+        "filename": stored.filename,
+        "size": stored.size,
+        "sha256": stored.sha256,
+        "deduplicated": stored.deduplicated,
+        "analysis_job_id": analysis_job["id"],
+        "message": "Audio added to sound pack"
+    }
 
 @api_router.get("/soundpacks", response_model=List[SoundPack])
-async def get_sound_packs(genre: Optional[str] = None):
+async def get_sound_packs(
+    genre: Optional[str] = None,
+    limit: Optional[int] = PageLimit,
+    after: Optional[str] = None,
+    format: ListFormat = "json",
+    fields: Optional[str] = FieldsParam,
+    view: ListView = "full"
+):
+    projection = build_projection(SoundPack, fields, view, SOUND_PACK_SUMMARY)
     filter_query = {"genre": genre} if genre else {}
-    packs = await db.sound_packs.find(filter_query).to_list(1000)
-    return [SoundPack(**pack) for pack in packs]
+    return await list_documents(
+        db.sound_packs, filter_query, SoundPack, limit, after, format, projection,
+        cache_namespace="sound_packs"
+    )
+
+@api_router.get("/soundpacks/search")
+async def search_sound_packs(
+    q: Optional[str] = None,
+    genre: Optional[str] = None,
+    tags: Optional[str] = Query(None, description="Comma-separated; packs must have every tag"),
+    premium: Optional[bool] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000)
+):
+    tag_list = [tag.strip() for tag in tags.split(",") if tag.strip()] if tags else None
+    return search_index.search(q, genre, tag_list, premium, limit, offset)
+
+@api_router.get("/soundpacks/suggest")
+async def suggest_sound_pack_terms(q: str, limit: int = Query(10, ge=1, le=50)):
+    return search_index.suggest(q, limit)
+
+# Tempo and key per sound pack file, range-queryable by BPM and key
+SOUND_PACK_BACKFILL_BATCH = 500
+
+async def record_sound_pack_sample(pack_id: str, filename: str, sha256: str):
+    await db.sound_pack_samples.update_one(
+        {"filename": filename},
+        {"$setOnInsert": SoundPackSample(filename=filename, pack_id=pack_id, sha256=sha256).dict()},
+        upsert=True
+    )
+    # Content uploaded before already has its estimates
+    projection = {"_id": 0, **{field: 1 for field in SAMPLE_ANALYSIS_FIELDS}}
+    analysis = await db.audio_analysis.find_one({"sha256": sha256, "tempo_key_version": TEMPO_KEY_VERSION}, projection)
+    if analysis:
+        await db.sound_pack_samples.update_one({"filename": filename}, {"$set": analysis})
+
+@api_router.get("/soundpacks/samples", response_model=List[SoundPackSample])
+async def find_sound_pack_samples(
+    bpm_min: Optional[float] = Query(None, gt=0),
+    bpm_max: Optional[float] = Query(None, gt=0),
+    key: Optional[str] = Query(None, description="e.g. Am, F#, Bb minor"),
+    compatible: bool = Query(True, description="Also match the relative key and its circle-of-fifths neighbours"),
+    half_time: bool = Query(False, description="Also match half and double the BPM range"),
+    project_id: Optional[str] = Query(None, description="Match the project's key signature and BPM"),
+    bpm_tolerance: float = Query(DEFAULT_BPM_TOLERANCE, ge=0, le=50),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
+    if project_id:
+        project = await get_project(project_id)
+        key = key or project.key_signature
+        if bpm_min is None and bpm_max is None and project.bpm:
+            bpm_min, bpm_max = project.bpm - bpm_tolerance, project.bpm + bpm_tolerance
+    if bpm_min is not None and bpm_max is not None and bpm_min > bpm_max:
+        raise HTTPException(status_code=400, detail="bpm_min must not be greater than bpm_max")
+    
+    keys = None
+    if key:
+        parsed = parse_key(key)
+        if parsed is None:
+            raise HTTPException(status_code=400, detail=f"Unrecognized key: {key}")
+        keys = compatible_keys(key) if compatible else [key_name(*parsed)]
+    
+    filter_query = sample_filter(keys, bpm_ranges(bpm_min, bpm_max, half_time), after)
+    docs, next_cursor = await fetch_samples(db.sound_pack_samples, filter_query, limit)
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    return FastJSONResponse(encoder_for(SoundPackSample).encode(docs), headers=headers)
+
+async def stale_sound_pack_files(files: List[Tuple[str, str]]) -> List[str]:
+    """Record a sample row for each (pack id, filename) and return one WAV
+    file per content hash that lacks a current embedding or tempo/key."""
+    names = [name for _, name in files]
+    digests = {}
+    aliases = db.blob_aliases.find({"filename": {"$in": names}, "kind": "sound_pack"}, {"_id": 0, "filename": 1, "sha256": 1})
+    async for alias in aliases:
+        digests[alias["filename"]] = alias["sha256"]
+    for name in names:
+        if name not in digests:
+            stored = await resolve_stored_file("sound_pack", sound_packs_dir, name)
+            if stored:
+                digests[name] = stored[1]
+    
+    analyzed = {}
+    rows = db.sound_pack_samples.find({"filename": {"$in": names}}, {"_id": 0, "filename": 1, "tempo_key_version": 1})
+    async for row in rows:
+        analyzed[row["filename"]] = row.get("tempo_key_version") == TEMPO_KEY_VERSION
+    new_rows = [
+        UpdateOne(
+            {"filename": name},
+            {"$setOnInsert": SoundPackSample(filename=name, pack_id=pack_id, sha256=digests[name]).dict()},
+            upsert=True
+        )
+        for pack_id, name in files if name in digests and name not in analyzed
+    ]
+    if new_rows:
+        await db.sound_pack_samples.bulk_write(new_rows, ordered=False)
+    
+    embedded = set(await db.audio_embeddings.distinct(
+        "sha256", {"sha256": {"$in": list(set(digests.values()))}, "version": EMBEDDING_VERSION}
+    ))
+    stale, seen = [], set()
+    for name, sha256 in digests.items():
+        if not name.lower().endswith(".wav") or sha256 in seen:
+            continue
+        if sha256 not in embedded or not analyzed.get(name, False):
+            stale.append(name)
+            seen.add(sha256)
+    return stale
+
+async def run_sound_pack_backfill(params: dict) -> dict:
+    """Analyze the sound pack files stored before embeddings or tempo/key
+    existed, or with older versions of them, as many at a time as the
+    process pool has workers."""
+    slots = asyncio.Semaphore(job_queue.processes)
+    counts = {"files": 0, "analyzed": 0, "failed": 0}
+    
+    async def analyze(filename: str):
+        async with slots:
+            try:
+                await run_audio_analysis({"filename": filename, "kind": "sound_pack"})
+                counts["analyzed"] += 1
+            except Exception:
+                logger.warning("Backfill analysis failed for %s", filename, exc_info=True)
+                counts["failed"] += 1
+    
+    async def process(batch: List[Tuple[str, str]]):
+        counts["files"] += len(batch)
+        await asyncio.gather(*(analyze(name) for name in await stale_sound_pack_files(batch)))
+    
+    batch: List[Tuple[str, str]] = []
+    async for pack in db.sound_packs.find({}, {"_id": 0, "id": 1, "files": 1}):
+        batch.extend((pack["id"], name) for name in pack.get("files", []))
+        if len(batch) >= SOUND_PACK_BACKFILL_BATCH:
+            await process(batch)
+            batch = []
+    if batch:
+        await process(batch)
+    return counts
+
+job_queue.register("sound_pack_backfill", run_sound_pack_backfill)
 
 @api_router.get("/soundpacks/{filename}")
-async def get_sound_pack_audio(filename: str):
-    file_path = sound_packs_dir / filename
-    if not file_path.exists():
+async def get_sound_pack_audio(filename: str, request: Request, format: AudioFormat = None, bitrate: int = BitrateParam):
+    stored = await resolve_stored_file("sound_pack", sound_packs_dir, filename)
+    if not stored:
+        raise HTTPException(status_code=404, detail="Sound pack file not found")
+    return await serve_stored_audio(request, stored, filename, format, bitrate)
+
+# Sound similarity: one embedding per content hash, searched in memory
+async def store_embedding(sha256: str, embedding: bytes):
+    created_at = datetime.now(timezone.utc)
+    await db.audio_embeddings.update_one(
+        {"sha256": sha256},
+        {"$set": {"vector": embedding, "version": EMBEDDING_VERSION, "created_at": created_at}},
+        upsert=True
+    )
+    similarity_index.add(sha256, np.frombuffer(embedding, dtype=np.float32), created_at)
+
+async def sound_pack_files_by_digest(digests: List[str]) -> Dict[str, List[str]]:
+    names: Dict[str, List[str]] = {}
+    aliases = db.blob_aliases.find({"sha256": {"$in": digests}, "kind": "sound_pack"}, {"_id": 0, "filename": 1, "sha256": 1})
+    async for alias in aliases:
+        names.setdefault(alias["sha256"], []).append(alias["filename"])
+    # Flat files stored before the blob store
+    async for record in db.file_digests.find({"sha256": {"$in": digests}}, {"_id": 0, "filename": 1, "sha256": 1}):
+        names.setdefault(record["sha256"], []).append(record["filename"])
+    return names
+
+async def find_similar(query: np.ndarray, k: int, exact: bool, exclude: Optional[str] = None) -> dict:
+    if not query.any():
+        # Silence has no direction to compare
+        return {"results": [], "search_ms": 0.0, "indexed": len(similarity_index)}
+    started = time.perf_counter()
+    # Over-fetch: the query file and files no longer in any pack are dropped
+    matches = await asyncio.to_thread(similarity_index.search, query, k * 2 + 1, exact)
+    search_ms = (time.perf_counter() - started) * 1000
+    matches = [(sha256, score) for sha256, score in matches if sha256 != exclude]
+    
+    names = await sound_pack_files_by_digest([sha256 for sha256, _ in matches])
+    wanted = {name for group in names.values() for name in group}
+    pack_of = {}
+    async for pack in db.sound_packs.find({"files": {"$in": list(wanted)}}, {"_id": 0, "id": 1, "name": 1, "files": 1}):
+        for name in wanted.intersection(pack["files"]):
+            pack_of.setdefault(name, pack)
+    
+    results = []
+    for sha256, score in matches:
+        for name in names.get(sha256, []):
+            pack = pack_of.get(name)
+            if pack:
+                results.append({
+                    "filename": name,
+                    "sha256": sha256,
+                    "score": round(score, 4),
+                    "pack_id": pack["id"],
+                    "pack_name": pack["name"]
+                })
+    return {"results": results[:k], "search_ms": round(search_ms, 3), "indexed": len(similarity_index)}
+
+@api_router.get("/soundpacks/{filename}/similar")
+async def get_similar_sounds(filename: str, k: int = Query(10, ge=1, le=100), exact: bool = False):
+    if not filename.lower().endswith(".wav"):
+        raise HTTPException(status_code=400, detail="Similarity is only available for WAV files")
+    stored = await resolve_stored_file("sound_pack", sound_packs_dir, filename)
+    if not stored:
         raise HTTPException(status_code=404, detail="Sound pack file not found")
-    return FileResponse(file_path)
+    _, sha256 = stored
+    
+    record = await db.audio_embeddings.find_one({"sha256": sha256, "version": EMBEDDING_VERSION}, {"_id": 0, "vector": 1})
+    if not record:
+        job = await queue_audio_analysis(filename, "sound_pack", sha256, reuse_done=False)
+        return JSONResponse(status_code=202, content={"job_id": job["id"], "message": "Embedding is being computed"})
+    return await find_similar(np.frombuffer(record["vector"], dtype=np.float32), k, exact, exclude=sha256)
+
+@api_router.post("/soundpacks/similar")
+async def find_similar_to_clip(
+    file: UploadFile = File(...),
+    k: int = Form(10, ge=1, le=100),
+    exact: bool = Form(False)
+):
+    if not file.filename or not file.filename.lower().endswith(".wav"):
+        raise HTTPException(status_code=400, detail="Only WAV clips can be searched")
+    
+    clip_path = upload_parts_dir / f"clip-{uuid.uuid4().hex}.wav"
+    try:
+        await stream_to_disk(file, clip_path, MAX_SIMILARITY_CLIP_BYTES)
+        embedding = await job_queue.run_in_process(embed_wav, str(clip_path))
+    except WavFormatError as exc:
+        raise HTTPException(status_code=422, detail=f"Could not read WAV clip: {exc}")
+    finally:
+        clip_path.unlink(missing_ok=True)
+    
+    query = np.frombuffer(embedding, dtype=np.float32)
+    if not query.any():
+        raise HTTPException(status_code=422, detail="Clip has no audible audio")
+    return await find_similar(query, k, exact)
+
+
+# Pack downloads: zip entries need each file's CRC-32 up front, recorded
+# per content hash at upload time or computed once on first download
+async def record_file_crc32(sha256: str, crc32: int):
+    await db.file_checksums.update_one({"sha256": sha256}, {"$set": {"crc32": crc32}}, upsert=True)
+
+async def get_file_crc32s(stored_files) -> Dict[str, int]:
+    crcs = {}
+    hashes = list({sha256 for _, sha256 in stored_files})
+    async for record in db.file_checksums.find({"sha256": {"$in": hashes}}, {"_id": 0}):
+        crcs[record["sha256"]] = record["crc32"]
+    for file_path, sha256 in stored_files:
+        if sha256 not in crcs:
+            crcs[sha256] = await asyncio.to_thread(file_crc32, file_path)
+            await record_file_crc32(sha256, crcs[sha256])
+    return crcs
+
+@api_router.get("/soundpacks/{pack_id}/download")
+async def download_sound_pack(pack_id: str, request: Request):
+    pack = await db.sound_packs.find_one({"id": pack_id}, {"_id": 0, "name": 1, "files": 1, "created_at": 1})
+    if not pack:
+        raise HTTPException(status_code=404, detail="Sound pack not found")
+    
+    # Files missing from storage are left out of the archive
+    stored_files = {}
+    for filename in pack.get("files", []):
+        stored = await resolve_stored_file("sound_pack", sound_packs_dir, filename)
+        if stored:
+            stored_files[filename] = stored
+    if not stored_files:
+        raise HTTPException(status_code=404, detail="Sound pack has no files to download")
+    crcs = await get_file_crc32s(stored_files.values())
+    
+    folder = re.sub(r"[^A-Za-z0-9._ -]+", "_", pack["name"]).strip(" ._") or "sound-pack"
+    entries = [
+        ZipEntry(f"{folder}/{filename}", file_path, file_path.stat().st_size, crcs[sha256])
+        for filename, (file_path, sha256) in stored_files.items()
+    ]
+    archive = ZipLayout(entries, pack["created_at"])
+    
+    # The archive bytes are a pure function of entry names, contents and
+    # timestamp, so hashing those gives a strong ETag that resumes rely on
+    manifest = hashlib.sha256(json.dumps([
+        pack["created_at"].isoformat(),
+        [[entry.name, sha256] for entry, (_, sha256) in zip(entries, stored_files.values())],
+    ]).encode()).hexdigest()
+    response = serve_ranges(
+        request,
+        size=archive.size,
+        etag=f'"zip-{manifest}"',
+        read_range=archive.read_range,
+        media_type="application/zip",
+        cache_control="no-cache",
+        extra_headers={"Content-Disposition": f'attachment; filename="{folder}.zip"'},
+    )
+    
+    # Resumed transfers (ranges not starting at byte 0) are not new downloads
+    content_range = response.headers.get("content-range", "")
+    if response.status_code == 200 or content_range.startswith("bytes 0-"):
+        download_counter.increment(pack_id)
+    return response
 
 # Contract endpoints
 @api_router.post("/contracts", response_model=Contract)
@@ -273,69 +1256,241 @@ async def create_contract(
     user_id: str = Form(...),
     contract_type: str = Form("artist_agreement")
 ):
-    # Default T.H.U.G N HOMEBASE ENT. artist agreement terms
-    default_terms = """
-T.H.U.G N HOMEBASE ENT. ARTIST AGREEMENT
-
-1. EXCLUSIVE RECORDING AGREEMENT
-The Artist agrees to record exclusively for T.H.U.G N HOMEBASE ENT. during the term of this agreement.
-
-2. REVENUE SHARING
-- Streaming Revenue: 70% Artist / 30% Label
-- Performance Revenue: 80% Artist / 20% Label
-- Merchandise: 60% Artist / 40% Label
-
-3. PROMOTIONAL SUPPORT
-T.H.U.G N HOMEBASE ENT. will provide marketing, distribution, and promotional support for all releases.
-
-4. CREATIVE CONTROL
-Artist maintains creative control over their music with label consultation on commercial releases.
-
-5. TERM
-This agreement is valid for 2 years from the date of signing, with option to renew.
-
-By signing below, both parties agree to the terms and conditions outlined above.
-"""
+    template = await contract_templates.latest(contract_type)
+    if not template:
+        template = await contract_templates.latest(DEFAULT_CONTRACT_TYPE)
     
     contract = Contract(
         artist_name=artist_name,
         user_id=user_id,
         contract_type=contract_type,
-        terms=default_terms
+        template_id=template["id"],
+        template_version=template["version"]
     )
     await db.contracts.insert_one(contract.dict())
     return contract
 
 @api_router.post("/contracts/{contract_id}/sign")
 async def sign_contract(contract_id: str, signature: ContractSign):
-    contract = await db.contracts.find_one({"id": contract_id})
+    contract = await db.contracts.find_one({"id": contract_id}, {"_id": 0, "user_id": 1, "status": 1})
     if not contract:
         raise HTTPException(status_code=404, detail="Contract not found")
+    try:
+        image = decode_signature(signature.signature_data)
+    except SignatureTooLarge as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    except InvalidSignature as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    signature_sha256 = hashlib.sha256(image).hexdigest()
     
-    await db.contracts.update_one(
-        {"id": contract_id},
-        {
-            "$set": {
-                "signature_data": signature.signature_data,
-                "signed_at": datetime.now(timezone.utc),
-                "status": "signed"
-            }
-        }
-    )
+    # Two idempotent steps instead of a transaction (which needs a replica
+    # set): the contract is signed only while pending, then the user flag is
+    # set. A retry with the same signature finds the contract already signed
+    # with it and repeats the second step, so a failure between the two
+    # never leaves them disagreeing for good.
+    if contract["status"] == "pending":
+        stored = await blob_store.ingest_bytes(image, "signature", SIGNATURE_EXTENSION)
+        now = datetime.now(timezone.utc)
+        try:
+            result = await db.contracts.update_one(
+                {"id": contract_id, "status": "pending"},
+                {
+                    "$set": {
+                        "signature_file": stored.filename,
+                        "signature_sha256": signature_sha256,
+                        "signed_at": now,
+                        "status": "signed",
+                        CHANGE_MARKER: now
+                    }
+                }
+            )
+        except BaseException:
+            await blob_store.release(stored.filename)
+            raise
+        if not result.modified_count:
+            # Signed or cancelled concurrently
+            await blob_store.release(stored.filename)
+    
+    current = await db.contracts.find_one({"id": contract_id}, {"_id": 0, "status": 1, "signature_sha256": 1})
+    if current is None:
+        # Deleted concurrently
+        raise HTTPException(status_code=404, detail="Contract not found")
+    if current["status"] != "signed" or current.get("signature_sha256") != signature_sha256:
+        raise HTTPException(status_code=409, detail=f"Contract is already {current['status']}")
     
     # Update user contract status
     await db.users.update_one(
         {"id": contract["user_id"]},
         {"$set": {"contract_signed": True}}
     )
+    await document_cache.invalidate("users", contract["user_id"])
     
     return {"message": "Contract signed successfully"}
 
+@api_router.get("/contracts/{contract_id}/signature")
+async def get_contract_signature(contract_id: str, request: Request):
+    contract = await db.contracts.find_one(
+        {"id": contract_id}, {"_id": 0, "signature_file": 1, "signature_data": 1}
+    )
+    if not contract:
+        raise HTTPException(status_code=404, detail="Contract not found")
+    
+    if contract.get("signature_file"):
+        alias = await blob_store.resolve(contract["signature_file"], "signature")
+        if alias:
+            return serve_file(
+                request, blob_store.blob_path(alias["sha256"]), alias["sha256"],
+                SIGNATURE_MEDIA_TYPE, SIGNATURE_CACHE_CONTROL
+            )
+    elif contract.get("signature_data"):
+        # Signed before signatures moved to the blob store and not migrated yet
+        try:
+            image = decode_signature(contract["signature_data"])
+        except InvalidSignature:
+            raise HTTPException(status_code=404, detail="Signature not found")
+        return Response(content=image, media_type=SIGNATURE_MEDIA_TYPE,
+                        headers={"Cache-Control": SIGNATURE_CACHE_CONTROL})
+    raise HTTPException(status_code=404, detail="Signature not found")
+
 @api_router.get("/contracts", response_model=List[Contract])
-async def get_contracts(user_id: Optional[str] = None):
+async def get_contracts(
+    user_id: Optional[str] = None,
+    limit: Optional[int] = PageLimit,
+    after: Optional[str] = None,
+    format: ListFormat = "json",
+    fields: Optional[str] = FieldsParam,
+    view: ListView = "full"
+):
+    projection = build_projection(Contract, fields, view, CONTRACT_SUMMARY)
     filter_query = {"user_id": user_id} if user_id else {}
-    contracts = await db.contracts.find(filter_query).to_list(1000)
-    return [Contract(**contract) for contract in contracts]
+    return await list_documents(db.contracts, filter_query, Contract, limit, after, format, projection)
+
+@api_router.get("/contracts/{contract_id}/terms")
+async def get_contract_terms(request: Request, contract_id: str):
+    contract = await db.contracts.find_one(
+        {"id": contract_id},
+        {"_id": 0, "artist_name": 1, "contract_type": 1, "template_id": 1, "terms": 1}
+    )
+    if not contract:
+        raise HTTPException(status_code=404, detail="Contract not found")
+    
+    if contract.get("template_id"):
+        template = await contract_templates.get(contract["template_id"])
+        if not template:
+            raise HTTPException(status_code=404, detail="Contract template not found")
+        content = {
+            "contract_id": contract_id,
+            "template_id": template["id"],
+            "template_version": template["version"],
+            "title": template["title"],
+            "terms": contract_templates.render(template, contract),
+        }
+    else:
+        # Created before templates and not migrated yet
+        content = {
+            "contract_id": contract_id,
+            "template_id": None,
+            "template_version": None,
+            "title": None,
+            "terms": contract.get("terms", ""),
+        }
+    
+    # Template versions and the contract fields they are rendered with never
+    # change, so the terms of a contract are fixed once it exists
+    etag = '"' + hashlib.sha256(content["terms"].encode()).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=86400"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content, headers=headers)
+
+# Server-sent events: clients subscribe to their user's projects and
+# contracts, single projects, and sound packs instead of polling the lists
+@api_router.get("/events")
+async def stream_events(
+    user_id: Optional[str] = None,
+    project_id: Optional[List[str]] = Query(None),
+    sound_packs: bool = False,
+    last_event_id: Optional[str] = Header(None)
+):
+    topics = [f"project:{pid}" for pid in project_id or []]
+    if user_id:
+        topics.append(f"user:{user_id}")
+    if sound_packs:
+        topics.append("sound_packs")
+    if not topics:
+        raise HTTPException(status_code=400, detail="Subscribe to a user, a project or sound packs")
+    if event_hub.full:
+        # EventSource retries after its reconnect delay
+        raise HTTPException(status_code=503, detail="Too many event subscribers")
+    
+    subscription = event_hub.subscribe(topics, last_event_id)
+    return StreamingResponse(
+        event_stream(event_hub, subscription),
+        media_type="text/event-stream",
+        # No caching, and no buffering by proxies that would hold events back
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Contract template endpoints
+@api_router.get("/contract-templates")
+async def get_contract_templates(contract_type: Optional[str] = None):
+    # Latest version of each type, or every version of one type
+    if contract_type:
+        return await contract_templates.versions(contract_type)
+    return await contract_templates.list_latest()
+
+@api_router.get("/contract-templates/{template_id}")
+async def get_contract_template(template_id: str):
+    template = await contract_templates.get(template_id)
+    if not template:
+        raise HTTPException(status_code=404, detail="Contract template not found")
+    return JSONResponse(jsonable_encoder(template), headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL})
+
+@api_router.post("/contract-templates", dependencies=[Depends(require_admin)])
+async def publish_contract_template(template: ContractTemplateCreate):
+    # Publishes a new version; existing contracts keep the version they reference
+    return await contract_templates.publish(template.contract_type, template.title, template.body)
+
+# Admin endpoints
+@api_router.get("/admin/profiling", dependencies=[Depends(require_admin)])
+async def get_profiling_settings():
+    return profiler.settings()
+
+@api_router.put("/admin/profiling", dependencies=[Depends(require_admin)])
+async def update_profiling_settings(settings: ProfilingSettings):
+    profiler.configure(settings.sample_rate, settings.slow_ms, settings.interval_ms)
+    return profiler.settings()
+
+@api_router.get("/admin/profiling/requests", dependencies=[Depends(require_admin)])
+async def get_profiled_requests():
+    # Most recent first
+    return [profile.summary() for profile in reversed(profiler.captured)]
+
+@api_router.get("/admin/profiling/collapsed", dependencies=[Depends(require_admin)])
+async def export_profiles(request_id: Optional[str] = None):
+    if request_id and not profiler.find(request_id):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profiler.collapsed(request_id))
+
+@api_router.get("/admin/similarity", dependencies=[Depends(require_admin)])
+async def get_similarity_index_stats():
+    return similarity_index.stats()
+
+@api_router.get("/admin/events", dependencies=[Depends(require_admin)])
+async def get_event_stats():
+    return {"source": change_feed.mode, **event_hub.stats()}
+
+@api_router.post("/admin/soundpacks/analysis/backfill", dependencies=[Depends(require_admin)])
+async def backfill_sound_pack_analysis():
+    # Embeddings, tempo and key for files stored before they existed or
+    # analyzed with an older version
+    return await job_queue.submit("sound_pack_backfill", {}, key="sound_pack_backfill", reuse_done=False)
+
+# Prometheus scrape endpoint, outside the /api prefix
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return metrics_response()
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -346,8 +1501,22 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        NEXT_CURSOR_HEADER,
+        "X-Peaks-Count",
+        "X-Peaks-Start-Frame",
+        "X-Peaks-End-Frame",
+        "X-Peaks-Frames-Per-Peak",
+        "Content-Disposition",
+        *IMPORT_HEADERS.values(),
+    ],
 )
 
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+# Added last so that it wraps everything, CORS included
+app.add_middleware(MetricsMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -355,6 +1524,72 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def bootstrap_indexes():
+    await ensure_indexes(db)
+    
+    # Opt-in check that every endpoint query is served by an index
+    if os.environ.get('VERIFY_QUERY_PLANS', '').lower() in ('1', 'true', 'yes'):
+        failures = await verify_query_plans(db)
+        if failures:
+            raise RuntimeError("Query plan verification failed:\n" + "\n".join(failures))
+        logger.info("Query plan verification passed")
+    
+    await contract_templates.ensure_defaults()
+    app.state.blob_gc_task = asyncio.create_task(collect_blob_garbage())
+    
+    await search_index.sync(db.sound_packs)
+    logger.info("Indexed %d sound packs for search", len(search_index))
+    app.state.search_sync_task = asyncio.create_task(sync_search_index())
+    
+    similarity_index.load()
+    await similarity_index.sync(db.audio_embeddings)
+    logger.info("Indexed %d sound embeddings for similarity search", len(similarity_index))
+    app.state.similarity_sync_task = asyncio.create_task(sync_similarity_index())
+    download_counter.start()
+    change_feed.start()
+    profiler.attach(asyncio.get_running_loop())
+    await job_queue.start()
+
+async def collect_blob_garbage():
+    while True:
+        await asyncio.sleep(BLOB_GC_INTERVAL)
+        try:
+            removed = await blob_store.collect_garbage()
+            if removed:
+                logger.info("Removed %d unreferenced blobs", removed)
+        except Exception:
+            logger.exception("Blob garbage collection failed")
+
+async def sync_search_index():
+    # Picks up packs created by other workers
+    while True:
+        await asyncio.sleep(SEARCH_SYNC_INTERVAL)
+        try:
+            await search_index.sync(db.sound_packs)
+        except Exception:
+            logger.exception("Search index sync failed")
+
+async def sync_similarity_index():
+    # Picks up embeddings stored by other workers and folds new vectors into
+    # the memory-mapped snapshot once enough have accumulated
+    while True:
+        await asyncio.sleep(VECTOR_SYNC_INTERVAL)
+        try:
+            await similarity_index.sync(db.audio_embeddings)
+            if similarity_index.needs_snapshot:
+                await similarity_index.snapshot()
+        except Exception:
+            logger.exception("Similarity index sync failed")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    app.state.blob_gc_task.cancel()
+    app.state.search_sync_task.cancel()
+    app.state.similarity_sync_task.cancel()
+    profiler.stop()
+    await change_feed.stop()
+    await job_queue.stop()
+    await download_counter.stop()
+    await document_cache.close()
     client.close()
\ No newline at end of file
@@ -0,0 +1,103 @@
+import asyncio
+import base64
+import binascii
+import logging
+import os
+import struct
+import sys
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MAX_SIGNATURE_BYTES = int(os.environ.get('MAX_SIGNATURE_BYTES', 256 * 1024))
+MAX_SIGNATURE_DIMENSION = 4096
+SIGNATURE_MEDIA_TYPE = "image/png"
+SIGNATURE_EXTENSION = ".png"
+# Signatures are personal data: cacheable by the browser, never by shared caches
+SIGNATURE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+DATA_URL_PREFIX = "data:image/png;base64,"
+
+
+class InvalidSignature(ValueError):
+    pass
+
+
+class SignatureTooLarge(InvalidSignature):
+    pass
+
+
+def decode_signature(data: str) -> bytes:
+    """Decode a base64 PNG signature, bare or as a ``data:`` URL, and check
+    that it is a plausibly sized PNG image."""
+    if data.startswith("data:"):
+        if not data.startswith(DATA_URL_PREFIX):
+            raise InvalidSignature("Signature must be a PNG image")
+        data = data[len(DATA_URL_PREFIX):]
+    # Reject oversized input before decoding it
+    if len(data) > (MAX_SIGNATURE_BYTES + 2) // 3 * 4:
+        raise SignatureTooLarge(f"Signature exceeds {MAX_SIGNATURE_BYTES} bytes")
+    try:
+        image = base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError):
+        raise InvalidSignature("Signature is not valid base64")
+
+    # PNG magic, then the IHDR chunk carrying width and height
+    if len(image) < 33 or not image.startswith(PNG_MAGIC) or image[12:16] != b"IHDR":
+        raise InvalidSignature("Signature must be a PNG image")
+    width, height = struct.unpack(">II", image[16:24])
+    if not (0 < width <= MAX_SIGNATURE_DIMENSION and 0 < height <= MAX_SIGNATURE_DIMENSION):
+        raise InvalidSignature("Signature image dimensions are out of range")
+    if not image.endswith(b"IEND\xaeB`\x82"):
+        raise InvalidSignature("Signature image is truncated")
+    return image
+
+
+async def migrate_inline_signatures(db, store) -> int:
+    """Move base64 signatures stored in contract documents into the blob
+    store. Returns the number of contracts migrated."""
+    migrated = 0
+    cursor = db.contracts.find({"signature_data": {"$type": "string"}}, {"_id": 0, "id": 1, "signature_data": 1})
+    async for contract in cursor:
+        try:
+            image = decode_signature(contract["signature_data"])
+        except InvalidSignature as exc:
+            logger.warning("Leaving the signature of contract %s inline: %s", contract["id"], exc)
+            continue
+        blob = await store.ingest_bytes(image, "signature", SIGNATURE_EXTENSION)
+        result = await db.contracts.update_one(
+            {"id": contract["id"], "signature_data": contract["signature_data"]},
+            {
+                "$set": {"signature_file": blob.filename, "signature_sha256": blob.sha256},
+                "$unset": {"signature_data": ""},
+            }
+        )
+        if result.modified_count:
+            migrated += 1
+        else:
+            await store.release(blob.filename)
+    return migrated
+
+
+async def main() -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from blobstore import BlobStore
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    store = BlobStore(db, Path(os.environ.get('BLOB_STORE_DIR', 'blob_store')))
+    try:
+        migrated = await migrate_inline_signatures(db, store)
+        print(f"Moved {migrated} contract signatures to the blob store")
+        return 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,211 @@
+import re
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Like audio_analysis, the estimators run inside worker processes; the key
+# name helpers are also used by the API.
+
+TEMPO_KEY_VERSION = 2  # Bump when the estimates change; older ones are recomputed
+FRAME_SECONDS = 0.093  # About 4096 samples at 44.1 kHz, fine enough for low notes
+HOPS_PER_FRAME = 8
+MAX_SECONDS = 60  # Longer files are described by their first minute
+MIN_TEMPO_SECONDS = 3.0  # Shorter files (one-shots) get no tempo
+MIN_BPM, MAX_BPM = 60.0, 200.0
+PRIOR_BPM = 110.0  # Octave errors are settled in favour of tempos near this
+MIN_TEMPO_CONFIDENCE = 0.3
+# An onset is a peak of the onset curve carrying at least this share of its
+# frame's spectral level; fewer than MIN_ONSETS of them means no beat
+MIN_ONSET_STRENGTH = 0.1
+MIN_ONSETS = 4
+MIN_KEY_CONFIDENCE = 0.5
+CHROMA_RANGE_HZ = (110.0, 4200.0)
+SILENT_FRAME_POWER = 1e-10
+
+PITCH_NAMES = ("C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B")
+FLATS = {"Db": "C#", "Eb": "D#", "Fb": "E", "Gb": "F#", "Ab": "G#", "Bb": "A#", "Cb": "B",
+         "E#": "F", "B#": "C"}
+
+# Krumhansl-Kessler key profiles, tonic first
+MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+
+KEY_PATTERN = re.compile(r"^\s*([A-Ga-g])\s*([#♯b♭]?)\s*(m|min|minor|maj|major|M)?\s*$")
+
+
+def key_name(pitch: int, minor: bool) -> str:
+    return PITCH_NAMES[pitch % 12] + ("m" if minor else "")
+
+
+def parse_key(value: str) -> Optional[Tuple[int, bool]]:
+    """Pitch class and mode of a key written like ``Am``, ``F# minor``,
+    ``Bb`` or ``Ebmaj``, or None if it is not one."""
+    match = KEY_PATTERN.match(value or "")
+    if not match:
+        return None
+    letter, accidental, mode = match.groups()
+    name = letter.upper() + {"♯": "#", "♭": "b"}.get(accidental, accidental)
+    name = FLATS.get(name, name)
+    return PITCH_NAMES.index(name), mode in ("m", "min", "minor")
+
+
+def compatible_keys(value: str) -> Optional[List[str]]:
+    """The key itself, its relative major or minor and its neighbours on the
+    circle of fifths: the keys a DJ's wheel treats as harmonic matches."""
+    parsed = parse_key(value)
+    if parsed is None:
+        return None
+    pitch, minor = parsed
+    relative = pitch + 3 if minor else pitch - 3
+    return [
+        key_name(pitch, minor),
+        key_name(relative, not minor),
+        key_name(pitch + 7, minor),
+        key_name(pitch + 5, minor),
+    ]
+
+
+class TempoKeyAccumulator:
+    """Streaming tempo and key estimation over a mono mix of the blocks.
+
+    Keeps one onset strength value per hop (log spectral flux) and a running
+    chroma sum. At the end the tempo comes from the autocorrelation of the
+    onset curve, weighted towards ``PRIOR_BPM``, and the key from the
+    correlation of the chroma with the 24 rotated key profiles.
+    """
+
+    def __init__(self, sample_rate: int):
+        self.sample_rate = sample_rate
+        self.frame_length = 1 << max(int(round(np.log2(sample_rate * FRAME_SECONDS))), 9)
+        self.hop = self.frame_length // HOPS_PER_FRAME
+        self.max_samples = sample_rate * MAX_SECONDS
+        self._window = np.hanning(self.frame_length).astype(np.float32)
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._consumed = 0
+
+        freqs = np.fft.rfftfreq(self.frame_length, 1 / sample_rate)
+        self._chroma = np.zeros((12, len(freqs)), dtype=np.float32)
+        in_range = (freqs >= CHROMA_RANGE_HZ[0]) & (freqs <= CHROMA_RANGE_HZ[1])
+        pitch = np.round(12 * np.log2(freqs[in_range] / 440.0) + 69).astype(np.int64) % 12
+        self._chroma[pitch, np.flatnonzero(in_range)] = 1.0
+
+        self._onsets: List[np.ndarray] = []
+        self._levels: List[np.ndarray] = []
+        self._previous: Optional[np.ndarray] = None
+        self._chroma_sum = np.zeros(12)
+
+    @property
+    def full(self) -> bool:
+        return self._consumed >= self.max_samples
+
+    def feed(self, block: np.ndarray):
+        if self.full:
+            return
+        mono = block.mean(axis=1) if block.ndim == 2 else block
+        mono = mono[:self.max_samples - self._consumed]
+        self._consumed += len(mono)
+        self._buffer = np.concatenate([self._buffer, mono.astype(np.float32, copy=False)])
+        if len(self._buffer) < self.frame_length:
+            return
+        frames = np.lib.stride_tricks.sliding_window_view(self._buffer, self.frame_length)[::self.hop]
+        self._process(frames)
+        self._buffer = self._buffer[len(frames) * self.hop:].copy()
+
+    def _process(self, frames: np.ndarray):
+        magnitude = np.abs(np.fft.rfft(frames * self._window, axis=1)).astype(np.float32)
+        power = magnitude ** 2
+        # Whitened per frame so quiet passages count as much as loud ones
+        chroma = power @ self._chroma.T
+        self._chroma_sum += (chroma / np.maximum(chroma.sum(axis=1, keepdims=True), SILENT_FRAME_POWER)).sum(axis=0)
+
+        compressed = np.log1p(100 * magnitude)
+        history = compressed if self._previous is None else np.vstack([self._previous, compressed])
+        flux = np.maximum(np.diff(history, axis=0), 0).sum(axis=1)
+        if self._previous is None:
+            flux = np.r_[0.0, flux]
+        self._onsets.append(flux)
+        self._levels.append(compressed.sum(axis=1))
+        self._previous = compressed[-1:]
+
+    @property
+    def duration(self) -> float:
+        return self._consumed / self.sample_rate
+
+    def tempo(self) -> Tuple[Optional[float], float]:
+        """Estimated BPM (or None when there is no steady pulse) and a
+        confidence between 0 and 1."""
+        if self.duration < MIN_TEMPO_SECONDS or not self._onsets:
+            return None, 0.0
+        onsets = np.concatenate(self._onsets)
+        onsets = np.maximum(onsets - _moving_average(onsets, 16), 0)
+        if not onsets.any():
+            return None, 0.0
+        # Sustained sounds (drones, pads) and noise change only a little from
+        # frame to frame, and their autocorrelation finds a "beat" in that
+        # too: require distinct onsets first
+        strength = onsets / np.maximum(np.concatenate(self._levels), SILENT_FRAME_POWER)
+        peaks = (strength[1:-1] > strength[:-2]) & (strength[1:-1] >= strength[2:])
+        if np.count_nonzero(peaks & (strength[1:-1] >= MIN_ONSET_STRENGTH)) < MIN_ONSETS:
+            return None, 0.0
+
+        size = 1 << int(np.ceil(np.log2(2 * len(onsets))))
+        spectrum = np.fft.rfft(onsets, size)
+        autocorrelation = np.fft.irfft(spectrum.real ** 2 + spectrum.imag ** 2, size)[:len(onsets)]
+        # Unbiased: longer lags overlap fewer frames
+        autocorrelation /= len(onsets) - np.arange(len(onsets))
+        autocorrelation /= autocorrelation[0]
+
+        rate = self.sample_rate / self.hop
+        bpm = np.arange(MIN_BPM, MAX_BPM + 0.05, 0.1)
+        lags = 60 * rate / bpm
+        # A real beat period also lines up at two and four beats
+        usable = lags * 4 < len(onsets) - 1
+        if not usable.any():
+            return None, 0.0
+        bpm, lags = bpm[usable], lags[usable]
+        strength = sum(weight * np.interp(lags * multiple, np.arange(len(onsets)), autocorrelation)
+                       for multiple, weight in ((1, 1.0), (2, 0.5), (4, 0.25))) / 1.75
+        prior = np.exp(-0.5 * (np.log2(bpm / PRIOR_BPM) / 0.9) ** 2)
+        best = int(np.argmax(strength * prior))
+        confidence = float(np.clip(strength[best], 0, 1))
+        if confidence < MIN_TEMPO_CONFIDENCE:
+            return None, confidence
+        return round(float(bpm[best]), 1), confidence
+
+    def key(self) -> Tuple[Optional[str], float]:
+        """Estimated key name (``C``, ``F#m``) or None when the chroma is too
+        flat to tell, and the profile correlation."""
+        if not self._chroma_sum.any():
+            return None, 0.0
+        chroma = self._chroma_sum - self._chroma_sum.mean()
+        best, best_score = None, -1.0
+        for minor, profile in ((False, MAJOR_PROFILE), (True, MINOR_PROFILE)):
+            profile = profile - profile.mean()
+            for tonic in range(12):
+                score = float(np.corrcoef(chroma, np.roll(profile, tonic))[0, 1])
+                if score > best_score:
+                    best, best_score = key_name(tonic, minor), score
+        if best_score < MIN_KEY_CONFIDENCE:
+            return None, best_score
+        return best, best_score
+
+    def estimates(self) -> dict:
+        if not len(self._onsets) and len(self._buffer):
+            # Shorter than one frame: describe it by a zero-padded frame
+            padded = np.zeros(self.frame_length, dtype=np.float32)
+            padded[:len(self._buffer)] = self._buffer
+            self._process(padded[None, :])
+        bpm, tempo_confidence = self.tempo()
+        key, key_confidence = self.key()
+        return {
+            "bpm": bpm,
+            "bpm_confidence": round(tempo_confidence, 3),
+            "key": key,
+            "key_confidence": round(key_confidence, 3),
+            "tempo_key_version": TEMPO_KEY_VERSION,
+        }
+
+
+def _moving_average(values: np.ndarray, width: int) -> np.ndarray:
+    kernel = np.ones(width) / width
+    return np.convolve(values, kernel, mode="same")
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import os
+import shutil
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY') or shutil.which("ffmpeg")
+TRANSCODE_WORKERS = int(os.environ.get('TRANSCODE_WORKERS', 2))
+TRANSCODE_CACHE_BYTES = int(os.environ.get('TRANSCODE_CACHE_BYTES', 10 * 1024 ** 3))
+
+# format -> (file extension, media type, ffmpeg encoder arguments)
+FORMATS = {
+    "mp3": (".mp3", "audio/mpeg", ["-c:a", "libmp3lame", "-f", "mp3"]),
+    "aac": (".m4a", "audio/mp4", ["-c:a", "aac", "-movflags", "+faststart", "-f", "ipod"]),
+    "opus": (".ogg", "audio/ogg", ["-c:a", "libopus", "-f", "ogg"]),
+}
+BITRATES = (64, 96, 128, 160, 192, 256, 320)
+DEFAULT_BITRATE = 128
+
+
+class TranscodeError(RuntimeError):
+    pass
+
+
+class TranscodeCache:
+    """Encoded variants of stored audio, kept in a size-bounded LRU on disk.
+
+    Variants are keyed by source content hash, format and bitrate, so a
+    variant never goes stale. Concurrent requests for a variant that is
+    still encoding wait on the same job instead of starting another one, and
+    a semaphore caps the number of encoder processes.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = TRANSCODE_CACHE_BYTES, workers: int = TRANSCODE_WORKERS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._slots = asyncio.Semaphore(workers)
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        # Rebuild the LRU from disk, least recently used first
+        for path in sorted(self.root.glob("*/*"), key=lambda p: p.stat().st_mtime):
+            if path.name.startswith("."):
+                path.unlink(missing_ok=True)
+                continue
+            self._entries[str(path)] = path.stat().st_size
+            self._total += self._entries[str(path)]
+
+    @property
+    def available(self) -> bool:
+        return FFMPEG_BINARY is not None
+
+    def variant_path(self, sha256: str, fmt: str, bitrate: int) -> Path:
+        extension = FORMATS[fmt][0]
+        return self.root / sha256[:2] / f"{sha256}-{bitrate}k{extension}"
+
+    async def get(self, source: Path, sha256: str, fmt: str, bitrate: int) -> Path:
+        """Return the cached variant, encoding it first if needed."""
+        path = self.variant_path(sha256, fmt, bitrate)
+        key = str(path)
+        if key in self._entries and path.exists():
+            self._entries.move_to_end(key)
+            os.utime(path)
+            return path
+
+        # The encode runs as its own task so that a client disconnecting does
+        # not cancel it for the other requests waiting on the same variant.
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._encode(source, path, fmt, bitrate))
+            self._pending[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: str, task: asyncio.Task):
+        self._pending.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Transcode %s failed: %s", key, task.exception())
+
+    async def _encode(self, source: Path, path: Path, fmt: str, bitrate: int) -> Path:
+        if not self.available:
+            raise TranscodeError("No ffmpeg binary available")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        async with self._slots:
+            process = await asyncio.create_subprocess_exec(
+                FFMPEG_BINARY, "-nostdin", "-v", "error", "-y", "-i", str(source),
+                "-vn", "-b:a", f"{bitrate}k", *FORMATS[fmt][2], str(tmp_path),
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                _, stderr = await process.communicate()
+            except BaseException:
+                process.kill()
+                tmp_path.unlink(missing_ok=True)
+                raise
+        if process.returncode != 0:
+            tmp_path.unlink(missing_ok=True)
+            message = stderr.decode(errors="replace").strip().splitlines()
+            raise TranscodeError(message[-1] if message else f"ffmpeg exited with {process.returncode}")
+
+        os.replace(tmp_path, path)
+        size = path.stat().st_size
+        self._entries[str(path)] = size
+        self._total += size
+        self._evict(keep=str(path))
+        return path
+
+    def _evict(self, keep: str):
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            key, size = next(iter(self._entries.items()))
+            if key == keep:
+                self._entries.move_to_end(key)
+                continue
+            del self._entries[key]
+            self._total -= size
+            Path(key).unlink(missing_ok=True)
+            logger.info("Evicted transcode %s (%d bytes)", key, size)
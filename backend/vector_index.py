@@ -0,0 +1,317 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VECTOR_INDEX_MODE = os.environ.get('VECTOR_INDEX_MODE', 'ivf')  # ivf or flat (always exhaustive)
+IVF_LISTS = int(os.environ.get('VECTOR_IVF_LISTS', 0))  # 0: about 4 * sqrt(N)
+IVF_PROBES = int(os.environ.get('VECTOR_IVF_PROBES', 8))
+IVF_MIN_VECTORS = 10_000  # Smaller snapshots are always searched exhaustively
+KMEANS_ITERATIONS = 8
+KMEANS_SAMPLE = 100_000
+SEARCH_CHUNK = 262_144  # Rows scored per matmul, bounding temporary memory
+SNAPSHOT_MIN_TAIL = 10_000
+SNAPSHOT_VERSION = 1
+VECTOR_SYNC_INTERVAL = int(os.environ.get('VECTOR_SYNC_INTERVAL_SECONDS', 15))
+SYNC_SORT = [("created_at", 1), ("sha256", 1)]
+
+# Vectors written by other workers are found by creation time. A write can
+# become visible slightly after a later one, so each sync re-reads this
+# window and skips what it has already seen.
+SYNC_OVERLAP = timedelta(minutes=5)
+
+
+class VectorIndex:
+    """Nearest-neighbour index over unit vectors, scored by dot product.
+
+    Vectors live in two parts. The snapshot is a set of ``.npy`` files that
+    is memory-mapped read-only, so it costs no heap and is shared with every
+    process mapping it; the tail holds vectors added since, in memory.
+    ``snapshot`` folds the tail in and writes a new snapshot atomically.
+    Vectors are keyed by content hash and read from ``db.audio_embeddings``
+    by ``sync``; a snapshot built from another embedding version is ignored.
+
+    In ``ivf`` mode the snapshot is partitioned by spherical k-means and
+    stored list by list, so a query scores the ``probes`` lists nearest to
+    it as contiguous slices instead of the whole matrix. The tail is always
+    searched exhaustively, as are all vectors when ``exact`` is requested.
+
+    Searches run in worker threads while the event loop adds vectors, so
+    both take a short lock around the state they share.
+    """
+
+    def __init__(self, directory: Path, dim: int, version: int, mode: str = VECTOR_INDEX_MODE,
+                 lists: int = IVF_LISTS, probes: int = IVF_PROBES):
+        self.directory = directory
+        self.dim = dim
+        self.version = version
+        self.mode = mode
+        self.lists = lists
+        self.probes = probes
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._keys = np.zeros(0, dtype="S64")
+        self._centroids: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None  # List i is rows offsets[i]:offsets[i + 1]
+        self._tail = np.zeros((1024, dim), dtype=np.float32)
+        self._tail_keys: List[bytes] = []
+        self._seen = {}  # Keys read within the sync overlap window
+        self.cursor: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._snapshotting = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._tail_keys)
+
+    @property
+    def tail_size(self) -> int:
+        return len(self._tail_keys)
+
+    @property
+    def needs_snapshot(self) -> bool:
+        return self.tail_size >= max(SNAPSHOT_MIN_TAIL, len(self._keys) // 10)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "version": self.version,
+            "vectors": len(self),
+            "snapshot": len(self._keys),
+            "tail": self.tail_size,
+            "lists": 0 if self._centroids is None else len(self._centroids),
+            "probes": self.probes,
+        }
+
+    # Loading and persistence
+
+    def load(self) -> bool:
+        """Map the current snapshot, if there is a usable one."""
+        pointer = self.directory / "CURRENT"
+        if not pointer.exists():
+            return False
+        path = self.directory / pointer.read_text().strip()
+        try:
+            meta = json.loads((path / "meta.json").read_text())
+            if (meta["version"], meta["dim"], meta["embedding_version"]) != (SNAPSHOT_VERSION, self.dim, self.version):
+                logger.info("Ignoring vector snapshot %s with another layout", path.name)
+                return False
+            vectors = np.load(path / "vectors.npy", mmap_mode="r")
+            keys = np.load(path / "keys.npy", mmap_mode="r")
+            centroids = offsets = None
+            if (path / "ivf.npz").exists():
+                with np.load(path / "ivf.npz") as ivf:
+                    centroids, offsets = ivf["centroids"], ivf["offsets"]
+            with self._lock:
+                self._vectors, self._keys = vectors, keys
+                self._centroids, self._offsets = centroids, offsets
+            self.cursor = datetime.fromisoformat(meta["cursor"]) if meta["cursor"] else None
+        except (OSError, ValueError, KeyError):
+            logger.exception("Could not load vector snapshot %s", path)
+            return False
+        return True
+
+    def prepare_snapshot(self) -> Tuple[str, int]:
+        """Write the snapshot plus the current tail as a new snapshot
+        directory and return its name and how many tail rows it took. Blocking
+        and read-only with respect to the index; run it in a worker thread."""
+        with self._lock:
+            taken = self.tail_size
+            base_keys, base_vectors = self._keys, self._vectors
+            tail_keys, tail = self._tail_keys[:taken], self._tail[:taken]
+        keys = np.concatenate([np.asarray(base_keys), np.array(tail_keys, dtype="S64")])
+        vectors = np.concatenate([np.asarray(base_vectors), tail])
+        # The same key can be added twice around a sync; keep its last vector
+        _, last = np.unique(keys[::-1], return_index=True)
+        keep = np.sort(len(keys) - 1 - last)
+        keys, vectors = keys[keep], vectors[keep]
+
+        centroids = offsets = None
+        if self.mode == "ivf" and len(keys) >= IVF_MIN_VECTORS:
+            lists = self.lists or int(4 * np.sqrt(len(keys)))
+            centroids = train_centroids(vectors, lists)
+            assignment = assign(vectors, centroids)
+            order = np.argsort(assignment, kind="stable")
+            keys, vectors = keys[order], vectors[order]
+            offsets = np.searchsorted(assignment[order], np.arange(lists + 1))
+
+        name = f"snapshot-{uuid.uuid4().hex}"
+        path = self.directory / name
+        path.mkdir(parents=True)
+        np.save(path / "vectors.npy", vectors)
+        np.save(path / "keys.npy", keys)
+        if centroids is not None:
+            np.savez(path / "ivf.npz", centroids=centroids, offsets=offsets)
+        (path / "meta.json").write_text(json.dumps({
+            "version": SNAPSHOT_VERSION,
+            "dim": self.dim,
+            "embedding_version": self.version,
+            "count": len(keys),
+            "cursor": self.cursor.isoformat() if self.cursor else None,
+        }))
+        return name, taken
+
+    def install_snapshot(self, name: str, taken: int):
+        """Publish a prepared snapshot and switch to it, keeping the tail
+        rows added since it was prepared."""
+        pointer = self.directory / "CURRENT"
+        previous = pointer.read_text().strip() if pointer.exists() else None
+        tmp_pointer = self.directory / f".CURRENT.{uuid.uuid4().hex}"
+        tmp_pointer.write_text(name)
+        os.replace(tmp_pointer, pointer)
+
+        path = self.directory / name
+        vectors = np.load(path / "vectors.npy", mmap_mode="r")
+        keys = np.load(path / "keys.npy", mmap_mode="r")
+        centroids = offsets = None
+        if (path / "ivf.npz").exists():
+            with np.load(path / "ivf.npz") as ivf:
+                centroids, offsets = ivf["centroids"], ivf["offsets"]
+        with self._lock:
+            remaining = self._tail[taken:self.tail_size]
+            tail = np.zeros((max(len(remaining) * 2, 1024), self.dim), dtype=np.float32)
+            tail[:len(remaining)] = remaining
+            self._tail, self._tail_keys = tail, self._tail_keys[taken:]
+            self._vectors, self._keys = vectors, keys
+            self._centroids, self._offsets = centroids, offsets
+        if previous and previous != name:
+            # Other processes may still map it; unlinked files stay readable to them
+            shutil.rmtree(self.directory / previous, ignore_errors=True)
+
+    # Updates
+
+    def add(self, key: str, vector: np.ndarray, created_at: Optional[datetime] = None):
+        """Add a vector; ``created_at`` is its stored creation time, which
+        lets ``sync`` skip it."""
+        if created_at is not None:
+            if created_at.tzinfo is not None:
+                # Compared with the naive UTC datetimes Motor returns
+                created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+            self._seen[key] = created_at
+        with self._lock:
+            if self.tail_size == len(self._tail):
+                self._tail = np.concatenate([self._tail, np.zeros_like(self._tail)])
+            self._tail[self.tail_size] = vector
+            self._tail_keys.append(key.encode())
+        if created_at is not None and (self.cursor is None or created_at > self.cursor):
+            self.cursor = created_at
+
+    async def sync(self, collection) -> int:
+        """Add the vectors stored since the last sync, oldest first."""
+        query = {"version": self.version}
+        if self.cursor is not None:
+            since = self.cursor - SYNC_OVERLAP
+            # Forget keys that have left the overlap window
+            self._seen = {key: at for key, at in self._seen.items() if at >= since}
+            query["created_at"] = {"$gte": since}
+        synced = 0
+        cursor = collection.find(query, {"_id": 0, "sha256": 1, "vector": 1, "created_at": 1}).sort(SYNC_SORT)
+        async for doc in cursor:
+            if doc["sha256"] not in self._seen:
+                self.add(doc["sha256"], np.frombuffer(doc["vector"], dtype=np.float32), doc["created_at"])
+                synced += 1
+        return synced
+
+    async def snapshot(self) -> bool:
+        """Fold the tail into a new snapshot, unless one is being written."""
+        if self._snapshotting.locked():
+            return False
+        async with self._snapshotting:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            name, taken = await asyncio.to_thread(self.prepare_snapshot)
+            self.install_snapshot(name, taken)
+        return True
+
+    # Queries
+
+    def search(self, query: np.ndarray, k: int, exact: bool = False) -> List[Tuple[str, float]]:
+        """Keys of the ``k`` vectors with the highest dot product with
+        ``query``, best first, with their scores."""
+        query = np.asarray(query, dtype=np.float32)
+        with self._lock:
+            base_keys, base_vectors = self._keys, self._vectors
+            centroids, offsets = self._centroids, self._offsets
+            tail_keys = self._tail_keys
+            tail = self._tail[:len(tail_keys)]
+        scores: List[np.ndarray] = []
+        rows: List[np.ndarray] = []
+
+        if len(base_keys):
+            if centroids is not None and not exact:
+                probes = min(self.probes, len(centroids))
+                nearest = np.argpartition(-(centroids @ query), probes - 1)[:probes]
+                for cluster in nearest:
+                    start, end = int(offsets[cluster]), int(offsets[cluster + 1])
+                    if end > start:
+                        scores.append(base_vectors[start:end] @ query)
+                        rows.append(np.arange(start, end))
+            else:
+                for start in range(0, len(base_keys), SEARCH_CHUNK):
+                    end = min(start + SEARCH_CHUNK, len(base_keys))
+                    chunk = base_vectors[start:end] @ query
+                    top = _top(chunk, k)
+                    scores.append(chunk[top])
+                    rows.append(top + start)
+        if len(tail):
+            chunk = tail @ query
+            top = _top(chunk, k)
+            scores.append(chunk[top])
+            rows.append(top + len(base_keys))
+        if not scores:
+            return []
+
+        scores = np.concatenate(scores)
+        rows = np.concatenate(rows)
+        # Over-select so that duplicate keys can be dropped
+        best = _top(scores, k * 2)
+        best = best[np.argsort(-scores[best], kind="stable")]
+        results, seen = [], set()
+        for i in best:
+            row = int(rows[i])
+            key = (base_keys[row] if row < len(base_keys) else tail_keys[row - len(base_keys)]).decode()
+            if key not in seen:
+                seen.add(key)
+                results.append((key, float(scores[i])))
+                if len(results) == k:
+                    break
+        return results
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    if len(scores) <= k:
+        return np.arange(len(scores))
+    return np.argpartition(-scores, k - 1)[:k]
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid (by dot product) of every vector, in chunks."""
+    out = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), 65536):
+        out[start:start + 65536] = np.argmax(vectors[start:start + 65536] @ centroids.T, axis=1)
+    return out
+
+
+def train_centroids(vectors: np.ndarray, lists: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means over a sample of ``vectors``."""
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), max(KMEANS_SAMPLE, lists * 40)), replace=False)]
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        # Restart empty lists from random samples
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        norms[empty] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
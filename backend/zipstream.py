@@ -0,0 +1,136 @@
+import struct
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Tuple
+
+from media import read_file_range
+
+# Uncompressed ("stored") zip archives generated on the fly. Every header
+# is derived from the entry list, so the archive is byte-identical for the
+# same entries and any byte range can be produced without building the
+# rest of it. That is what makes downloads resumable with Range requests.
+# Audio barely compresses, so storing costs little space and no CPU.
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+VERSION_STORED = 20
+VERSION_ZIP64 = 45
+UTF8_FLAG = 0x0800
+
+LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+ZIP64_END = struct.Struct("<IQHHIIQQQQ")
+ZIP64_LOCATOR = struct.Struct("<IIQI")
+END_OF_CENTRAL_DIR = struct.Struct("<IHHHHIIH")
+
+
+@dataclass
+class ZipEntry:
+    name: str  # Path inside the archive
+    path: Path
+    size: int
+    crc32: int
+
+
+def file_crc32(path: Path) -> int:
+    """CRC-32 of a file from disk. Blocking; run it in a worker thread."""
+    crc = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _dos_datetime(when: datetime) -> Tuple[int, int]:
+    when = max(when.replace(tzinfo=None), datetime(1980, 1, 1))
+    date = ((when.year - 1980) << 9) | (when.month << 5) | when.day
+    time = (when.hour << 11) | (when.minute << 5) | (when.second // 2)
+    return time, date
+
+
+def _zip64_extra(*values: int) -> bytes:
+    return struct.pack(f"<HH{len(values)}Q", 0x0001, 8 * len(values), *values)
+
+
+class ZipLayout:
+    """Byte layout of a stored zip archive over ``entries``.
+
+    The archive is a list of segments, each either literal header bytes or a
+    slice of an entry's file, so ``read_range`` only touches the segments
+    overlapping the requested range. ZIP64 records are added only where a
+    size, offset or entry count needs them.
+    """
+
+    def __init__(self, entries: List[ZipEntry], modified: datetime):
+        self.entries = entries
+        dos_time, dos_date = _dos_datetime(modified)
+        # (offset, length, literal bytes or None, file path or None)
+        self.segments: List[Tuple[int, int, Optional[bytes], Optional[Path]]] = []
+        central = []
+        offset = 0
+
+        for entry in entries:
+            name = entry.name.encode("utf-8")
+            zip64_size = entry.size >= ZIP64_LIMIT
+            version = VERSION_ZIP64 if zip64_size or offset >= ZIP64_LIMIT else VERSION_STORED
+            stored_size = ZIP64_LIMIT if zip64_size else entry.size
+            local_extra = _zip64_extra(entry.size, entry.size) if zip64_size else b""
+            local = LOCAL_HEADER.pack(
+                0x04034b50, version, UTF8_FLAG, 0, dos_time, dos_date,
+                entry.crc32, stored_size, stored_size, len(name), len(local_extra)
+            ) + name + local_extra
+            header_offset = offset
+            offset = self._add(offset, local)
+            offset = self._add(offset, None, entry.path, entry.size)
+
+            # The central directory extra lists only the fields that overflowed
+            central_values = [entry.size, entry.size] if zip64_size else []
+            if header_offset >= ZIP64_LIMIT:
+                central_values.append(header_offset)
+            central_extra = _zip64_extra(*central_values) if central_values else b""
+            central.append(CENTRAL_HEADER.pack(
+                0x02014b50, version, version, UTF8_FLAG, 0, dos_time, dos_date,
+                entry.crc32, stored_size, stored_size, len(name), len(central_extra), 0, 0, 0, 0,
+                min(header_offset, ZIP64_LIMIT)
+            ) + name + central_extra)
+
+        directory = b"".join(central)
+        directory_offset = offset
+        count = len(entries)
+        trailer = b""
+        if count >= ZIP64_COUNT_LIMIT or len(directory) >= ZIP64_LIMIT or directory_offset >= ZIP64_LIMIT:
+            zip64_end_offset = directory_offset + len(directory)
+            trailer += ZIP64_END.pack(
+                0x06064b50, ZIP64_END.size - 12, VERSION_ZIP64, VERSION_ZIP64, 0, 0,
+                count, count, len(directory), directory_offset
+            )
+            trailer += ZIP64_LOCATOR.pack(0x07064b50, 0, zip64_end_offset, 1)
+        trailer += END_OF_CENTRAL_DIR.pack(
+            0x06054b50, 0, 0,
+            min(count, ZIP64_COUNT_LIMIT), min(count, ZIP64_COUNT_LIMIT),
+            min(len(directory), ZIP64_LIMIT), min(directory_offset, ZIP64_LIMIT), 0
+        )
+        self.size = self._add(offset, directory + trailer)
+
+    def _add(self, offset: int, data: Optional[bytes], path: Optional[Path] = None, length: int = 0) -> int:
+        length = len(data) if data is not None else length
+        if length:
+            self.segments.append((offset, length, data, path))
+        return offset + length
+
+    async def read_range(self, start: int, end: int) -> AsyncIterator[bytes]:
+        """Yield archive bytes ``start``..``end`` (inclusive)."""
+        for offset, length, data, path in self.segments:
+            if offset + length <= start:
+                continue
+            if offset > end:
+                break
+            lo = max(start, offset) - offset
+            hi = min(end, offset + length - 1) - offset
+            if data is not None:
+                yield data[lo:hi + 1]
+            else:
+                async for chunk in read_file_range(path, lo, hi):
+                    yield chunk
@@ -0,0 +1,462 @@
+"""Load benchmark for the recording studio API.
+
+Starts backend/server.py in a subprocess against a throwaway database, either
+a local MongoDB (--mongo-url) or mongomock-motor (the default, no server
+needed), then drives concurrent scenarios against it and reports latency
+percentiles, throughput and server memory.
+
+    python backend_benchmark.py                                  # all scenarios
+    python backend_benchmark.py --scenarios playback --scale 0.1
+    python backend_benchmark.py --save-baseline bench_baseline.json
+    python backend_benchmark.py --baseline bench_baseline.json   # exit 1 on regression
+"""
+import argparse
+import base64
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+MB = 1024 * 1024
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank method
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def wav_header(data_bytes, sample_rate=44100, channels=2, bits=16):
+    block_align = channels * bits // 8
+    return (
+        b"RIFF" + struct.pack("<I", 36 + data_bytes) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, sample_rate * block_align, block_align, bits)
+        + b"data" + struct.pack("<I", data_bytes)
+    )
+
+
+def wav_chunks(total_bytes, seed, chunk_size=MB):
+    """A WAV file of ``total_bytes`` as a stream of chunks, unique per seed
+    so uploads are not deduplicated."""
+    data_bytes = total_bytes - 44
+    yield wav_header(data_bytes)
+    block = bytearray(random.Random(seed).randbytes(chunk_size))
+    remaining = data_bytes
+    counter = 0
+    while remaining > 0:
+        struct.pack_into("<Q", block, 0, counter)
+        counter += 1
+        size = min(chunk_size, remaining)
+        yield bytes(block[:size])
+        remaining -= size
+
+
+def signature_png(width=400, height=150, seed=7):
+    """A noisy grayscale PNG of roughly the size a signature pad produces."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    rows = random.Random(seed).randbytes(width * height // 8)
+    raw = b"".join(b"\x00" + rows[i:i + width // 8] * 8 for i in range(0, len(rows), width // 8))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
+
+
+class MultipartUpload:
+    """Streamed multipart/form-data body, so 100 MB uploads are never held
+    in client memory."""
+
+    def __init__(self, fields, file_field, filename, chunks):
+        self.boundary = uuid.uuid4().hex
+        self.fields = fields
+        self.file_field = file_field
+        self.filename = filename
+        self.chunks = chunks
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __iter__(self):
+        for name, value in self.fields.items():
+            yield (
+                f"--{self.boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n"
+            ).encode()
+        yield (
+            f"--{self.boundary}\r\nContent-Disposition: form-data; name=\"{self.file_field}\"; "
+            f"filename=\"{self.filename}\"\r\nContent-Type: audio/wav\r\n\r\n"
+        ).encode()
+        yield from self.chunks
+        yield f"\r\n--{self.boundary}--\r\n".encode()
+
+
+class ServerProcess:
+    """backend/server.py under uvicorn in a child process, with its own
+    working directory and database."""
+
+    def __init__(self, mongo_url=None, port=None):
+        self.mongo_url = mongo_url
+        self.port = port or self._free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.db_name = f"bench_{uuid.uuid4().hex[:8]}"
+        self.workdir = tempfile.mkdtemp(prefix="studio-bench-")
+        self.process = None
+
+    @staticmethod
+    def _free_port():
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            return s.getsockname()[1]
+
+    def __enter__(self):
+        env = dict(os.environ, MONGO_URL=self.mongo_url or "mongodb://mongomock", DB_NAME=self.db_name)
+        command = [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(self.port)]
+        if not self.mongo_url:
+            command.append("--mock")
+        self.process = subprocess.Popen(command, cwd=self.workdir, env=env)
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited with {self.process.returncode}")
+            try:
+                if requests.get(f"{self.base_url}/api/soundpacks?limit=1", timeout=1).status_code == 200:
+                    return self
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        self.__exit__(None, None, None)
+        raise RuntimeError("Server did not become ready")
+
+    def __exit__(self, *exc):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.mongo_url:
+            from pymongo import MongoClient
+            MongoClient(self.mongo_url).drop_database(self.db_name)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def memory(self):
+        """Current and peak resident set size in MB (Linux only)."""
+        values = {}
+        try:
+            with open(f"/proc/{self.process.pid}/status") as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    if key in ("VmRSS", "VmHWM"):
+                        values[key] = int(value.split()[0]) / 1024
+        except OSError:
+            return None, None
+        return values.get("VmRSS"), values.get("VmHWM")
+
+
+def serve(port, mock):
+    """Child process entry point: run the app under uvicorn."""
+    if mock:
+        try:
+            import mongomock_motor
+        except ImportError:
+            sys.exit("mongomock-motor is not installed; pip install mongomock-motor or pass --mongo-url")
+        import motor.motor_asyncio
+        motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+    sys.path.insert(0, BACKEND_DIR)
+    import uvicorn
+    import server
+    uvicorn.run(server.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+class ScenarioResult:
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.errors = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok, size=0):
+        with self._lock:
+            self.latencies.append(seconds)
+            self.bytes += size
+            if not ok:
+                self.errors += 1
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "throughput_rps": round(count / self.elapsed, 2) if self.elapsed else 0.0,
+            "throughput_mbps": round(self.bytes / MB / self.elapsed, 2) if self.elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        }
+
+
+_sessions = threading.local()
+
+
+def session():
+    # One keep-alive connection pool per worker thread
+    if not hasattr(_sessions, "session"):
+        _sessions.session = requests.Session()
+    return _sessions.session
+
+
+def drive(result, calls, concurrency):
+    """Run ``calls`` (callables returning (ok, bytes)) on ``concurrency``
+    threads, timing each one into ``result``."""
+    def timed(call):
+        start = time.perf_counter()
+        try:
+            ok, size = call()
+        except requests.RequestException:
+            ok, size = False, 0
+        result.record(time.perf_counter() - start, ok, size)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, calls))
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def create_user(api):
+    tag = uuid.uuid4().hex[:12]
+    response = session().post(f"{api}/auth/register", json={
+        "username": f"bench_{tag}", "email": f"bench_{tag}@example.com", "full_name": "Bench User"
+    })
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+def scenario_registration(api, scale):
+    count = max(int(2000 * scale), 10)
+
+    def register(i):
+        def call():
+            response = session().post(f"{api}/auth/register", json={
+                "username": f"storm_{i}", "email": f"storm_{i}_{uuid.uuid4().hex[:6]}@example.com",
+                "full_name": f"Storm User {i}", "is_artist": i % 2 == 0,
+            })
+            return response.status_code == 200, len(response.content)
+        return call
+
+    return drive(ScenarioResult("registration"), [register(i) for i in range(count)], 50)
+
+
+def scenario_project_lists(api, scale):
+    users = [create_user(api) for _ in range(max(int(20 * scale), 2))]
+    seed = [(user_id, i) for user_id in users for i in range(50)]
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        list(pool.map(lambda item: session().post(f"{api}/projects", data={
+            "title": f"Project {item[1]}", "user_id": item[0], "bpm": 90 + item[1]
+        }).raise_for_status(), seed))
+
+    def list_projects(i):
+        user_id = users[i % len(users)]
+        params = [{"user_id": user_id, "limit": 100}, {"limit": 100, "fields": "title,bpm,updated_at"}, {"user_id": user_id}][i % 3]
+
+        def call():
+            response = session().get(f"{api}/projects", params=params)
+            return response.status_code == 200, len(response.content)
+        return call
+
+    count = max(int(2000 * scale), 20)
+    return drive(ScenarioResult("project_lists"), [list_projects(i) for i in range(count)], 50)
+
+
+def scenario_upload_burst(api, scale, upload_mb=100):
+    user_id = create_user(api)
+    project = session().post(f"{api}/projects", data={"title": "Uploads", "user_id": user_id})
+    project.raise_for_status()
+    project_id = project.json()["id"]
+    size = max(int(upload_mb * MB * min(scale, 1.0)), MB)
+
+    def upload(i):
+        def call():
+            body = MultipartUpload({"project_id": project_id}, "file", f"take_{i}.wav", wav_chunks(size, seed=i))
+            response = session().post(f"{api}/audio/upload", data=iter(body),
+                                      headers={"Content-Type": body.content_type})
+            return response.status_code == 200, size
+        return call
+
+    count = max(int(8 * scale), 2)
+    return drive(ScenarioResult("upload_burst"), [upload(i) for i in range(count)], count)
+
+
+def scenario_playback(api, scale, file_mb=20, window=256 * 1024):
+    user_id = create_user(api)
+    project = session().post(f"{api}/projects", data={"title": "Playback", "user_id": user_id})
+    project.raise_for_status()
+    size = max(int(file_mb * MB * min(scale, 1.0)), 2 * window)
+    body = MultipartUpload({"project_id": project.json()["id"]}, "file", "mix.wav", wav_chunks(size, seed=99))
+    uploaded = session().post(f"{api}/audio/upload", data=iter(body), headers={"Content-Type": body.content_type})
+    uploaded.raise_for_status()
+    url = f"{api}/audio/{uploaded.json()['filename']}"
+    etag = session().get(url, headers={"Range": "bytes=0-0"}).headers["etag"]
+
+    def fetch(i):
+        def call():
+            if i % 10 == 0:
+                # Players revalidate cached audio as well as seeking in it
+                response = session().get(url, headers={"If-None-Match": etag})
+                return response.status_code == 304, 0
+            start = random.randrange(0, size - window)
+            response = session().get(url, headers={"Range": f"bytes={start}-{start + window - 1}"})
+            return response.status_code == 206 and len(response.content) == window, len(response.content)
+        return call
+
+    count = max(int(2000 * scale), 20)
+    return drive(ScenarioResult("playback"), [fetch(i) for i in range(count)], 32)
+
+
+def scenario_contract_signing(api, scale):
+    count = max(int(500 * scale), 10)
+    users = [create_user(api) for _ in range(max(count // 10, 1))]
+    contracts = []
+    for i in range(count):
+        response = session().post(f"{api}/contracts", data={
+            "artist_name": f"Artist {i}", "user_id": users[i % len(users)]
+        })
+        response.raise_for_status()
+        contracts.append(response.json()["id"])
+    signature = "data:image/png;base64," + base64.b64encode(signature_png()).decode()
+
+    def sign(contract_id):
+        def call():
+            response = session().post(f"{api}/contracts/{contract_id}/sign", json={
+                "contract_id": contract_id, "signature_data": signature
+            })
+            return response.status_code == 200, len(response.content)
+        return call
+
+    return drive(ScenarioResult("contract_signing"), [sign(c) for c in contracts], 25)
+
+
+SCENARIOS = {
+    "registration": scenario_registration,
+    "project_lists": scenario_project_lists,
+    "upload_burst": scenario_upload_burst,
+    "playback": scenario_playback,
+    "contract_signing": scenario_contract_signing,
+}
+
+
+def run(args):
+    names = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+
+    report = {"mongo": "mongodb" if args.mongo_url else "mongomock", "scale": args.scale, "scenarios": {}}
+    with ServerProcess(args.mongo_url) as server:
+        api = f"{server.base_url}/api"
+        rss, _ = server.memory()
+        report["rss_start_mb"] = rss
+        for name in names:
+            print(f"▶ {name} ...", flush=True)
+            result = SCENARIOS[name](api, args.scale).summary()
+            result["rss_mb"], result["rss_peak_mb"] = server.memory()
+            report["scenarios"][name] = result
+        report["rss_end_mb"], report["rss_peak_mb"] = server.memory()
+    return report
+
+
+def print_report(report):
+    header = f"{'scenario':<18}{'reqs':>7}{'errs':>6}{'req/s':>9}{'MB/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'RSS MB':>9}"
+    print("\n" + header)
+    print("-" * len(header))
+    for name, r in report["scenarios"].items():
+        rss = f"{r['rss_mb']:.0f}" if r.get("rss_mb") else "-"
+        print(f"{name:<18}{r['requests']:>7}{r['errors']:>6}{r['throughput_rps']:>9}{r['throughput_mbps']:>9}"
+              f"{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{rss:>9}")
+    if report.get("rss_peak_mb"):
+        print(f"\nServer RSS: {report['rss_start_mb']:.0f} MB at start, {report['rss_peak_mb']:.0f} MB peak")
+
+
+def compare(report, baseline, tolerance):
+    """Regressions beyond ``tolerance`` (a fraction) against a saved run."""
+    failures = []
+    for name, current in report["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        if current["errors"] > base["errors"]:
+            failures.append(f"{name}: {current['errors']} errors (baseline {base['errors']})")
+        for metric in ("p95_ms", "p99_ms"):
+            if base[metric] and current[metric] > base[metric] * (1 + tolerance):
+                failures.append(f"{name}: {metric} {current[metric]} > baseline {base[metric]}")
+        if base["throughput_rps"] and current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            failures.append(f"{name}: throughput {current['throughput_rps']} req/s < baseline {base['throughput_rps']}")
+    if baseline.get("rss_peak_mb") and report.get("rss_peak_mb"):
+        if report["rss_peak_mb"] > baseline["rss_peak_mb"] * (1 + tolerance):
+            failures.append(f"peak RSS {report['rss_peak_mb']:.0f} MB > baseline {baseline['rss_peak_mb']:.0f} MB")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", help="Local MongoDB to benchmark against (default: mongomock-motor)")
+    parser.add_argument("--scenarios", help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for request counts and file sizes")
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Save this run as the baseline")
+    parser.add_argument("--baseline", metavar="PATH", help="Fail if this run regresses against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed regression as a fraction (default 0.25)")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mock", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.mock)
+        return 0
+
+    report = run(args)
+    print_report(report)
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = compare(report, json.load(f), args.tolerance)
+        if failures:
+            print("\n❌ Performance regressions:")
+            for failure in failures:
+                print(f"   {failure}")
+            return 1
+        print("\n✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
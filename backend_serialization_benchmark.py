@@ -0,0 +1,129 @@
+"""Microbenchmark for list endpoint serialization.
+
+Compares the per-document cost of encoding stored documents the old way
+(build a Pydantic model per document, then let FastAPI validate the list
+against response_model and json.dumps it) with DocumentEncoder, which
+encodes the documents straight to JSON bytes. Both outputs are checked to
+be identical.
+
+    python backend_serialization_benchmark.py
+    python backend_serialization_benchmark.py --docs 1000 --repeat 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+# server.py creates its working directories on import
+os.chdir(tempfile.mkdtemp(prefix="serialization-bench-"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "serialization_bench")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import APIRoute, serialize_response  # noqa: E402
+
+import server  # noqa: E402
+from serialization import encoder_for  # noqa: E402
+
+
+def stored_documents(kind, count, seed=1):
+    """Documents shaped like what Motor returns: an ObjectId ``_id`` and
+    naive UTC datetimes with millisecond precision."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    docs = []
+    for i in range(count):
+        created_at = start + timedelta(milliseconds=rng.randrange(10 ** 10))
+        doc = {"_id": ObjectId(), "id": str(uuid.uuid4()), "created_at": created_at}
+        if kind == "projects":
+            doc.update({
+                "title": f"Project {i}", "description": "Late night session " * 3,
+                "user_id": str(uuid.uuid4()),
+                "tracks": [f"{uuid.uuid4()}.wav" for _ in range(rng.randrange(12))],
+                "bpm": rng.randrange(60, 180), "key_signature": "Am",
+                "updated_at": created_at, "is_public": rng.random() < 0.5,
+                "collaborators": [str(uuid.uuid4()) for _ in range(rng.randrange(3))],
+            })
+        elif kind == "soundpacks":
+            doc.update({
+                "name": f"Pack {i}", "description": "Drums and textures", "genre": "trap",
+                "author": "Producer", "files": [f"{uuid.uuid4()}.wav" for _ in range(rng.randrange(30))],
+                "tags": ["drums", "808", "dark"], "is_premium": rng.random() < 0.2,
+                "download_count": rng.randrange(10000),
+            })
+        elif kind == "users":
+            doc.update({
+                "username": f"user{i}", "email": f"user{i}@example.com", "full_name": f"User {i}",
+                "is_artist": rng.random() < 0.3, "membership_tier": "free", "contract_signed": False,
+            })
+        docs.append(doc)
+    return docs
+
+
+ENDPOINTS = {
+    "projects": ("/api/projects", server.Project),
+    "soundpacks": ("/api/soundpacks", server.SoundPack),
+    "users": ("/api/auth/users", server.User),
+}
+
+
+def response_field(path):
+    for route in server.app.routes:
+        if isinstance(route, APIRoute) and route.path == path and "GET" in route.methods:
+            return route.response_field
+    raise LookupError(path)
+
+
+def encode_models(field, model, docs):
+    """The previous list_documents path, as FastAPI ran it."""
+    models = [model(**doc) for doc in docs]
+    content = asyncio.run(serialize_response(field=field, response_content=models, is_coroutine=True))
+    return JSONResponse(content).body
+
+
+def encode_fast(model, docs):
+    return encoder_for(model).encode(docs)
+
+
+def per_document_us(fn, docs, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(docs)
+        best = min(best, time.perf_counter() - start)
+    return best / len(docs) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=1000, help="Documents per list (default 1000)")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per measurement; the best is reported")
+    args = parser.parse_args()
+
+    print(f"{'endpoint':<12} {'models µs/doc':>14} {'fast µs/doc':>12} {'speedup':>8}")
+    print("-" * 50)
+    for kind, (path, model) in ENDPOINTS.items():
+        docs = stored_documents(kind, args.docs)
+        field = response_field(path)
+        before = encode_models(field, model, docs)
+        after = encode_fast(model, docs)
+        if json.loads(before) != json.loads(after):
+            print(f"❌ {kind}: fast encoding differs from the model output")
+            return 1
+        slow = per_document_us(lambda d: encode_models(field, model, d), docs, args.repeat)
+        fast = per_document_us(lambda d: encode_fast(model, d), docs, args.repeat)
+        print(f"{kind:<12} {slow:>14.2f} {fast:>12.2f} {slow / fast:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,12 @@
 import requests
 import sys
 import json
+import io
+import struct
+import math
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 class RecordingStudioAPITester:
@@ -12,6 +18,7 @@ class RecordingStudioAPITester:
         self.test_user = None
         self.test_project = None
         self.test_contract = None
+        self.test_sound_pack = None
 
     def run_test(self, name, method, endpoint, expected_status, data=None, files=None, use_json=True):
         """Run a single API test"""
@@ -201,6 +208,7 @@ class RecordingStudioAPITester:
         )
         
         if success and 'id' in response:
+            self.test_sound_pack = response
             print(f"   Created sound pack: {response['name']} (ID: {response['id']})")
             return True
         return False
@@ -288,6 +296,100 @@ class RecordingStudioAPITester:
             return True
         return False
 
+    def test_concurrent_track_uploads(self, uploads=100):
+        """Test that simultaneous uploads to one project keep every track"""
+        if not self.test_project:
+            print("❌ Skipping - No test project available")
+            return False
+
+        self.tests_run += 1
+        print(f"\n🔍 Testing {uploads} Concurrent Track Uploads...")
+        url = f"{self.api_url}/audio/upload"
+
+        # Minimal valid WAV header: 8 kHz mono 16-bit, no samples
+        wav = b"RIFF" + struct.pack("<I", 36) + b"WAVEfmt " + struct.pack(
+            "<IHHIIHH", 16, 1, 1, 8000, 16000, 2, 16
+        ) + b"data" + struct.pack("<I", 0)
+
+        def upload(i):
+            files = {"file": (f"take_{i}.wav", io.BytesIO(wav), "audio/wav")}
+            response = requests.post(url, data={"project_id": self.test_project['id']}, files=files)
+            return response.json().get("filename") if response.status_code == 200 else None
+
+        with ThreadPoolExecutor(max_workers=uploads) as pool:
+            filenames = list(pool.map(upload, range(uploads)))
+
+        failed = filenames.count(None)
+        response = requests.get(f"{self.api_url}/projects/{self.test_project['id']}")
+        tracks = set(response.json().get("tracks", [])) if response.status_code == 200 else set()
+        lost = [name for name in filenames if name and name not in tracks]
+
+        if failed == 0 and not lost:
+            self.tests_passed += 1
+            print(f"✅ Passed - All {uploads} tracks recorded on the project")
+            return True
+        print(f"❌ Failed - {failed} uploads failed, {len(lost)} tracks lost")
+        return False
+
+    def test_similarity_truncated_clip(self):
+        """Test that a truncated WAV clip is rejected as unreadable"""
+        # RIFF header followed by a fmt chunk cut off after 4 bytes
+        clip = b"RIFF" + struct.pack("<I", 20) + b"WAVEfmt " + struct.pack("<I", 16) + struct.pack("<HH", 1, 1)
+        
+        success, _ = self.run_test(
+            "Similarity Search with Truncated Clip",
+            "POST",
+            "soundpacks/similar",
+            422,
+            files={"file": ("clip.wav", io.BytesIO(clip), "audio/wav")}
+        )
+        return success
+
+    def test_pulse_free_samples_have_no_tempo(self):
+        """Test that sounds without a beat are not given a BPM"""
+        if not self.test_sound_pack:
+            print("❌ Skipping - No test sound pack available")
+            return False
+
+        self.tests_run += 1
+        print(f"\n🔍 Testing Tempo of Pulse-Free Samples...")
+        rate, seconds = 22050, 6
+        rng = random.Random(0)
+        signals = {
+            # Sustained A minor chord
+            "drone.wav": lambda t: 0.2 * sum(math.sin(2 * math.pi * f * t) for f in (220.0, 261.63, 329.63)),
+            "noise.wav": lambda t: rng.gauss(0, 0.2),
+        }
+
+        results = {}
+        for name, signal in signals.items():
+            samples = [max(-32767, min(32767, int(signal(i / rate) * 32767))) for i in range(rate * seconds)]
+            data = struct.pack(f"<{len(samples)}h", *samples)
+            wav = b"RIFF" + struct.pack("<I", 36 + len(data)) + b"WAVEfmt " + struct.pack(
+                "<IHHIIHH", 16, 1, 1, rate, rate * 2, 2, 16
+            ) + b"data" + struct.pack("<I", len(data)) + data
+            response = requests.post(
+                f"{self.api_url}/soundpacks/{self.test_sound_pack['id']}/upload",
+                files={"file": (name, io.BytesIO(wav), "audio/wav")}
+            )
+            if response.status_code != 200:
+                results[name] = f"upload failed ({response.status_code})"
+                continue
+            job_id = response.json()["analysis_job_id"]
+            for _ in range(120):
+                job = requests.get(f"{self.api_url}/jobs/{job_id}").json()
+                if job["status"] in ("done", "failed"):
+                    break
+                time.sleep(0.5)
+            results[name] = job.get("result", {}).get("bpm") if job["status"] == "done" else f"job {job['status']}"
+
+        if all(bpm is None for bpm in results.values()):
+            self.tests_passed += 1
+            print(f"✅ Passed - No tempo for {', '.join(results)}")
+            return True
+        print(f"❌ Failed - Expected bpm None, got {results}")
+        return False
+
 def main():
     print("🎵 T.H.U.G N HOMEBASE ENT. Recording Studio API Test Suite")
     print("=" * 60)
@@ -302,8 +404,11 @@ def main():
         ("Create Project", tester.test_create_project),
         ("Get Projects", tester.test_get_projects),
         ("Get Project by ID", tester.test_get_project_by_id),
+        ("Concurrent Track Uploads", tester.test_concurrent_track_uploads),
         ("Create Sound Pack", tester.test_create_sound_pack),
         ("Get Sound Packs", tester.test_get_sound_packs),
+        ("Tempo of Pulse-Free Samples", tester.test_pulse_free_samples_have_no_tempo),
+        ("Similarity Search with Truncated Clip", tester.test_similarity_truncated_clip),
         ("Create Contract", tester.test_create_contract),
         ("Get Contracts", tester.test_get_contracts),
         ("Sign Contract", tester.test_sign_contract),
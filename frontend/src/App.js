@@ -17,6 +17,18 @@ import { Toaster } from './components/ui/sonner';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// List endpoints return one page at a time; follow X-Next-Cursor to the end
+const fetchAllPages = async (url) => {
+  const items = [];
+  let after = null;
+  do {
+    const response = await axios.get(url, { params: { limit: 1000, ...(after && { after }) } });
+    items.push(...response.data);
+    after = response.headers['x-next-cursor'];
+  } while (after);
+  return items;
+};
+
 // Landing Page Component
 const LandingPage = ({ onGetStarted }) => {
   return (
@@ -231,10 +243,21 @@ const AuthModal = ({ isOpen, onClose, onUserCreated }) => {
   );
 };
 
+// Replaces the item with the same id, or appends it
+const upsertById = (items, item) => {
+  const index = items.findIndex((existing) => existing.id === item.id);
+  if (index === -1) return [...items, item];
+  const next = [...items];
+  next[index] = item;
+  return next;
+};
+
 // Studio Dashboard Component
 const StudioDashboard = ({ user, onUserUpdate }) => {
   const [projects, setProjects] = useState([]);
   const [soundPacks, setSoundPacks] = useState([]);
+  const [contractEvent, setContractEvent] = useState(null);
+  const [resyncCount, setResyncCount] = useState(0);
   const [activeTab, setActiveTab] = useState('studio');
   const [loading, setLoading] = useState(true);
 
@@ -242,14 +265,42 @@ const StudioDashboard = ({ user, onUserUpdate }) => {
     fetchData();
   }, [user]);
 
+  // Changes pushed by the server replace polling the lists after each action
+  useEffect(() => {
+    const events = new EventSource(`${API}/events?user_id=${user.id}&sound_packs=true`);
+    const onProject = (event) => {
+      const project = JSON.parse(event.data).data;
+      const { tracks, ...summary } = project;
+      setProjects((current) => upsertById(current, { ...summary, track_count: tracks.length }));
+    };
+    const onSoundPack = (event) => {
+      setSoundPacks((current) => upsertById(current, JSON.parse(event.data).data));
+    };
+    const onContract = (event) => setContractEvent(JSON.parse(event.data).data);
+    // Events were missed (the connection fell behind or was down too long)
+    const onResync = () => {
+      fetchData();
+      setResyncCount((count) => count + 1);
+    };
+
+    events.addEventListener('project.created', onProject);
+    events.addEventListener('project.updated', onProject);
+    events.addEventListener('sound_pack.created', onSoundPack);
+    events.addEventListener('sound_pack.updated', onSoundPack);
+    events.addEventListener('contract.created', onContract);
+    events.addEventListener('contract.updated', onContract);
+    events.addEventListener('resync', onResync);
+    return () => events.close();
+  }, [user.id]);
+
   const fetchData = async () => {
     try {
-      const [projectsRes, soundPacksRes] = await Promise.all([
-        axios.get(`${API}/projects?user_id=${user.id}`),
-        axios.get(`${API}/soundpacks`)
+      const [userProjects, allSoundPacks] = await Promise.all([
+        fetchAllPages(`${API}/projects?user_id=${user.id}&view=summary`),
+        fetchAllPages(`${API}/soundpacks?view=summary`)
       ]);
-      setProjects(projectsRes.data);
-      setSoundPacks(soundPacksRes.data);
+      setProjects(userProjects);
+      setSoundPacks(allSoundPacks);
     } catch (error) {
       toast.error('Failed to load data');
     } finally {
@@ -265,7 +316,7 @@ const StudioDashboard = ({ user, onUserUpdate }) => {
       formData.append('user_id', user.id);
       
       const response = await axios.post(`${API}/projects`, formData);
-      setProjects([...projects, response.data]);
+      setProjects((current) => upsertById(current, { ...response.data, track_count: response.data.tracks.length }));
       toast.success('New project created!');
     } catch (error) {
       toast.error('Failed to create project');
@@ -333,7 +384,7 @@ const StudioDashboard = ({ user, onUserUpdate }) => {
                   <CardContent>
                     <div className="space-y-2">
                       <div className="flex justify-between text-sm text-gray-400">
-                        <span>Tracks: {project.tracks.length}</span>
+                        <span>Tracks: {project.track_count}</span>
                         <span>BPM: {project.bpm}</span>
                       </div>
                       <div className="flex justify-between text-sm text-gray-400">
@@ -386,7 +437,7 @@ const StudioDashboard = ({ user, onUserUpdate }) => {
                     <div className="space-y-2">
                       <div className="flex justify-between text-sm text-gray-400">
                         <span>Genre: {pack.genre}</span>
-                        <span>Files: {pack.files.length}</span>
+                        <span>Files: {pack.file_count}</span>
                       </div>
                       <div className="text-sm text-gray-400">By: {pack.author}</div>
                       <div className="flex flex-wrap gap-1 mt-2">
@@ -420,7 +471,7 @@ const StudioDashboard = ({ user, onUserUpdate }) => {
 
           {/* Contracts Tab */}
           <TabsContent value="contracts" className="space-y-6">
-            <ContractSection user={user} onUserUpdate={onUserUpdate} />
+            <ContractSection user={user} onUserUpdate={onUserUpdate} contractEvent={contractEvent} resyncCount={resyncCount} />
           </TabsContent>
 
           {/* Profile Tab */}
@@ -434,19 +485,27 @@ const StudioDashboard = ({ user, onUserUpdate }) => {
 };
 
 // Contract Section Component
-const ContractSection = ({ user, onUserUpdate }) => {
+const ContractSection = ({ user, onUserUpdate, contractEvent, resyncCount }) => {
   const [contracts, setContracts] = useState([]);
+  const [terms, setTerms] = useState({});
   const [loading, setLoading] = useState(true);
   const [showCreateContract, setShowCreateContract] = useState(false);
 
   useEffect(() => {
     fetchContracts();
-  }, [user]);
+  }, [user, resyncCount]);
+
+  useEffect(() => {
+    if (!contractEvent) return;
+    setContracts((current) => upsertById(current, contractEvent));
+    fetchTerms(contractEvent);
+  }, [contractEvent]);
 
   const fetchContracts = async () => {
     try {
-      const response = await axios.get(`${API}/contracts?user_id=${user.id}`);
-      setContracts(response.data);
+      const userContracts = await fetchAllPages(`${API}/contracts?user_id=${user.id}`);
+      setContracts(userContracts);
+      userContracts.forEach(fetchTerms);
     } catch (error) {
       toast.error('Failed to load contracts');
     } finally {
@@ -454,6 +513,17 @@ const ContractSection = ({ user, onUserUpdate }) => {
     }
   };
 
+  // Terms are served separately; they never change for a given contract
+  const fetchTerms = async (contract) => {
+    if (terms[contract.id]) return;
+    try {
+      const response = await axios.get(`${API}/contracts/${contract.id}/terms`);
+      setTerms((current) => ({ ...current, [contract.id]: response.data.terms }));
+    } catch (error) {
+      toast.error('Failed to load contract terms');
+    }
+  };
+
   const createContract = async () => {
     try {
       const formData = new FormData();
@@ -462,7 +532,8 @@ const ContractSection = ({ user, onUserUpdate }) => {
       formData.append('user_id', user.id);
       
       const response = await axios.post(`${API}/contracts`, formData);
-      setContracts([...contracts, response.data]);
+      setContracts((current) => upsertById(current, response.data));
+      fetchTerms(response.data);
       setShowCreateContract(false);
       toast.success('Contract created! Please review and sign.');
     } catch (error) {
@@ -479,8 +550,10 @@ const ContractSection = ({ user, onUserUpdate }) => {
         signature_data: signatureData
       });
       
-      // Refresh contracts to get updated status
-      await fetchContracts();
+      // The signed contract itself arrives as a contract.updated event
+      setContracts((current) => current.map((contract) =>
+        contract.id === contractId ? { ...contract, status: 'signed' } : contract
+      ));
       
       // Update user state to reflect contract signed status
       if (onUserUpdate) {
@@ -552,7 +625,7 @@ const ContractSection = ({ user, onUserUpdate }) => {
             <CardContent>
               <div className="space-y-4">
                 <div className="bg-slate-700 p-4 rounded-lg max-h-64 overflow-y-auto">
-                  <pre className="text-sm text-gray-300 whitespace-pre-wrap">{contract.terms}</pre>
+                  <pre className="text-sm text-gray-300 whitespace-pre-wrap">{terms[contract.id] || 'Loading terms...'}</pre>
                 </div>
                 
                 {contract.status === 'pending' && (
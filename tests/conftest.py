@@ -0,0 +1,32 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# The backend modules import each other as top-level modules
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory):
+    """backend/server.py on mongomock-motor, with its file directories in a
+    temporary working directory."""
+    import motor.motor_asyncio
+    from mongomock_motor import AsyncMongoMockClient
+
+    motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+    os.environ.setdefault("MONGO_URL", "mongodb://mongomock")
+    os.environ.setdefault("DB_NAME", "studio_test")
+    previous = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("studio"))
+    try:
+        import server
+        yield server
+    finally:
+        os.chdir(previous)
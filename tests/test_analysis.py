@@ -0,0 +1,29 @@
+import hashlib
+
+import httpx
+import pytest
+
+from tests.test_uploads import EMPTY_WAV
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("directory", ["audio_dir", "sound_packs_dir"])
+async def test_analysis_of_legacy_flat_file(server, directory):
+    # Stored before the blob store: a plain file with no alias
+    filename = f"legacy-{directory}.wav"
+    (getattr(server, directory) / filename).write_bytes(EMPTY_WAV)
+    sha256 = hashlib.sha256(EMPTY_WAV).hexdigest()
+    await server.db.audio_analysis.update_one(
+        {"sha256": sha256},
+        {"$set": {"duration": 0.0, "envelope": {"0": bytes([1, 255])}}},
+        upsert=True
+    )
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://studio") as client:
+        response = await client.get(f"/api/audio/{filename}/analysis")
+        missing = await client.get("/api/audio/missing.wav/analysis")
+    assert response.status_code == 200
+    assert response.json()["sha256"] == sha256
+    assert response.json()["envelope"] == {"0": [1, -1]}
+    assert missing.status_code == 404
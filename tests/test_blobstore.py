@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from blobstore import BLOB_GC_GRACE, BlobStore
+
+AUDIO = b"RIFF" + b"\x01" * 4096
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(AsyncMongoMockClient()["test"], tmp_path / "blobs")
+
+
+async def refcount(store: BlobStore, sha256: str):
+    blob = await store.db.blobs.find_one({"sha256": sha256})
+    return blob and blob["refcount"]
+
+
+async def outlive_grace(store: BlobStore):
+    """Backdate every release past the collection grace period."""
+    async for blob in store.db.blobs.find({"released_at": {"$exists": True}}):
+        released_at = blob["released_at"] - BLOB_GC_GRACE - timedelta(seconds=1)
+        await store.db.blobs.update_one({"_id": blob["_id"]}, {"$set": {"released_at": released_at}})
+
+
+@pytest.mark.anyio
+async def test_identical_content_is_stored_once(store):
+    first = await store.ingest_bytes(AUDIO, "audio", ".wav")
+    second = await store.ingest_bytes(AUDIO, "audio", ".wav")
+    assert first.filename != second.filename
+    assert (first.deduplicated, second.deduplicated) == (False, True)
+    assert first.sha256 == second.sha256
+    assert await refcount(store, first.sha256) == 2
+    assert store.blob_path(first.sha256).read_bytes() == AUDIO
+    assert (await store.resolve(second.filename, "audio"))["sha256"] == first.sha256
+    assert await store.resolve(second.filename, "sound_pack") is None
+
+
+@pytest.mark.anyio
+async def test_release_to_zero_then_collect_deletes_file(store):
+    first = await store.ingest_bytes(AUDIO, "audio", ".wav")
+    second = await store.ingest_bytes(AUDIO, "audio", ".wav")
+    path = store.blob_path(first.sha256)
+    sidecar = path.with_name(f"{first.sha256}.peaks")
+    sidecar.write_bytes(b"peaks")
+
+    await store.release(first.filename)
+    assert await refcount(store, first.sha256) == 1
+    assert await store.resolve(first.filename) is None
+    await outlive_grace(store)
+    assert await store.collect_garbage() == 0
+    assert path.exists()
+
+    await store.release(second.filename)
+    assert await refcount(store, first.sha256) == 0
+    # Still inside the grace period
+    assert await store.collect_garbage() == 0
+    assert path.exists()
+
+    await outlive_grace(store)
+    assert await store.collect_garbage() == 1
+    assert not path.exists() and not sidecar.exists()
+    assert await store.db.blobs.find_one({"sha256": first.sha256}) is None
+    assert list(path.parent.iterdir()) == []
+
+
+@pytest.mark.anyio
+async def test_released_blob_is_kept_when_referenced_again(store):
+    first = await store.ingest_bytes(AUDIO, "audio", ".wav")
+    await store.release(first.filename)
+    await outlive_grace(store)
+    again = await store.ingest_bytes(AUDIO, "audio", ".wav")
+
+    await outlive_grace(store)
+    assert await store.collect_garbage() == 0
+    assert await refcount(store, again.sha256) == 1
+    assert store.blob_path(again.sha256).read_bytes() == AUDIO
+    assert (await store.resolve(again.filename))["sha256"] == again.sha256
+
+
+@pytest.mark.anyio
+async def test_releasing_unknown_file_is_a_no_op(store):
+    blob = await store.ingest_bytes(AUDIO, "audio", ".wav")
+    await store.release("missing.wav")
+    await store.release(blob.filename)
+    await store.release(blob.filename)
+    assert await refcount(store, blob.sha256) == 0
@@ -0,0 +1,105 @@
+import uuid
+from typing import Optional
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from pydantic import BaseModel, Field
+
+from bulk import BulkItem, bulk_import, insert_batch
+
+
+class SampleIn(BaseModel):
+    name: str
+    id: Optional[str] = None
+
+
+class Sample(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+
+
+@pytest.fixture
+async def collection():
+    collection = AsyncMongoMockClient()["test"]["samples"]
+    await collection.create_index("id", unique=True)
+    await collection.create_index("name", unique=True)
+    return collection
+
+
+class RacingCollection:
+    """Hides existing documents from the pre-check, as if they were inserted
+    by a concurrent import after it ran."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def distinct(self, field, query):
+        return []
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+def items(*documents) -> list:
+    return [BulkItem(line=line, document=dict(doc)) for line, doc in enumerate(documents, 1)]
+
+
+@pytest.mark.anyio
+async def test_duplicates_within_batch_and_collection(collection):
+    await collection.insert_one({"id": "a", "name": "kick"})
+    batch = items(
+        {"id": "b", "name": "snare"},
+        {"id": "a", "name": "clap"},  # id already stored
+        {"id": "c", "name": "snare"},  # name repeated in the batch
+        {"id": "b", "name": "hat"},  # id repeated in the batch
+        {"id": "d", "name": "tom"},
+    )
+    inserted = await insert_batch(collection, batch, ("id", "name"))
+
+    assert [item.status for item in batch] == ["created", "duplicate", "duplicate", "duplicate", "created"]
+    assert batch[1].error == "id already exists"
+    assert batch[2].error == "name repeated earlier in the import"
+    assert batch[3].error == "id repeated earlier in the import"
+    assert inserted == [{"id": "b", "name": "snare"}, {"id": "d", "name": "tom"}]
+    assert sorted(await collection.distinct("id")) == ["a", "b", "d"]
+
+
+@pytest.mark.anyio
+async def test_duplicate_key_from_insert_many(collection):
+    await collection.insert_one({"id": "a", "name": "kick"})
+    batch = items({"id": "b", "name": "snare"}, {"id": "a", "name": "clap"}, {"id": "c", "name": "kick"})
+    batch.insert(1, BulkItem(line=9, status="invalid", error="name: missing"))
+    inserted = await insert_batch(RacingCollection(collection), batch, ("id", "name"))
+
+    assert [item.status for item in batch] == ["created", "invalid", "duplicate", "duplicate"]
+    assert batch[2].error == "already exists"
+    # The unordered insert keeps going past the failures
+    assert [doc["id"] for doc in inserted] == ["b"]
+    assert all("_id" not in item.document for item in batch if item.document)
+    assert sorted(await collection.distinct("id")) == ["a", "b"]
+
+
+@pytest.mark.anyio
+async def test_bulk_import_reports_every_line(collection):
+    async def body():
+        yield b'{"id": "a", "name": "kick"}\n{"id": "a", "na'
+        yield b'me": "snare"}\n\n{"name": 5}\n{"name": "hat"}'
+
+    received = []
+
+    async def on_inserted(docs):
+        received.extend(docs)
+
+    response = await bulk_import(body(), collection, SampleIn, Sample, on_inserted=on_inserted, batch_size=2)
+    lines = [line async for line in response.body_iterator]
+
+    assert response.headers["X-Import-Created"] == "2"
+    assert response.headers["X-Import-Duplicates"] == "1"
+    assert response.headers["X-Import-Invalid"] == "1"
+    assert response.headers["X-Import-Failed"] == "0"
+    results = b"".join(lines).decode().splitlines()
+    assert len(results) == 4
+    assert '"line":2,"status":"duplicate"' in results[1]
+    assert '"line":4,"status":"invalid"' in results[2]
+    assert [doc["name"] for doc in received] == ["kick", "hat"]
+    assert await collection.count_documents({}) == 2
@@ -0,0 +1,86 @@
+import sys
+import types
+
+import pytest
+
+from cache import MemoryBackend, ReadThroughCache, RedisBackend
+
+
+class StubRedis:
+    """The slice of redis.asyncio.Redis the backend uses, storing bytes the
+    way a server does: INCR keeps a plain integer, not a pickle."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    async def incr(self, key):
+        value = int(self.data.get(key, b"0")) + 1
+        self.data[key] = str(value).encode()
+        return value
+
+    async def aclose(self):
+        pass
+
+
+@pytest.fixture
+def redis_backend(monkeypatch):
+    client = StubRedis()
+    redis_asyncio = types.ModuleType("redis.asyncio")
+    redis_asyncio.from_url = lambda url: client
+    redis = types.ModuleType("redis")
+    redis.asyncio = redis_asyncio
+    monkeypatch.setitem(sys.modules, "redis", redis)
+    monkeypatch.setitem(sys.modules, "redis.asyncio", redis_asyncio)
+    return RedisBackend("redis://stub")
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request, redis_backend):
+    backend = MemoryBackend() if request.param == "memory" else redis_backend
+    return ReadThroughCache(backend)
+
+
+@pytest.mark.anyio
+async def test_invalidate_namespace_retires_versioned_pages(cache):
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        return [len(loads)]
+
+    assert await cache.get_or_load("sound_packs", "page", loader, versioned=True) == [1]
+    assert await cache.get_or_load("sound_packs", "page", loader, versioned=True) == [1]
+    await cache.invalidate_namespace("sound_packs")
+    assert await cache.get_or_load("sound_packs", "page", loader, versioned=True) == [2]
+    await cache.invalidate_namespace("sound_packs")
+    assert await cache.get_or_load("sound_packs", "page", loader, versioned=True) == [3]
+    assert await cache.get_or_load("sound_packs", "page", loader, versioned=True) == [3]
+    assert cache.errors == 0
+
+
+@pytest.mark.anyio
+async def test_memory_generations_survive_eviction():
+    cache = ReadThroughCache(MemoryBackend(max_entries=2))
+
+    async def stale():
+        return "stale"
+
+    async def fresh():
+        return "fresh"
+
+    await cache.get_or_load("projects", "page", stale, versioned=True)
+    await cache.invalidate_namespace("projects")
+    for n in range(10):
+        await cache.backend.set(f"filler:{n}", n, 60)
+    # Generation 1 must not fall back to 0, where "stale" could be stored again
+    await cache.backend.set("cache:projects:g0:page", "stale", 60)
+    assert await cache.get_or_load("projects", "page", fresh, versioned=True) == "fresh"
@@ -0,0 +1,62 @@
+import base64
+import struct
+import zlib
+
+import httpx
+import pytest
+
+
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+# 1x1 greyscale PNG
+SIGNATURE = base64.b64encode(
+    b"\x89PNG\r\n\x1a\n"
+    + png_chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 0, 0, 0, 0))
+    + png_chunk(b"IDAT", zlib.compress(b"\x00\x00"))
+    + png_chunk(b"IEND", b"")
+).decode()
+
+
+@pytest.fixture
+async def client(server):
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://studio") as client:
+        yield client
+
+
+async def insert_contract(server, contract_id: str):
+    await server.db.contracts.insert_one(server.Contract(
+        id=contract_id, user_id="u1", artist_name="Artist", template_id="t1", template_version=1
+    ).dict())
+
+
+@pytest.mark.anyio
+async def test_sign_contract_is_idempotent(server, client):
+    await insert_contract(server, "c-sign")
+    first = await client.post("/api/contracts/c-sign/sign", json={"signature_data": SIGNATURE})
+    again = await client.post("/api/contracts/c-sign/sign", json={"signature_data": SIGNATURE})
+    assert first.status_code == again.status_code == 200
+    assert await server.db.blob_aliases.count_documents({"kind": "signature"}) >= 1
+    contract = await server.db.contracts.find_one({"id": "c-sign"})
+    assert contract["status"] == "signed"
+
+
+@pytest.mark.anyio
+async def test_contract_deleted_while_signing(server, client, monkeypatch):
+    await insert_contract(server, "c-deleted")
+    ingest_bytes = server.blob_store.ingest_bytes
+    stored = []
+
+    async def ingest_then_delete(*args, **kwargs):
+        blob = await ingest_bytes(*args, **kwargs)
+        stored.append(blob.filename)
+        await server.db.contracts.delete_one({"id": "c-deleted"})
+        return blob
+
+    monkeypatch.setattr(server.blob_store, "ingest_bytes", ingest_then_delete)
+    response = await client.post("/api/contracts/c-deleted/sign", json={"signature_data": SIGNATURE})
+    assert response.status_code == 404
+    # The signature stored for the vanished contract is released again
+    assert await server.db.blob_aliases.find_one({"filename": stored[0]}) is None
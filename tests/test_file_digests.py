@@ -0,0 +1,38 @@
+import hashlib
+
+import pytest
+
+
+@pytest.mark.anyio
+async def test_digest_cache_is_bounded_lru(server, monkeypatch):
+    monkeypatch.setattr(server, "FILE_DIGEST_CACHE_SIZE", 2)
+    monkeypatch.setattr(server, "file_digest_cache", type(server.file_digest_cache)())
+    paths = []
+    for name in ("lru_a.wav", "lru_b.wav", "lru_c.wav"):
+        path = server.audio_dir / name
+        path.write_bytes(name.encode())
+        paths.append(path)
+
+    for path in paths[:2]:
+        assert await server.get_file_digest(path) == hashlib.sha256(path.name.encode()).hexdigest()
+    await server.get_file_digest(paths[0])  # Most recently used again
+    await server.get_file_digest(paths[2])
+    assert list(server.file_digest_cache) == ["lru_a.wav", "lru_c.wav"]
+
+    # Evicted digests are read back from the database, not rehashed
+    paths[1].write_bytes(b"changed")
+    assert await server.get_file_digest(paths[1]) == hashlib.sha256(b"lru_b.wav").hexdigest()
+
+
+@pytest.mark.anyio
+async def test_forget_file_digest(server):
+    path = server.audio_dir / "forget.wav"
+    path.write_bytes(b"first")
+    await server.get_file_digest(path)
+    path.unlink()
+    await server.forget_file_digest("forget.wav")
+    assert "forget.wav" not in server.file_digest_cache
+    assert await server.db.file_digests.find_one({"filename": "forget.wav"}) is None
+
+    path.write_bytes(b"second")
+    assert await server.get_file_digest(path) == hashlib.sha256(b"second").hexdigest()
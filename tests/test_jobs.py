@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from jobs import JobQueue
+
+
+def running_job(job_id: str, leased_until) -> dict:
+    return {
+        "id": job_id, "type": "echo", "key": None, "params": {"value": job_id},
+        "status": "running", "result": None, "error": None, "owner": "other-process",
+        "created_at": datetime.now(timezone.utc), "started_at": datetime.now(timezone.utc),
+        "finished_at": None, "leased_until": leased_until,
+    }
+
+
+async def wait_for(queue: JobQueue, job_id: str, status: str) -> dict:
+    for _ in range(200):
+        job = await queue.get(job_id)
+        if job["status"] == status:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"{job_id} is {job['status']}, not {status}")
+
+
+@pytest.mark.anyio
+async def test_start_requeues_only_expired_leases():
+    db = AsyncMongoMockClient()["jobs_test"]
+    now = datetime.now(timezone.utc)
+    await db.jobs.insert_many([
+        running_job("live", now + timedelta(minutes=1)),
+        running_job("expired", now - timedelta(seconds=1)),
+        running_job("legacy", None),
+    ])
+    runs = []
+
+    async def echo(params):
+        runs.append(params["value"])
+        return params
+
+    queue = JobQueue(db, workers=1, lease=timedelta(seconds=30))
+    queue.register("echo", echo)
+    await queue.start()
+    try:
+        await wait_for(queue, "expired", "done")
+        await wait_for(queue, "legacy", "done")
+        live = await queue.get("live")
+    finally:
+        await queue.stop()
+    assert sorted(runs) == ["expired", "legacy"]
+    assert live["status"] == "running" and live["owner"] == "other-process"
+
+
+@pytest.mark.anyio
+async def test_running_job_lease_is_renewed():
+    db = AsyncMongoMockClient()["jobs_test"]
+    release = asyncio.Event()
+
+    async def slow(params):
+        await release.wait()
+
+    queue = JobQueue(db, workers=1, lease=timedelta(seconds=0.3))
+    queue.register("slow", slow)
+    await queue.start()
+    try:
+        job = await queue.submit("slow", {})
+        await wait_for(queue, job["id"], "running")
+        await asyncio.sleep(0.5)  # Longer than the lease
+        running = await queue.get(job["id"])
+        # Still this process's, and not queued again by its own reaper
+        assert running["status"] == "running" and running["owner"] == queue.owner
+        assert running["leased_until"].replace(tzinfo=timezone.utc) > datetime.now(timezone.utc)
+        release.set()
+        await wait_for(queue, job["id"], "done")
+    finally:
+        await queue.stop()
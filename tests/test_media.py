@@ -0,0 +1,96 @@
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+
+from media import parse_range_header, serve_ranges
+
+BODY = bytes(range(256)) * 4  # 1024 bytes
+ETAG = '"body"'
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", [(0, 99)]),
+    ("bytes=1000-", [(1000, 1023)]),  # Open-ended
+    ("bytes=-24", [(1000, 1023)]),  # Suffix
+    ("bytes=-5000", [(0, 1023)]),  # Suffix longer than the file
+    ("bytes=1000-5000", [(1000, 1023)]),  # End clamped to the file
+    ("bytes=0-9, 5-19, 20-29", [(0, 29)]),  # Overlapping and adjacent merged
+    ("bytes=500-599,0-9", [(0, 9), (500, 599)]),
+    ("bytes=0-9, 2000-", [(0, 9)]),  # Unsatisfiable parts dropped
+])
+def test_parse_range_header(header, expected):
+    assert parse_range_header(header, len(BODY)) == expected
+
+
+@pytest.mark.parametrize("header", ["items=0-9", "bytes=", "bytes=9-0", "bytes=a-b", "bytes=5", "bytes=" + ",".join(["0-1"] * 33)])
+def test_malformed_range_is_ignored(header):
+    assert parse_range_header(header, len(BODY)) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1024-", "bytes=5000-6000", "bytes=-0"])
+def test_unsatisfiable_range_raises_416(header):
+    with pytest.raises(HTTPException) as exc:
+        parse_range_header(header, len(BODY))
+    assert exc.value.status_code == 416
+    assert exc.value.headers["Content-Range"] == "bytes */1024"
+
+
+app = FastAPI()
+
+
+@app.get("/body")
+async def get_body(request: Request):
+    async def read_range(start, end):
+        yield BODY[start:end + 1]
+
+    return serve_ranges(request, len(BODY), ETAG, read_range, "audio/wav")
+
+
+async def fetch(headers=None) -> httpx.Response:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://media") as client:
+        return await client.get("/body", headers=headers or {})
+
+
+@pytest.mark.anyio
+async def test_full_body_and_conditional_get():
+    response = await fetch()
+    assert response.status_code == 200 and response.content == BODY
+    assert response.headers["accept-ranges"] == "bytes"
+    assert (await fetch({"If-None-Match": ETAG})).status_code == 304
+
+
+@pytest.mark.anyio
+async def test_single_range():
+    response = await fetch({"Range": "bytes=-24"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 1000-1023/1024"
+    assert response.content == BODY[1000:]
+
+
+@pytest.mark.anyio
+async def test_stale_if_range_gets_full_body():
+    response = await fetch({"Range": "bytes=0-9", "If-Range": '"other"'})
+    assert response.status_code == 200 and response.content == BODY
+
+
+@pytest.mark.anyio
+async def test_unsatisfiable_range_response():
+    response = await fetch({"Range": "bytes=2000-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */1024"
+
+
+@pytest.mark.anyio
+async def test_multipart_byteranges():
+    response = await fetch({"Range": "bytes=0-9,500-599"})
+    assert response.status_code == 206
+    media_type, _, boundary = response.headers["content-type"].partition("; boundary=")
+    assert media_type == "multipart/byteranges"
+    assert int(response.headers["content-length"]) == len(response.content)
+
+    parts = response.content.split(f"--{boundary}".encode())
+    assert parts[0] == b"" and parts[-1] == b"--\r\n"
+    for part, (start, end) in zip(parts[1:-1], [(0, 9), (500, 599)]):
+        head, _, data = part.partition(b"\r\n\r\n")
+        assert f"Content-Range: bytes {start}-{end}/1024".encode() in head
+        assert data == BODY[start:end + 1] + b"\r\n"
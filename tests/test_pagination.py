@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from mongomock_motor import AsyncMongoMockClient
+
+from pagination import decode_cursor, encode_cursor, fetch_page
+
+BASE = datetime(2024, 1, 1, 12, 0, 0, 123000)
+
+
+def test_cursor_round_trip():
+    doc = {"id": "b2", "created_at": BASE}
+    assert decode_cursor(encode_cursor(doc)) == (BASE, "b2")
+
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", "W10", "WyJ4IiwgIjEiXQ"])
+def test_invalid_cursor(cursor):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor)
+    assert exc.value.status_code == 400
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, 7, 20])
+async def test_pages_walk_ties_on_created_at(limit):
+    collection = AsyncMongoMockClient()["test"]["tracks"]
+    # Three bursts sharing a created_at, inserted out of id order
+    docs = [
+        {"id": doc_id, "created_at": BASE + timedelta(seconds=burst)}
+        for burst, ids in enumerate([["c", "a", "b"], ["f", "d"], ["h", "e", "g", "i"]])
+        for doc_id in ids
+    ]
+    await collection.insert_many([dict(doc) for doc in docs])
+
+    seen, after = [], None
+    while True:
+        page, after = await fetch_page(collection, {}, limit, after, {"_id": 0})
+        assert len(page) <= limit
+        seen.extend(doc["id"] for doc in page)
+        if after is None:
+            break
+        assert decode_cursor(after) == (page[-1]["created_at"], page[-1]["id"])
+
+    expected = sorted(docs, key=lambda doc: (doc["created_at"], doc["id"]))
+    assert seen == [doc["id"] for doc in expected]
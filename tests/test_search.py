@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from search import SoundPackSearchIndex
+
+
+def pack(pack_id: str, name: str, created_at: datetime) -> dict:
+    return {
+        "id": pack_id, "name": name, "description": None, "genre": "trap", "author": "a",
+        "files": [], "tags": [], "is_premium": False, "download_count": 0, "created_at": created_at,
+    }
+
+
+@pytest.mark.anyio
+async def test_sync_indexes_packs_inserted_with_older_created_at():
+    collection = AsyncMongoMockClient()["search_test"].sound_packs
+    now = datetime.now(timezone.utc)
+    await collection.insert_one(pack("new", "Fresh drums", now))
+    index = SoundPackSearchIndex()
+    assert await index.sync(collection) == 1
+
+    # Imported later by another worker, with its original creation time
+    await collection.insert_one(pack("old", "Vintage drums", now - timedelta(days=400)))
+    assert await index.sync(collection) == 1
+    assert {hit["id"] for hit in index.search("drums")["results"]} == {"new", "old"}
+
+
+@pytest.mark.anyio
+async def test_sync_refreshes_file_counts_without_duplicates():
+    collection = AsyncMongoMockClient()["search_test"].sound_packs
+    await collection.insert_one(pack("p", "Loops", datetime.now(timezone.utc)))
+    index = SoundPackSearchIndex()
+    await index.sync(collection)
+    await collection.update_one({"id": "p"}, {"$push": {"files": "a.wav"}})
+    assert await index.sync(collection) == 0
+    assert len(index) == 1
+    assert index.search("loops")["results"][0]["file_count"] == 1
@@ -0,0 +1,31 @@
+import asyncio
+import struct
+
+import httpx
+import pytest
+
+# Minimal valid WAV header: 8 kHz mono 16-bit, no samples
+EMPTY_WAV = b"RIFF" + struct.pack("<I", 36) + b"WAVEfmt " + struct.pack(
+    "<IHHIIHH", 16, 1, 1, 8000, 16000, 2, 16
+) + b"data" + struct.pack("<I", 0)
+
+
+@pytest.mark.anyio
+async def test_concurrent_track_uploads_keep_every_track(server):
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://studio") as client:
+        response = await client.post("/api/projects", data={"title": "Session", "user_id": "u1"})
+        project_id = response.json()["id"]
+
+        async def upload(i):
+            return await client.post(
+                "/api/audio/upload", data={"project_id": project_id},
+                files={"file": (f"take_{i}.wav", EMPTY_WAV, "audio/wav")},
+            )
+
+        responses = await asyncio.gather(*(upload(i) for i in range(100)))
+        assert [r.status_code for r in responses] == [200] * 100
+
+        project = (await client.get(f"/api/projects/{project_id}")).json()
+    assert len(project["tracks"]) == 100
+    assert set(project["tracks"]) == {r.json()["filename"] for r in responses}
@@ -0,0 +1,76 @@
+import io
+import zipfile
+import zlib
+from datetime import datetime, timezone
+
+import pytest
+
+from zipstream import ZipEntry, ZipLayout, file_crc32
+
+MODIFIED = datetime(2024, 5, 17, 12, 30, 10, tzinfo=timezone.utc)
+FILES = {
+    "drums/kick.wav": bytes(range(256)) * 40,
+    "drums/snare.wav": b"snare" * 333,
+    "bass/sub – ü.wav": b"\x00\x7f" * 2048,  # Non-ASCII names use the UTF-8 flag
+    "empty.wav": b"",
+}
+
+
+@pytest.fixture
+def layout(tmp_path):
+    entries = []
+    for name, data in FILES.items():
+        path = tmp_path / f"{len(entries)}.bin"
+        path.write_bytes(data)
+        entries.append(ZipEntry(name=name, path=path, size=len(data), crc32=file_crc32(path)))
+    return ZipLayout(entries, MODIFIED)
+
+
+async def read(layout: ZipLayout, start: int, end: int) -> bytes:
+    return b"".join([chunk async for chunk in layout.read_range(start, end)])
+
+
+def test_file_crc32(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(b"resumable" * 1000)
+    assert file_crc32(path) == zlib.crc32(b"resumable" * 1000)
+
+
+@pytest.mark.anyio
+async def test_archive_matches_zipfile(layout):
+    archive = await read(layout, 0, layout.size - 1)
+    assert len(archive) == layout.size
+
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == list(FILES)
+        for info in zf.infolist():
+            assert info.compress_type == zipfile.ZIP_STORED
+            assert info.date_time == (2024, 5, 17, 12, 30, 10)
+            assert zf.read(info) == FILES[info.filename]
+
+
+@pytest.mark.anyio
+async def test_ranges_are_slices_of_the_archive(layout):
+    archive = await read(layout, 0, layout.size - 1)
+    # Ranges inside headers, across header/file boundaries and at the ends
+    boundaries = [offset for offset, _, _, _ in layout.segments]
+    ranges = [(0, 0), (0, 29), (layout.size - 22, layout.size - 1), (layout.size - 1, layout.size - 1)]
+    ranges += [(max(b - 3, 0), min(b + 3, layout.size - 1)) for b in boundaries]
+    ranges += [(b, b) for b in boundaries]
+    for start, end in ranges:
+        assert await read(layout, start, end) == archive[start:end + 1], (start, end)
+
+
+@pytest.mark.anyio
+async def test_resumed_download_reassembles_archive(layout):
+    archive = await read(layout, 0, layout.size - 1)
+    for cut in (1, 30, 5000, layout.size // 2, layout.size - 1):
+        resumed = await read(layout, 0, cut - 1) + await read(layout, cut, layout.size - 1)
+        assert resumed == archive
+
+
+def test_layout_is_deterministic(layout):
+    again = ZipLayout(layout.entries, MODIFIED)
+    assert again.size == layout.size
+    assert [s[:3] for s in again.segments] == [s[:3] for s in layout.segments]